@@ -0,0 +1,303 @@
+# This module computes every aggregate used by the PR reports in one pass.
+#
+# For each pollutant of a station it keeps the sum, count, minimum and maximum of
+# the valid values per hour of the day, date, ISO week, month and day of the week.
+# The report functions in reporting.py only read these tables. cube.py stores
+# them with the snapshot of each station, so they are computed once per file.
+
+from datetime import date
+
+from store import EPOCH_ORDINAL
+
+GROUPINGS = ('hourly', 'daily', 'weekly', 'monthly', 'day_of_week')
+
+# Positions in an accumulator list
+SUM, COUNT, MIN, MAX = range(4)
+
+
+def new_accumulator():
+    """
+    Create an empty accumulator.
+
+    Returns:
+        list: [sum, count, minimum, maximum] of no values.
+    """
+    return [0.0, 0, float('inf'), float('-inf')]
+
+
+def merge(target, source):
+    """
+    Fold one accumulator into another.
+
+    Args:
+        target (list): The accumulator that is updated.
+        source (list): The accumulator that is added to it.
+
+    Returns:
+        None
+    """
+    target[SUM] += source[SUM]
+    target[COUNT] += source[COUNT]
+    if source[MIN] < target[MIN]:
+        target[MIN] = source[MIN]
+    if source[MAX] > target[MAX]:
+        target[MAX] = source[MAX]
+
+
+def mean(accumulator):
+    """
+    Return the mean of an accumulator.
+
+    Args:
+        accumulator (list): The accumulator.
+
+    Returns:
+        float: The mean of the values, or None if it holds no values.
+    """
+    if accumulator[COUNT] == 0:
+        return None
+    return accumulator[SUM] / accumulator[COUNT]
+
+
+_calendar_cache = {}
+
+
+def calendar_keys(day):
+    """
+    Return the week, month and day-of-the-week keys of a day.
+
+    Args:
+        day (int): The day number since 1970-01-01.
+
+    Returns:
+        tuple: The day number of the Monday that starts the ISO week, the
+            (year, month) pair and the day of the week, where Monday is 0.
+    """
+    keys = _calendar_cache.get(day)
+    if keys is None:
+        day_date = date.fromordinal(day + EPOCH_ORDINAL)
+        weekday = day_date.weekday()
+        keys = (day - weekday, (day_date.year, day_date.month), weekday)
+        _calendar_cache[day] = keys
+    return keys
+
+
+class Aggregates:
+    """
+    Sum, count, minimum and maximum of one pollutant column per time grouping.
+
+    Every table maps a group key to an accumulator list [sum, count, min, max]. Days
+    are present even when none of their values are valid, with a count of zero.
+
+    Attributes:
+        hourly (dict): Keyed by the hour of the day, from 1 to 24.
+        daily (dict): Keyed by the day number since 1970-01-01.
+        weekly (dict): Keyed by the day number of the Monday that starts the ISO week.
+        monthly (dict): Keyed by (year, month).
+        day_of_week (dict): Keyed by the day of the week, where Monday is 0.
+        rows (int): The number of rows folded in so far.
+    """
+
+    def __init__(self):
+        self.hourly = {}
+        self.daily = {}
+        self.weekly = {}
+        self.monthly = {}
+        self.day_of_week = {}
+        self.rows = 0
+
+    def table(self, grouping):
+        """
+        Return the table of one of the GROUPINGS.
+
+        Args:
+            grouping (str): The name of the grouping.
+
+        Returns:
+            dict: The table.
+        """
+        if grouping not in GROUPINGS:
+            raise ValueError(f"Unknown grouping: {grouping}")
+        return getattr(self, grouping)
+
+    def merge_day(self, day, accumulator):
+        """
+        Fold the accumulator of (part of) a day into the daily, weekly, monthly and
+        day-of-the-week tables.
+
+        Args:
+            day (int): The day number since 1970-01-01.
+            accumulator (list): The accumulator of the day's values.
+
+        Returns:
+            None
+        """
+        week, month, weekday = calendar_keys(day)
+        for table, key in ((self.daily, day), (self.weekly, week),
+                           (self.monthly, month), (self.day_of_week, weekday)):
+            target = table.get(key)
+            if target is None:
+                target = table[key] = new_accumulator()
+            merge(target, accumulator)
+
+
+def fold(aggregates, timestamps, columns, start=0, stop=None):
+    """
+    Fold a range of rows into the aggregates of several pollutant columns at once.
+
+    Every row updates the hourly table and an accumulator for its day; the days are
+    then merged into the coarser tables, so the cost is one pass over the rows plus
+    one merge per day touched.
+
+    Args:
+        aggregates (list): One Aggregates object per column.
+        timestamps (array): The epoch-hour timestamps of the rows.
+        columns (list): The pollutant columns, in the same order as aggregates.
+        start (int): The first row to fold.
+        stop (int or None): The row after the last one to fold. Defaults to all rows.
+
+    Returns:
+        None
+    """
+    if stop is None:
+        stop = len(timestamps)
+    if start >= stop:
+        return
+
+    width = len(columns)
+    hourly_tables = [aggregate.hourly for aggregate in aggregates]
+    day_batches = [{} for _ in range(width)]
+    current_day = None
+    day_accumulators = None
+
+    for row in range(start, stop):
+        ts = timestamps[row] - 1
+        day = ts // 24
+        if day != current_day:
+            current_day = day
+            day_accumulators = []
+            for batch in day_batches:
+                accumulator = batch.get(day)
+                if accumulator is None:
+                    accumulator = batch[day] = new_accumulator()
+                day_accumulators.append(accumulator)
+        hour = ts - day * 24 + 1
+
+        for i in range(width):
+            value = columns[i][row]
+            if value != value:
+                # Missing values only make sure their hour and day exist
+                if hour not in hourly_tables[i]:
+                    hourly_tables[i][hour] = new_accumulator()
+                continue
+            accumulator = day_accumulators[i]
+            accumulator[SUM] += value
+            accumulator[COUNT] += 1
+            if value < accumulator[MIN]:
+                accumulator[MIN] = value
+            if value > accumulator[MAX]:
+                accumulator[MAX] = value
+
+            accumulator = hourly_tables[i].get(hour)
+            if accumulator is None:
+                accumulator = hourly_tables[i][hour] = new_accumulator()
+            accumulator[SUM] += value
+            accumulator[COUNT] += 1
+            if value < accumulator[MIN]:
+                accumulator[MIN] = value
+            if value > accumulator[MAX]:
+                accumulator[MAX] = value
+
+    for aggregate, batch in zip(aggregates, day_batches):
+        for day, accumulator in batch.items():
+            aggregate.merge_day(day, accumulator)
+        aggregate.rows += stop - start
+
+
+class AggregateCache(dict):
+    """
+    The aggregates cached on a station, keyed by pollutant.
+
+    When rows are appended to the station only the new rows are folded in, so the
+    cached aggregates stay current at the cost of the new rows.
+
+    Attributes:
+        loader (callable or None): Reads the stored aggregates of a pollutant, as
+            returned by cube.loader, or None if there are none to read.
+    """
+
+    def __init__(self, loader=None):
+        super().__init__()
+        self.loader = loader
+
+    def load(self, pollutant):
+        """
+        Read the stored aggregates of a pollutant, if there are any.
+
+        Args:
+            pollutant (str): The name of the pollutant.
+
+        Returns:
+            bool: True if the aggregates were read and cached.
+        """
+        if self.loader is None:
+            return False
+        aggregates = self.loader(pollutant)
+        if aggregates is None:
+            return False
+        self[pollutant] = aggregates
+        return True
+
+    def extend(self, station, start, stop):
+        """
+        Fold rows appended to a station into every cached pollutant.
+
+        Args:
+            station (StationData): The station the rows were appended to.
+            start (int): The first new row.
+            stop (int): The row after the last new row.
+
+        Returns:
+            None
+        """
+        # Stored aggregates describe the rows before the append, so they are no
+        # longer read; the ones already cached are brought up to date instead
+        self.loader = None
+        pollutants = list(self)
+        fold([self[p] for p in pollutants], station.timestamps,
+             [station.column(p) for p in pollutants], start, stop)
+
+
+def aggregate(station, pollutants=None):
+    """
+    Return the aggregates of a station, computing them if they are not cached.
+
+    Aggregates stored with the snapshot of the station are read first. All other
+    pollutants that are not cached yet and are held in memory are computed together
+    in one pass over the rows. The results are kept on the station until its values
+    change.
+
+    Args:
+        station (StationData): The station data.
+        pollutants (list or None): The pollutants needed. Defaults to all of them.
+
+    Returns:
+        dict: Maps each requested pollutant that the station has to its Aggregates.
+    """
+    if pollutants is None:
+        pollutants = station.pollutants
+    cache = station.derived.setdefault('aggregates', AggregateCache())
+    for p in pollutants:
+        if p not in cache and p in station:
+            cache.load(p)
+
+    if any(p not in cache and p in station for p in pollutants):
+        # Computing every uncached pollutant in memory now costs little more than
+        # one of them; columns that are not loaded yet are left alone
+        loaded = station.loaded_pollutants
+        missing = [p for p in station.pollutants if p not in cache and (p in pollutants or p in loaded)]
+        computed = [Aggregates() for _ in missing]
+        fold(computed, station.timestamps, [station.column(p) for p in missing])
+        cache.update(zip(missing, computed))
+
+    return {p: cache[p] for p in pollutants if p in cache}
@@ -0,0 +1,537 @@
+# This module is the fetch layer for the LondonAir API used by monitoring.py.
+#
+# All requests share one pooled requests.Session, so connections to the API are
+# kept alive and reused, and independent site/species requests can be sent
+# concurrently from a thread pool. A semaphore bounds the number of requests in
+# flight at any time, whichever thread they come from.
+#
+# Responses are cached in memory and on disk by ResponseCache. A range that ended
+# before today cannot change any more and is kept indefinitely; a range that
+# reaches today is only reused for CACHE_TTL seconds.
+#
+# Long date ranges are fetched by fetch_range as CHUNK_DAYS-sized pieces, in
+# parallel, and merged back in time order. Failed requests that may succeed
+# later, such as timeouts and 5xx responses, are retried with exponential backoff.
+#
+# API_BASE can be pointed at a local server, which is how the tests run.
+
+import datetime
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+API_BASE = "https://api.erg.ic.ac.uk/AirQuality"
+
+SITE_SPECIES_PATH = "/Data/SiteSpecies/SiteCode={site_code}/SpeciesCode={species_code}/StartDate={start_date}/EndDate={end_date}/Json"
+WIDE_PATH = "/Data/Wide/Site/SiteCode={site_code}/StartDate={start_date}/EndDate={end_date}/Json"
+
+# The largest number of requests sent to the API at the same time
+MAX_CONCURRENCY = 8
+
+# Seconds to wait for the API to respond
+TIMEOUT = 30
+
+# Seconds a cached response for a range that reaches today stays valid
+CACHE_TTL = 300
+
+# The number of times a failed request is retried
+RETRIES = 4
+
+# Seconds to wait before the first retry; the wait doubles after each attempt
+BACKOFF = 0.5
+
+# The longest wait between two attempts, in seconds
+BACKOFF_MAX = 8.0
+
+# HTTP statuses worth retrying, as the API may answer them on a later attempt
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+
+# The number of days fetched per request by fetch_range
+CHUNK_DAYS = 7
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", ".cache", "api")
+
+_session = None
+_session_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(MAX_CONCURRENCY)
+
+
+def get_session():
+    """
+    Return the shared HTTP session, creating it on first use.
+
+    Returns:
+        requests.Session: A session whose connection pool holds MAX_CONCURRENCY connections.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=MAX_CONCURRENCY, pool_maxsize=MAX_CONCURRENCY)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+
+def close_session():
+    """
+    Close the shared HTTP session and its pooled connections.
+
+    Returns:
+        None
+    """
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def date_range(start_date=None, end_date=None):
+    """
+    Apply the API defaults to a date range.
+
+    Args:
+        start_date (datetime.date, str or None): The start of the range. Defaults to today.
+        end_date (datetime.date, str or None): The end of the range. Defaults to the day
+            after start_date.
+
+    Returns:
+        tuple: The start and end dates.
+    """
+    start_date = datetime.date.today() if start_date is None else start_date
+    if end_date is None:
+        start = datetime.date.fromisoformat(start_date) if isinstance(start_date, str) else start_date
+        end_date = start + datetime.timedelta(days=1)
+    return start_date, end_date
+
+
+def _to_date(value):
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(str(value)[:10])
+
+
+def is_immutable(end_date, today=None):
+    """
+    Check whether the data of a date range can no longer change.
+
+    Args:
+        end_date (datetime.date or str): The end of the range.
+        today (datetime.date or None): The current date. Defaults to today.
+
+    Returns:
+        bool: True if the range ended before today.
+    """
+    today = datetime.date.today() if today is None else today
+    return _to_date(end_date) < today
+
+
+class ResponseCache:
+    """
+    A two-tier cache of API responses: an LRU dictionary in memory backed by JSON
+    files on disk.
+
+    Entries are keyed by (endpoint, site, species, start date, end date). Responses
+    for ranges that ended before today never expire; others expire after ttl seconds.
+    Responses are held as JSON text and decoded on every hit, so each caller gets
+    its own copy and changing it does not change the cached response.
+
+    Attributes:
+        max_entries (int): The number of responses kept in memory.
+        ttl (float): Seconds a response for a range that reaches today stays valid.
+        directory (str or None): Where responses are written; None keeps them in memory only.
+        hits (int): Lookups answered from memory.
+        disk_hits (int): Lookups answered from disk.
+        misses (int): Lookups that had to go to the API.
+    """
+
+    def __init__(self, max_entries=256, ttl=None, directory=CACHE_DIR):
+        self.max_entries = max_entries
+        self.ttl = CACHE_TTL if ttl is None else ttl
+        self.directory = directory
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _file(self, key):
+        name = hashlib.sha256(json.dumps(key).encode()).hexdigest()
+        return os.path.join(self.directory, f"{name}.json")
+
+    def _remember(self, key, expires, text):
+        self._entries[key] = (expires, text)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, key):
+        """
+        Look up a response.
+
+        Args:
+            key (tuple): The cache key.
+
+        Returns:
+            dict: The cached response, or None if there is no valid entry.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, text = entry
+                if expires is None or expires > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return json.loads(text)
+                del self._entries[key]
+
+        if self.directory is not None:
+            try:
+                with open(self._file(key), "r") as file:
+                    stored = json.load(file)
+            except (OSError, ValueError):
+                stored = None
+            if stored is not None and stored["key"] == list(key):
+                expires = stored["expires"]
+                if expires is None or expires > now:
+                    text = json.dumps(stored["value"])
+                    with self._lock:
+                        self._remember(key, expires, text)
+                        self.disk_hits += 1
+                    return stored["value"]
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, value, immutable):
+        """
+        Store a response.
+
+        Args:
+            key (tuple): The cache key.
+            value (dict): The decoded response.
+            immutable (bool): Whether the response can never change.
+
+        Returns:
+            None
+        """
+        expires = None if immutable else time.time() + self.ttl
+        # Encoded now, so later changes to the caller's value do not reach the cache
+        text = json.dumps(value)
+        with self._lock:
+            self._remember(key, expires, text)
+        if self.directory is not None:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                target = self._file(key)
+                temporary = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(temporary, "w") as file:
+                    json.dump({"key": list(key), "expires": expires, "value": value}, file)
+                os.replace(temporary, target)
+            except OSError:
+                pass
+
+    def clear(self):
+        """
+        Remove every entry from memory and reset the counters. Files on disk are kept.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.disk_hits = self.misses = 0
+
+    def stats(self):
+        """
+        Return the hit and miss counters.
+
+        Returns:
+            dict: The number of memory hits, disk hits, misses and entries in memory.
+        """
+        with self._lock:
+            return {"hits": self.hits, "disk_hits": self.disk_hits,
+                    "misses": self.misses, "entries": len(self._entries)}
+
+
+# The cache used by the fetch functions; set to None to always go to the API
+cache = ResponseCache()
+
+
+def cached_json(endpoint, site_code, species_code, start_date, end_date, url):
+    """
+    Return the response for a query from the cache, fetching it on a miss.
+
+    Args:
+        endpoint (str): The name of the API endpoint.
+        site_code (str): The code of the monitoring station.
+        species_code (str or None): The code of the pollutant, if the endpoint takes one.
+        start_date (datetime.date or str): The start of the range.
+        end_date (datetime.date or str): The end of the range.
+        url (str): The URL to fetch on a miss.
+
+    Returns:
+        dict: The decoded response.
+    """
+    if cache is None:
+        return get_json(url)
+    key = (endpoint, site_code, species_code, str(start_date), str(end_date))
+    value = cache.get(key)
+    if value is None:
+        value = get_json(url)
+        cache.put(key, value, is_immutable(end_date))
+    return value
+
+
+def site_species_url(site_code, species_code, start_date=None, end_date=None):
+    """
+    Build the URL of the SiteSpecies endpoint.
+
+    Args:
+        site_code (str): The code of the monitoring station.
+        species_code (str): The code of the pollutant.
+        start_date (datetime.date, str or None): The start of the range.
+        end_date (datetime.date, str or None): The end of the range.
+
+    Returns:
+        str: The URL.
+    """
+    start_date, end_date = date_range(start_date, end_date)
+    return API_BASE + SITE_SPECIES_PATH.format(
+        site_code=site_code,
+        species_code=species_code,
+        start_date=start_date,
+        end_date=end_date
+    )
+
+
+def wide_url(site_code, start_date=None, end_date=None):
+    """
+    Build the URL of the Wide endpoint, which returns every species of a site.
+
+    Args:
+        site_code (str): The code of the monitoring station.
+        start_date (datetime.date, str or None): The start of the range.
+        end_date (datetime.date, str or None): The end of the range.
+
+    Returns:
+        str: The URL.
+    """
+    start_date, end_date = date_range(start_date, end_date)
+    return API_BASE + WIDE_PATH.format(site_code=site_code, start_date=start_date, end_date=end_date)
+
+
+def backoff_delay(attempt):
+    """
+    Return how long to wait before retrying a request.
+
+    Args:
+        attempt (int): The number of attempts made so far, from 1.
+
+    Returns:
+        float: Seconds to wait: BACKOFF doubled after each attempt, capped at
+            BACKOFF_MAX, with random jitter so that parallel retries spread out.
+    """
+    delay = min(BACKOFF * 2 ** (attempt - 1), BACKOFF_MAX)
+    return delay * (0.5 + random.random() / 2)
+
+
+def get_json(url, timeout=None, retries=None):
+    """
+    Send a GET request over the shared session and decode the JSON response.
+
+    Connection errors, timeouts and the statuses in RETRY_STATUSES are retried
+    with exponential backoff; other HTTP errors are raised at once.
+
+    Args:
+        url (str): The URL to fetch.
+        timeout (float or None): Seconds to wait for a response. Defaults to TIMEOUT.
+        retries (int or None): The number of retries. Defaults to RETRIES.
+
+    Returns:
+        dict: The decoded response.
+
+    Raises:
+        requests.RequestException: If the request still fails after the last retry,
+            or the response is an HTTP error that is not retried.
+    """
+    retries = RETRIES if retries is None else retries
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            with _slots:
+                res = get_session().get(url, timeout=TIMEOUT if timeout is None else timeout)
+            if metrics.enabled:
+                metrics.count("api.bytes_fetched", len(res.content))
+            if res.status_code not in RETRY_STATUSES:
+                res.raise_for_status()
+                return res.json()
+            if attempt > retries:
+                res.raise_for_status()
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt > retries:
+                raise
+        if metrics.enabled:
+            metrics.count("api.retries")
+        # The wait happens outside the semaphore, so other requests can use the slot
+        time.sleep(backoff_delay(attempt))
+
+
+def fetch_site_species(site_code='MY1', species_code='NO', start_date=None, end_date=None):
+    """
+    Fetch the readings of one pollutant at one monitoring station.
+
+    Args:
+        site_code (str): The code of the monitoring station.
+        species_code (str): The code of the pollutant.
+        start_date (datetime.date, str or None): The start of the range. Defaults to today.
+        end_date (datetime.date, str or None): The end of the range. Defaults to the day
+            after start_date.
+
+    Returns:
+        dict: The decoded API response.
+    """
+    start_date, end_date = date_range(start_date, end_date)
+    url = site_species_url(site_code, species_code, start_date, end_date)
+    return cached_json("SiteSpecies", site_code, species_code, start_date, end_date, url)
+
+
+def fetch_wide(site_code='MY1', start_date=None, end_date=None):
+    """
+    Fetch the readings of every pollutant at one monitoring station.
+
+    Args:
+        site_code (str): The code of the monitoring station.
+        start_date (datetime.date, str or None): The start of the range. Defaults to today.
+        end_date (datetime.date, str or None): The end of the range. Defaults to the day
+            after start_date.
+
+    Returns:
+        dict: The decoded API response.
+    """
+    start_date, end_date = date_range(start_date, end_date)
+    url = wide_url(site_code, start_date, end_date)
+    return cached_json("Wide", site_code, None, start_date, end_date, url)
+
+
+def fetch_many(queries, max_workers=None):
+    """
+    Fetch several site/species queries concurrently.
+
+    Args:
+        queries (list): Tuples of (site_code, species_code, start_date, end_date); the
+            dates may be left out or None to use the defaults.
+        max_workers (int or None): The number of threads. Defaults to MAX_CONCURRENCY.
+
+    Returns:
+        list: The decoded responses, in the same order as the queries.
+
+    Raises:
+        requests.RequestException: If any of the requests fails.
+    """
+    queries = [tuple(query) for query in queries]
+    if len(queries) <= 1:
+        return [fetch_site_species(*query) for query in queries]
+    workers = min(len(queries), max_workers or MAX_CONCURRENCY)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(lambda query: fetch_site_species(*query), queries))
+
+
+def split_range(start_date, end_date, days=CHUNK_DAYS):
+    """
+    Split a date range into consecutive pieces of at most a number of days.
+
+    Args:
+        start_date (datetime.date or str): The start of the range.
+        end_date (datetime.date or str): The end of the range.
+        days (int): The longest piece, in days.
+
+    Returns:
+        list: (start, end) date pairs; each piece ends where the next one starts.
+    """
+    start, end = _to_date(start_date), _to_date(end_date)
+    pieces = []
+    while start < end:
+        stop = min(start + datetime.timedelta(days=days), end)
+        pieces.append((start, stop))
+        start = stop
+    return pieces
+
+
+def merge_readings(responses):
+    """
+    Merge SiteSpecies responses for adjoining ranges into one response.
+
+    Args:
+        responses (list): The decoded responses.
+
+    Returns:
+        dict: A response in the same shape, whose readings are in time order with
+            every @MeasurementDateGMT kept once.
+    """
+    readings = {}
+    header = {}
+    for response in responses:
+        raw = response.get('RawAQData', {})
+        for key, value in raw.items():
+            if key != 'Data':
+                header.setdefault(key, value)
+        data = raw.get('Data') or []
+        if isinstance(data, dict):
+            # A range with a single reading is returned as an object, not a list
+            data = [data]
+        for reading in data:
+            readings.setdefault(reading['@MeasurementDateGMT'], reading)
+    header['Data'] = [readings[key] for key in sorted(readings)]
+    return {'RawAQData': header}
+
+
+def fetch_range(site_code='MY1', species_code='NO', start_date=None, end_date=None,
+                chunk_days=CHUNK_DAYS, max_workers=None):
+    """
+    Fetch the readings of one pollutant over a long date range.
+
+    The range is split into pieces of chunk_days, which are fetched in parallel
+    (at most MAX_CONCURRENCY at a time), cached separately and merged in time order.
+    Pieces that ended before today are cached indefinitely, so fetching the same
+    window again only goes to the API for its most recent piece.
+
+    Args:
+        site_code (str): The code of the monitoring station.
+        species_code (str): The code of the pollutant.
+        start_date (datetime.date, str or None): The start of the range. Defaults to today.
+        end_date (datetime.date, str or None): The end of the range. Defaults to the day
+            after start_date.
+        chunk_days (int): The number of days fetched per request.
+        max_workers (int or None): The number of threads. Defaults to MAX_CONCURRENCY.
+
+    Returns:
+        dict: The merged response, in the shape of a SiteSpecies response.
+
+    Raises:
+        requests.RequestException: If any piece still fails after its retries.
+    """
+    start_date, end_date = date_range(start_date, end_date)
+    queries = [(site_code, species_code, start.isoformat(), end.isoformat())
+               for start, end in split_range(start_date, end_date, chunk_days)]
+    if not queries:
+        return merge_readings([])
+    return merge_readings(fetch_many(queries, max_workers))
@@ -0,0 +1,258 @@
+# This module computes the UK Daily Air Quality Index (DAQI) from pollutant readings.
+#
+# The DAQI maps the concentration of each pollutant to an index from 1 to 10 and
+# reports the highest of them, along with the pollutant that set it. Ozone is
+# averaged over a running 8 hours and particulate matter over a running 24 hours
+# before it is banded; nitrogen dioxide and sulphur dioxide use the hourly value.
+# (The official sulphur dioxide index uses 15-minute means, which the hourly
+# readings cannot provide.)
+#
+# Banding works on whole arrays. The breakpoints are whole numbers of µg/m³, so
+# every pollutant has a lookup table from the whole part of a concentration to
+# its index, and a column is banded with one table lookup per value. With numpy
+# installed, the arrays are banded with searchsorted instead. hourly_indices
+# joins the columns of many stations end to end, so every pollutant is banded in
+# a single pass however many stations there are.
+
+from array import array
+from bisect import bisect_right
+
+from rolling import RollingWindow
+from store import MISSING, day_to_date
+
+try:
+    import numpy
+except ImportError:  # numpy is optional; the lookup tables below are used instead
+    numpy = None
+
+# The lowest concentration of bands 2 to 10 for each pollutant, in µg/m³
+BREAKPOINTS = {
+    'o3': (34, 67, 101, 121, 141, 161, 188, 214, 241),
+    'no2': (68, 135, 201, 268, 335, 401, 468, 535, 601),
+    'so2': (89, 178, 267, 355, 444, 533, 711, 888, 1065),
+    'pm25': (12, 24, 36, 42, 48, 54, 59, 65, 71),
+    'pm10': (17, 34, 51, 59, 67, 76, 84, 92, 101),
+}
+
+# The hours of the running mean each pollutant is banded on
+AVERAGING_HOURS = {'o3': 8, 'no2': 1, 'so2': 1, 'pm25': 24, 'pm10': 24}
+
+# The highest index of each band
+BANDS = ((3, 'Low'), (6, 'Moderate'), (9, 'High'), (10, 'Very High'))
+
+# Maps the species names used by the API's Wide endpoint to pollutant codes
+SPECIES_NAMES = {
+    'ozone': 'o3',
+    'nitrogen dioxide': 'no2',
+    'sulphur dioxide': 'so2',
+    'pm2.5 particulate': 'pm25',
+    'pm10 particulate': 'pm10',
+}
+
+# Maps each pollutant code to the index of every whole concentration up to its
+# highest breakpoint
+_TABLES = {code: bytes(bisect_right(bounds, whole) + 1 for whole in range(bounds[-1] + 1))
+           for code, bounds in BREAKPOINTS.items()}
+
+
+def pollutant_code(name):
+    """
+    Return the DAQI pollutant a column or species name stands for.
+
+    Args:
+        name (str): A station column such as 'pm10', an API species code such as
+            'NO2', or a Wide endpoint species name such as 'Ozone'.
+
+    Returns:
+        str or None: The pollutant code, one of BREAKPOINTS, or None if the
+            pollutant is not part of the index.
+    """
+    name = name.strip().lower()
+    if name in BREAKPOINTS:
+        return name
+    return SPECIES_NAMES.get(name)
+
+
+def band(index):
+    """
+    Return the name of the band an index falls in.
+
+    Args:
+        index (int): An index from 1 to 10, or 0 for no data.
+
+    Returns:
+        str or None: 'Low', 'Moderate', 'High' or 'Very High', or None for no data.
+    """
+    if not index:
+        return None
+    for top, name in BANDS:
+        if index <= top:
+            return name
+    return BANDS[-1][1]
+
+
+def index_values(pollutant, values):
+    """
+    Band an array of concentrations of one pollutant.
+
+    Args:
+        pollutant (str): The name of the pollutant, as accepted by pollutant_code.
+        values (array or list): Concentrations in µg/m³, with NaN or None for
+            missing readings.
+
+    Returns:
+        array: An array('b') of indices from 1 to 10, with 0 for missing readings.
+
+    Raises:
+        ValueError: If the pollutant is not part of the index.
+    """
+    code = pollutant_code(pollutant)
+    if code is None:
+        raise ValueError(f"{pollutant} is not part of the air quality index")
+    if numpy is not None and isinstance(values, array) and values.typecode == 'd':
+        column = numpy.frombuffer(values, dtype=numpy.float64)
+        indices = numpy.searchsorted(numpy.asarray(BREAKPOINTS[code], dtype=numpy.float64),
+                                     column, side='right') + 1
+        indices[numpy.isnan(column)] = 0
+        return array('b', indices.astype(numpy.int8).tobytes())
+
+    table = _TABLES[code]
+    limit = len(table)
+    # NaN fails every comparison and falls through to 0; None is checked first
+    return array('b', [0 if value is None
+                       else table[int(value)] if 0 <= value < limit
+                       else 10 if value >= limit
+                       else 1 if value < 0
+                       else 0
+                       for value in values])
+
+
+def combine(indices):
+    """
+    Take the highest index of every row across pollutants.
+
+    Args:
+        indices (dict): Maps pollutant names to index arrays of equal length.
+
+    Returns:
+        tuple: An array('b') of the highest index of each row, and a list of the
+            pollutant that set it, or None where every index is 0. Ties go to the
+            pollutant listed first.
+    """
+    names = list(indices)
+    columns = [indices[name] for name in names]
+    if not columns:
+        return array('b'), []
+    if numpy is not None:
+        stacked = numpy.vstack([numpy.frombuffer(column, dtype=numpy.int8) for column in columns])
+        highest = stacked.max(axis=0)
+        dominant = [names[row] if index else None
+                    for row, index in zip(stacked.argmax(axis=0).tolist(), highest.tolist())]
+        return array('b', highest.tobytes()), dominant
+
+    rows = list(zip(*columns))
+    highest = array('b', map(max, rows))
+    dominant = [names[row.index(index)] if index else None for row, index in zip(rows, highest)]
+    return highest, dominant
+
+
+def running_mean(timestamps, values, hours):
+    """
+    Average a column over a running window.
+
+    Args:
+        timestamps (array): The epoch-hour timestamps of the readings, in order.
+        values (array): The readings, with NaN for missing values.
+        hours (int): The length of the window; 1 returns the values unchanged.
+
+    Returns:
+        array: An array('d') of the mean of the valid readings in the window
+            ending at each reading, NaN where there are none.
+    """
+    if hours <= 1:
+        return values
+    window = RollingWindow(hours)
+    means = array('d', bytes(8 * len(values)))
+    for row, (ts, value) in enumerate(zip(timestamps, values)):
+        window.push(ts, value)
+        mean = window.mean
+        means[row] = MISSING if mean is None else mean
+    return means
+
+
+def hourly_indices(data, stations=None):
+    """
+    Compute the index at every reading of many stations at once.
+
+    Args:
+        data (dict): Maps station codes to StationData.
+        stations (list or None): The stations to include. Defaults to all of them.
+
+    Returns:
+        dict: Maps each station code to a dictionary holding its 'index' array('b'),
+            aligned with the station's timestamps, the 'dominant' pollutant of every
+            reading and the index of each pollutant under 'pollutants'.
+    """
+    stations = list(data) if stations is None else list(stations)
+    names = []
+    for code in stations:
+        for pollutant in data[code].pollutants:
+            name = pollutant_code(pollutant)
+            if name is not None and name not in names:
+                names.append(name)
+
+    # Every pollutant column is averaged per station, then joined end to end
+    offsets = [0]
+    for code in stations:
+        offsets.append(offsets[-1] + len(data[code]))
+    joined = {}
+    for name in names:
+        column = array('d')
+        for code in stations:
+            station = data[code]
+            pollutant = next((p for p in station.pollutants if pollutant_code(p) == name), None)
+            if pollutant is None:
+                column.extend(array('d', [MISSING]) * len(station))
+            else:
+                column.extend(running_mean(station.timestamps, station.column(pollutant),
+                                           AVERAGING_HOURS[name]))
+        joined[name] = index_values(name, column)
+    highest, dominant = combine(joined)
+
+    results = {}
+    for position, code in enumerate(stations):
+        start, stop = offsets[position], offsets[position + 1]
+        results[code] = {
+            'index': highest[start:stop],
+            'dominant': dominant[start:stop],
+            'pollutants': {name: indices[start:stop] for name, indices in joined.items()},
+        }
+    return results
+
+
+def daily_index(data, monitoring_station):
+    """
+    Compute the index of every day of a station: the highest of its hourly indices.
+
+    Args:
+        data (dict): Maps station codes to StationData.
+        monitoring_station (str): The code of the monitoring station.
+
+    Returns:
+        list: One dictionary per day in date order, with its 'date', 'index', 'band'
+            and 'dominant' pollutant; the last three are None on days without any
+            valid reading.
+    """
+    station = data[monitoring_station]
+    hourly = hourly_indices(data, [monitoring_station])[monitoring_station]
+    indices, dominant = hourly['index'], hourly['dominant']
+    result = []
+    for day, (start, stop) in sorted(station.day_index.items()):
+        highest = max(indices[start:stop], default=0)
+        result.append({
+            'date': day_to_date(day),
+            'index': highest or None,
+            'band': band(highest),
+            'dominant': dominant[start + indices[start:stop].index(highest)] if highest else None,
+        })
+    return result
@@ -0,0 +1,146 @@
+# This module produces every report for every station and pollutant in one run.
+#
+# The work is split by station: each worker process loads one station file and
+# runs all report functions for all of its pollutants, so stations are processed
+# in parallel and no data is shared between processes. The results are collected
+# and written to a single JSON file.
+
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import reporting
+
+REPORTS = (
+    'daily_average',
+    'daily_median',
+    'hourly_average',
+    'monthly_average',
+    'weekly_average',
+    'day_of_week_average',
+)
+
+
+def station_reports(station_code, path, pollutants=None, reports=REPORTS, use_cache=True):
+    """
+    Run the reports for every pollutant of one monitoring station.
+
+    Args:
+        station_code (str): The code of the monitoring station.
+        path (str): The path of the station's CSV file.
+        pollutants (list or None): The pollutants to report on. Defaults to all of them.
+        reports (tuple): The names of the report functions in reporting.py to run.
+        use_cache (bool): Whether to use the binary snapshot of the file.
+
+    Returns:
+        dict: Maps each pollutant to a dictionary of report name to report result.
+    """
+    # Each station already has a process of its own, so its file is parsed serially
+    data = {station_code: reporting.read_station(station_code, path, use_cache, workers=1)}
+    if pollutants is None:
+        pollutants = data[station_code].pollutants
+
+    results = {}
+    for pollutant in pollutants:
+        results[pollutant] = {
+            report: getattr(reporting, report)(data, station_code, pollutant) for report in reports
+        }
+    return results
+
+
+def run_batch(station_files=None, pollutants=None, reports=REPORTS, workers=None, use_cache=True):
+    """
+    Run the reports for every station, with one worker process per station at a time.
+
+    Args:
+        station_files (dict or None): Maps station codes to CSV paths. Defaults to
+            reporting.STATION_FILES.
+        pollutants (list or None): The pollutants to report on. Defaults to all of them.
+        reports (tuple): The names of the report functions to run.
+        workers (int or None): The number of worker processes. Defaults to the number
+            of CPUs, and never more than the number of stations.
+        use_cache (bool): Whether to use the binary snapshots of the files.
+
+    Returns:
+        dict: Maps each station code to the results of station_reports.
+    """
+    if station_files is None:
+        station_files = reporting.STATION_FILES
+    for report in reports:
+        if not callable(getattr(reporting, report, None)):
+            raise ValueError(f"Unknown report: {report}")
+
+    codes = list(station_files)
+    workers = min(workers or os.cpu_count() or 1, len(codes)) or 1
+    if workers == 1:
+        return {code: station_reports(code, station_files[code], pollutants, reports, use_cache) for code in codes}
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            code: executor.submit(station_reports, code, station_files[code], pollutants, reports, use_cache)
+            for code in codes
+        }
+        return {code: future.result() for code, future in futures.items()}
+
+
+def write_results(results, output):
+    """
+    Write the results of a batch run as JSON.
+
+    Args:
+        results (dict): The results returned by run_batch.
+        output (str): The path of the output file, or '-' for standard output.
+
+    Returns:
+        None
+    """
+    if output == '-':
+        json.dump(results, sys.stdout, indent=1)
+        sys.stdout.write("\n")
+        return
+    temporary = f"{output}.tmp"
+    with open(temporary, "w") as file:
+        json.dump(results, file, indent=1)
+    os.replace(temporary, output)
+
+
+def main(argv=None):
+    """
+    Run the batch from the command line.
+
+    Args:
+        argv (list or None): The command line arguments. Defaults to sys.argv.
+
+    Returns:
+        int: The exit code.
+    """
+    parser = argparse.ArgumentParser(description="Generate every PR report for every station and pollutant.")
+    parser.add_argument("-o", "--output", default="reports.json", help="output file, or - for standard output")
+    parser.add_argument("-s", "--station", action="append", dest="stations", help="station code (repeatable)")
+    parser.add_argument("-p", "--pollutant", action="append", dest="pollutants", help="pollutant (repeatable)")
+    parser.add_argument("-r", "--report", action="append", dest="reports", help="report name (repeatable)")
+    parser.add_argument("-w", "--workers", type=int, help="number of worker processes")
+    parser.add_argument("--no-cache", action="store_true", help="parse the CSV files instead of using snapshots")
+    args = parser.parse_args(argv)
+
+    station_files = reporting.STATION_FILES
+    if args.stations:
+        unknown = [code for code in args.stations if code not in station_files]
+        if unknown:
+            parser.error(f"unknown station: {', '.join(unknown)}")
+        station_files = {code: station_files[code] for code in args.stations}
+
+    reports = tuple(args.reports or REPORTS)
+    unknown = [report for report in reports if report not in REPORTS]
+    if unknown:
+        parser.error(f"unknown report: {', '.join(unknown)}")
+
+    results = run_batch(station_files, args.pollutants, reports, args.workers, not args.no_cache)
+    write_results(results, args.output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
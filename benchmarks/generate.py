@@ -0,0 +1,103 @@
+# Generator of synthetic station CSV files for the benchmarks.
+#
+# The files use the same date,time,no,pm10,pm25 layout as the files in data/,
+# with hourly rows stamped 01:00:00 to 24:00:00, so they can be read by
+# reporting.read_station and store.load_csv. Extra pollutant columns and a
+# fraction of "No data" cells can be added.
+
+import argparse
+import math
+import os
+import random
+import sys
+from datetime import date, timedelta
+
+POLLUTANTS = ('no', 'pm10', 'pm25')
+
+
+def generate_station(path, years=1, start_year=2021, missing_rate=0.0, extra_pollutants=(), seed=0):
+    """
+    Write a synthetic station CSV file with one row per hour.
+
+    Args:
+        path (str): The path of the file to write.
+        years (int): The number of years of hourly rows.
+        start_year (int): The year of the first row.
+        missing_rate (float): The fraction of pollutant cells written as "No data".
+        extra_pollutants (tuple): Names of pollutant columns to add after pm25.
+        seed (int): The seed of the random number generator.
+
+    Returns:
+        int: The number of rows written.
+    """
+    rng = random.Random(seed)
+    pollutants = POLLUTANTS + tuple(extra_pollutants)
+    # Every pollutant gets its own level and a daily cycle that peaks in the evening
+    levels = [rng.uniform(5, 40) for _ in pollutants]
+    daily_cycle = [1 + 0.5 * math.sin((hour - 8) / 24 * 2 * math.pi) for hour in range(25)]
+
+    day = date(start_year, 1, 1)
+    end = date(start_year + years, 1, 1)
+    rows = 0
+    with open(path, "w") as file:
+        file.write(",".join(("date", "time") + pollutants))
+        while day < end:
+            text = day.isoformat()
+            season = 1 + 0.3 * math.cos((day.timetuple().tm_yday / 365) * 2 * math.pi)
+            for hour in range(1, 25):
+                cells = []
+                for level in levels:
+                    if missing_rate and rng.random() < missing_rate:
+                        cells.append("No data")
+                    else:
+                        cells.append(f"{level * season * daily_cycle[hour] * rng.lognormvariate(0, 0.4):.3f}")
+                file.write(f"\n{text},{hour:02}:00:00,{','.join(cells)}")
+                rows += 1
+            day += timedelta(days=1)
+    return rows
+
+
+def generate_stations(directory, stations=3, years=1, missing_rate=0.0, extra_pollutants=(), seed=0):
+    """
+    Write several synthetic station files into a directory.
+
+    Args:
+        directory (str): The directory to write to; it is created if needed.
+        stations (int): The number of stations.
+        years (int): The number of years of hourly rows per station.
+        missing_rate (float): The fraction of pollutant cells written as "No data".
+        extra_pollutants (tuple): Names of pollutant columns to add.
+        seed (int): The seed of the first station; each station adds its index.
+
+    Returns:
+        dict: Maps the generated station codes to their file paths.
+    """
+    os.makedirs(directory, exist_ok=True)
+    station_files = {}
+    for index in range(stations):
+        code = f"S{index:02}"
+        path = os.path.join(directory, f"Pollution-Synthetic {code}.csv")
+        generate_station(path, years, missing_rate=missing_rate,
+                         extra_pollutants=extra_pollutants, seed=seed + index)
+        station_files[code] = path
+    return station_files
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic station CSV files.")
+    parser.add_argument("directory", help="directory to write the files to")
+    parser.add_argument("--stations", type=int, default=3)
+    parser.add_argument("--years", type=int, default=1)
+    parser.add_argument("--missing-rate", type=float, default=0.0)
+    parser.add_argument("--extra-pollutant", action="append", default=[], dest="extra_pollutants")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    files = generate_stations(args.directory, args.stations, args.years, args.missing_rate,
+                              tuple(args.extra_pollutants), args.seed)
+    for code, path in files.items():
+        print(f"{code} {path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
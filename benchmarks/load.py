@@ -0,0 +1,179 @@
+# Load generator for the query service in server.py.
+#
+#     python benchmarks/load.py --concurrency 1,4,16 --requests 400
+#     python benchmarks/load.py --url http://127.0.0.1:8000 --station MY1 --pollutant pm10
+#
+# Without --url, a synthetic station is generated and served in-process. Every
+# concurrency level sends the same mix of report queries from that many client
+# threads, each on its own connections, and reports the p50 and p99 latency, the
+# requests per second and the number of failed requests.
+
+import argparse
+import http.client
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+
+# Get the parent directory of the current file
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.join(current_dir, '..')
+
+# Add the parent directory to the sys.path list
+sys.path.append(parent_dir)
+sys.path.append(current_dir)
+import quantiles
+import reporting
+from batch import REPORTS
+from generate import generate_station
+
+
+def query_paths(station, pollutant, dates=()):
+    """
+    Build the mix of report queries sent by the load generator.
+
+    Args:
+        station (str): The code of the monitoring station.
+        pollutant (str): The name of the pollutant.
+        dates (tuple): Dates for peak_hour_date queries, in 'YYYY-MM-DD' format.
+
+    Returns:
+        list: The request paths.
+    """
+    paths = [f"/report/{report}?" + urlencode({'station': station, 'pollutant': pollutant})
+             for report in REPORTS]
+    paths += ["/report/peak_hour_date?" + urlencode({'station': station, 'pollutant': pollutant, 'date': day})
+              for day in dates]
+    return paths
+
+
+def run_level(host, port, paths, concurrency, requests, timeout=30.0):
+    """
+    Send requests from several client threads and time every one of them.
+
+    Args:
+        host (str): The server address.
+        port (int): The server port.
+        paths (list): The request paths, sent in turn.
+        concurrency (int): The number of client threads.
+        requests (int): The total number of requests.
+        timeout (float): The socket timeout of every request.
+
+    Returns:
+        dict: The 'concurrency', 'requests', 'errors', 'seconds', 'rps', 'p50'
+            and 'p99' latencies in seconds.
+    """
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def client():
+        own = []
+        failed = 0
+        while True:
+            with lock:
+                number = next(counter, None)
+            if number is None:
+                break
+            started = time.perf_counter()
+            connection = http.client.HTTPConnection(host, port, timeout=timeout)
+            try:
+                connection.request("GET", paths[number % len(paths)])
+                response = connection.getresponse()
+                response.read()
+                failed += response.status != 200
+            except (OSError, http.client.HTTPException):
+                failed += 1
+            finally:
+                connection.close()
+            own.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(own)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - started
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors[0],
+        "seconds": seconds,
+        "rps": len(latencies) / seconds if seconds else 0.0,
+        "p50": quantiles.percentile(latencies, 50),
+        "p99": quantiles.percentile(latencies, 99),
+    }
+
+
+def local_server(workdir, years=1, workers=None):
+    """
+    Serve one synthetic station in a background thread.
+
+    Args:
+        workdir (str): A directory for the generated file.
+        years (int): The number of years of hourly rows.
+        workers (int or None): The number of server threads. Defaults to server.WORKERS.
+
+    Returns:
+        QueryServer: The running server, on a free port; call shutdown() to stop it.
+    """
+    import server
+
+    path = os.path.join(workdir, f"station-{years}y.csv")
+    generate_station(path, years, missing_rate=0.01)
+    data = {"S00": reporting.read_station("S00", path, use_cache=False)}
+    service = server.QueryServer(("127.0.0.1", 0), data, workers or server.WORKERS)
+    threading.Thread(target=service.serve_forever, daemon=True).start()
+    return service
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the latency and throughput of the query service.")
+    parser.add_argument("--url", help="server to load (default: serve a synthetic station in-process)")
+    parser.add_argument("--station", default="S00", help="station to query (default: S00)")
+    parser.add_argument("--pollutant", default="pm10", help="pollutant to query (default: pm10)")
+    parser.add_argument("--date", action="append", default=[], help="add peak_hour_date queries for a date")
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated client threads (default: 1,4,16)")
+    parser.add_argument("--requests", type=int, default=200, help="requests per concurrency level (default: 200)")
+    parser.add_argument("--years", type=int, default=1, help="size of the synthetic station (default: 1)")
+    parser.add_argument("--workers", type=int, help="threads of the in-process server")
+    parser.add_argument("-o", "--output", help="also write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    levels = [int(level) for level in args.concurrency.split(",")]
+    dates = args.date or ([] if args.url else ["2021-03-01", "2021-07-15"])
+    paths = query_paths(args.station, args.pollutant, dates)
+    with tempfile.TemporaryDirectory() as workdir:
+        service = None
+        if args.url:
+            url = urlsplit(args.url)
+            host, port = url.hostname, url.port or 80
+        else:
+            service = local_server(workdir, args.years, args.workers)
+            host, port = service.server_address[:2]
+        try:
+            results = [run_level(host, port, paths, level, args.requests) for level in levels]
+        finally:
+            if service is not None:
+                service.shutdown()
+                service.server_close()
+
+    for entry in results:
+        print(f"concurrency {entry['concurrency']:>4} {entry['requests']:>7} requests {entry['rps']:>10.1f} req/s "
+              f"p50 {entry['p50'] * 1000:>9.3f} ms p99 {entry['p99'] * 1000:>9.3f} ms {entry['errors']:>5} errors")
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=1)
+    return 1 if any(entry['errors'] for entry in results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,231 @@
+# Benchmarks of the reporting hot paths over synthetic data of growing size.
+#
+#     python benchmarks/run.py --years 1,10,100 --output benchmarks/results/new.json
+#     python benchmarks/run.py compare benchmarks/results/old.json benchmarks/results/new.json
+#
+# Every measurement is the best of several repeats. Results are written as JSON
+# with the machine and commit they were taken on, and two result files can be
+# compared to find regressions.
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# Get the parent directory of the current file
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.join(current_dir, '..')
+
+# Add the parent directory to the sys.path list
+sys.path.append(parent_dir)
+sys.path.append(current_dir)
+import aqi
+import memo
+import parallel_csv
+import reporting
+import snapshot
+import utils
+from batch import REPORTS
+from generate import generate_station
+from store import load_csv
+
+DEFAULT_OUTPUT = os.path.join(current_dir, "results", "latest.json")
+
+
+def best_of(function, repeats, setup=None):
+    """
+    Time a function several times and keep the fastest run.
+
+    Args:
+        function (callable): The function to time, called without arguments.
+        repeats (int): The number of runs.
+        setup (callable or None): Called before every run, outside the timing.
+
+    Returns:
+        float: The fastest run in seconds.
+    """
+    best = float('inf')
+    for _ in range(repeats):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def bench_size(years, workdir, repeats=3, lookups=100, missing_rate=0.01):
+    """
+    Run every benchmark over one synthetic station of a given size.
+
+    Args:
+        years (int): The number of years of hourly rows.
+        workdir (str): A directory for the generated file and its snapshot.
+        repeats (int): The number of runs per measurement.
+        lookups (int): The number of peak_hour_date lookups per run.
+        missing_rate (float): The fraction of "No data" cells.
+
+    Returns:
+        list: One dictionary per measurement.
+    """
+    path = os.path.join(workdir, f"station-{years}y.csv")
+    rows = generate_station(path, years, missing_rate=missing_rate)
+    cache_dir = os.path.join(workdir, f"cache-{years}y")
+    results = []
+
+    def record(name, seconds, count=rows):
+        results.append({"name": name, "years": years, "rows": count, "seconds": seconds})
+
+    record("load.parse_csv", best_of(lambda: load_csv(path, "S00"), repeats))
+    record("load.parse_csv_parallel", best_of(lambda: parallel_csv.load_csv(path, "S00", min_bytes=0), repeats))
+    record("load.parse_and_snapshot", best_of(lambda: snapshot.save(load_csv(path, "S00"), path, cache_dir), 1))
+    record("load.snapshot_read",
+           best_of(lambda: snapshot.load_station(path, "S00", cache_dir), repeats))
+
+    station = reporting.read_station("S00", path, use_cache=False)
+    data = {"S00": station}
+    # Every repeat starts from an empty report cache, so the reports are computed
+    # again rather than looked up; the .memo measurements time the lookup itself
+    for report in REPORTS:
+        function = getattr(reporting, report)
+        record(f"report.{report}.cold", best_of(lambda: function(data, "S00", "pm10"), repeats, station.mark_changed))
+        record(f"report.{report}.warm", best_of(lambda: function(data, "S00", "pm10"), repeats, memo.cache.clear))
+        record(f"report.{report}.memo", best_of(lambda: function(data, "S00", "pm10"), repeats))
+
+    # A station freshly loaded from its snapshot reads the stored aggregates
+    stored = {}
+    reload = lambda: stored.update(S00=snapshot.load_station(path, "S00", cache_dir))
+    for report in REPORTS:
+        function = getattr(reporting, report)
+        record(f"report.{report}.stored", best_of(lambda: function(stored, "S00", "pm10"), repeats, reload))
+
+    record("compute.aqi_hourly", best_of(lambda: aqi.hourly_indices(data), repeats))
+
+    rng = random.Random(0)
+    days = list(station.day_index)
+    dates = [station.date(station.day_index[rng.choice(days)][0]) for _ in range(lookups)]
+    # The dates may repeat, so the lookups bypass the report cache
+    peak_hour_date = reporting.peak_hour_date.__wrapped__
+    record("report.peak_hour_date",
+           best_of(lambda: [peak_hour_date(data, day, "S00", "pm10") for day in dates], repeats),
+           lookups)
+
+    column = station.column("pm10")
+    values = list(column)
+    for name in ("sumvalues", "maxvalue", "minvalue", "meanvalue", "describe"):
+        function = getattr(utils, name)
+        record(f"utils.{name}.list", best_of(lambda: function(values), repeats))
+        record(f"utils.{name}.array", best_of(lambda: function(column), repeats))
+    return results
+
+
+def git_commit():
+    """Return the current commit of the repository, or None outside a git checkout."""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=parent_dir,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(sizes, repeats=3, lookups=100, missing_rate=0.01):
+    """
+    Run the benchmarks for several sizes.
+
+    Args:
+        sizes (list): The numbers of years of hourly rows to benchmark.
+        repeats (int): The number of runs per measurement.
+        lookups (int): The number of peak_hour_date lookups per run.
+        missing_rate (float): The fraction of "No data" cells.
+
+    Returns:
+        dict: The 'meta' data of the run and its 'results'.
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for years in sizes:
+            results.extend(bench_size(years, workdir, repeats, lookups, missing_rate))
+    meta = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "repeats": repeats,
+    }
+    return {"meta": meta, "results": results}
+
+
+def compare(old, new, threshold=1.25):
+    """
+    Compare two benchmark runs.
+
+    Args:
+        old (dict): The earlier run.
+        new (dict): The later run.
+        threshold (float): The slowdown ratio from which a measurement is a regression.
+
+    Returns:
+        list: (name, years, old seconds, new seconds, ratio, regressed) for every
+            measurement present in both runs.
+    """
+    before = {(entry["name"], entry["years"]): entry["seconds"] for entry in old["results"]}
+    rows = []
+    for entry in new["results"]:
+        key = (entry["name"], entry["years"])
+        if key in before:
+            ratio = entry["seconds"] / before[key] if before[key] else float('inf')
+            rows.append((key[0], key[1], before[key], entry["seconds"], ratio, ratio > threshold))
+    return rows
+
+
+def print_results(run_results):
+    for entry in run_results["results"]:
+        per_row = entry["seconds"] / entry["rows"] * 1e9 if entry["rows"] else 0
+        print(f"{entry['name']:<36} {entry['years']:>4}y {entry['seconds'] * 1000:>12.3f} ms {per_row:>10.1f} ns/row")
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == "compare":
+        parser = argparse.ArgumentParser(prog="run.py compare", description="Compare two benchmark runs.")
+        parser.add_argument("old")
+        parser.add_argument("new")
+        parser.add_argument("--threshold", type=float, default=1.25,
+                            help="slowdown ratio reported as a regression (default: 1.25)")
+        args = parser.parse_args(argv[1:])
+        with open(args.old) as file:
+            old = json.load(file)
+        with open(args.new) as file:
+            new = json.load(file)
+        regressions = 0
+        for name, years, before, after, ratio, regressed in compare(old, new, args.threshold):
+            flag = "REGRESSION" if regressed else ""
+            print(f"{name:<36} {years:>4}y {before * 1000:>12.3f} -> {after * 1000:>12.3f} ms x{ratio:.2f} {flag}")
+            regressions += regressed
+        return 1 if regressions else 0
+
+    parser = argparse.ArgumentParser(description="Benchmark the reporting hot paths on synthetic data.")
+    parser.add_argument("--years", default="1,10", help="comma-separated sizes in years (default: 1,10)")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--lookups", type=int, default=100, help="peak_hour_date lookups per run")
+    parser.add_argument("--missing-rate", type=float, default=0.01)
+    parser.add_argument("-o", "--output", default=DEFAULT_OUTPUT)
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.years.split(",")]
+    run_results = run(sizes, args.repeats, args.lookups, args.missing_rate)
+    print_results(run_results)
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as file:
+        json.dump(run_results, file, indent=1)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
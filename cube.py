@@ -0,0 +1,166 @@
+# This module stores the aggregates of a pollutant column on disk.
+#
+# The aggregates computed by aggregation.py - the sum, count, minimum and maximum
+# per hour of the day, date, ISO week, month and day of the week - are written
+# next to the snapshot of the station, one file per pollutant, when the snapshot
+# is saved. A station opened from its snapshot later reads them back instead of
+# folding every row again, so the average reports are answered by looking them up.
+#
+# Each file starts with a JSON header line holding the hash of the source CSV file
+# it was computed from, the number of rows and the size of every table. The tables
+# follow as raw machine-format arrays: the keys, sums, counts, minima and maxima.
+# A file whose hash does not match the snapshot manifest is ignored, and each
+# table is only decoded when a report first asks for it.
+
+import json
+import os
+from array import array
+
+from aggregation import GROUPINGS, Aggregates
+
+
+def _key_number(grouping, key):
+    # Monthly keys are (year, month) pairs, stored as a month count
+    if grouping == 'monthly':
+        return key[0] * 12 + key[1] - 1
+    return key
+
+
+def _key(grouping, number):
+    if grouping == 'monthly':
+        return number // 12, number % 12 + 1
+    return number
+
+
+def encode(aggregates, sha256):
+    """
+    Serialize the aggregates of a pollutant column.
+
+    Args:
+        aggregates (Aggregates): The aggregates.
+        sha256 (str): The content hash of the source file they were computed from.
+
+    Returns:
+        bytes: The file contents.
+    """
+    lengths = {}
+    body = []
+    for grouping in GROUPINGS:
+        table = aggregates.table(grouping)
+        keys = sorted(table)
+        lengths[grouping] = len(keys)
+        accumulators = [table[key] for key in keys]
+        body.append(array('q', [_key_number(grouping, key) for key in keys]).tobytes())
+        body.append(array('d', [accumulator[0] for accumulator in accumulators]).tobytes())
+        body.append(array('q', [accumulator[1] for accumulator in accumulators]).tobytes())
+        body.append(array('d', [accumulator[2] for accumulator in accumulators]).tobytes())
+        body.append(array('d', [accumulator[3] for accumulator in accumulators]).tobytes())
+    header = json.dumps({"sha256": sha256, "rows": aggregates.rows, "lengths": lengths})
+    return header.encode() + b"\n" + b"".join(body)
+
+
+class StoredAggregates(Aggregates):
+    """
+    Aggregates read from a file, whose tables are only decoded when first used.
+
+    A report that needs the hourly table does not pay for decoding the daily one,
+    whose size grows with the length of the history.
+    """
+
+    def __init__(self, data, offsets, rows):
+        # The tables are left unset; __getattr__ decodes each on first access
+        self._data = data
+        self._offsets = offsets
+        self.rows = rows
+
+    def __getattr__(self, name):
+        if name not in GROUPINGS or '_offsets' not in self.__dict__:
+            raise AttributeError(name)
+        offset, length = self._offsets[name]
+        parts = []
+        for typecode in 'qdqdd':
+            values = array(typecode)
+            stop = offset + values.itemsize * length
+            values.frombytes(self._data[offset:stop])
+            parts.append(values)
+            offset = stop
+        table = {}
+        for key, total, count, low, high in zip(*parts):
+            table[_key(name, key)] = [total, count, low, high]
+        setattr(self, name, table)
+        return table
+
+
+def decode(data, sha256=None):
+    """
+    Rebuild the aggregates of a pollutant column from the contents of its file.
+
+    Args:
+        data (bytes): The file contents.
+        sha256 (str or None): The content hash the aggregates must have been computed
+            from. Not checked if None.
+
+    Returns:
+        Aggregates: The aggregates, or None if the contents are malformed or belong
+            to another version of the source file.
+    """
+    end = data.find(b"\n")
+    if end < 0:
+        return None
+    try:
+        header = json.loads(data[:end])
+        lengths = [header["lengths"][grouping] for grouping in GROUPINGS]
+        rows = header["rows"]
+    except (ValueError, KeyError, TypeError):
+        return None
+    if sha256 is not None and header.get("sha256") != sha256:
+        return None
+
+    # Every table holds its keys, sums, counts, minima and maxima, eight bytes each
+    offsets = {}
+    offset = end + 1
+    for grouping, length in zip(GROUPINGS, lengths):
+        offsets[grouping] = (offset, length)
+        offset += 5 * 8 * length
+    if offset != len(data):
+        return None
+    return StoredAggregates(data, offsets, rows)
+
+
+def read(file_name, sha256=None):
+    """
+    Read the aggregates of a pollutant column from a file.
+
+    Args:
+        file_name (str): The path of the file.
+        sha256 (str or None): The content hash the aggregates must have been computed from.
+
+    Returns:
+        Aggregates: The aggregates, or None if the file is missing, malformed or stale.
+    """
+    try:
+        with open(file_name, "rb") as file:
+            data = file.read()
+    except OSError:
+        return None
+    return decode(data, sha256)
+
+
+def loader(file_names, sha256):
+    """
+    Return a function that reads the stored aggregates of a station by pollutant.
+
+    Args:
+        file_names (dict): Maps each pollutant to the path of its file.
+        sha256 (str): The content hash of the current source file.
+
+    Returns:
+        callable: Takes a pollutant name and returns its Aggregates, or None if
+            there is no usable file for it.
+    """
+    def load(pollutant):
+        file_name = file_names.get(pollutant)
+        if file_name is None or not os.path.exists(file_name):
+            return None
+        return read(file_name, sha256)
+    return load
@@ -0,0 +1,180 @@
+# This module follows the station CSV files as new rows are appended to them.
+#
+# Each file is read from the byte offset where the previous read stopped, and only
+# the new rows are parsed and appended to the station data. Aggregates already
+# cached on the station are updated with the new rows, so reports stay current
+# without a full reload.
+
+import os
+from array import array
+
+from store import StationData, parse_value, timestamp
+import reporting
+
+
+class TailReader:
+    """
+    Reads the rows appended to one station CSV file since the last poll.
+
+    A row may be appended in several writes, so a last line without a newline is
+    only read once the file has stopped growing: when its size is the same as at
+    the previous poll, or on the first poll, and the line has as many fields as the
+    header and parses cleanly. The station files are written without a trailing
+    newline, so this is how their last row is read. If more bytes arrive after it,
+    the line is read again, and the row is replaced if the line has changed.
+
+    A line with the wrong number of fields, or a date, time or value that cannot be
+    parsed, is skipped and counted, and reading goes on after it.
+
+    Attributes:
+        path (str): The path of the CSV file.
+        station (StationData): The rows read so far.
+        offset (int): The byte offset up to which the file has been read.
+        skipped (int): The number of malformed lines skipped.
+        last_error (str or None): Why the last malformed line was skipped.
+    """
+
+    def __init__(self, path, code):
+        self.path = path
+        self.station = StationData(code)
+        self.offset = 0
+        self.header = None
+        self.skipped = 0
+        self.last_error = None
+        # The size at the previous poll, and the unterminated last line read as a row
+        self._size = None
+        self._pending = None
+
+    def _reset(self):
+        # The file was truncated or replaced; start again from the beginning
+        self.station.clear()
+        self.offset = 0
+        self.header = None
+        self._pending = None
+
+    def poll(self):
+        """
+        Parse the rows appended since the last poll and add them to the station.
+
+        Returns:
+            int: The number of rows added.
+        """
+        size = os.path.getsize(self.path)
+        previous = self._size
+        if previous is not None and size < previous:
+            self._reset()
+        self._size = size
+        settled = previous is None or size == previous
+        if size == self.offset or (self._pending is not None and size == previous):
+            return 0
+
+        with open(self.path, "rb") as file:
+            file.seek(self.offset)
+            chunk = file.read(size - self.offset)
+
+        lines = chunk.split(b"\n")
+        tail = lines.pop()
+        self.offset += len(chunk) - len(tail)
+
+        added = 0
+        if self._pending is not None:
+            # The offset is still at the start of the line read without its newline
+            if lines and lines[0] == self._pending:
+                lines.pop(0)
+            else:
+                added -= self.station.truncate(len(self.station) - 1)
+            self._pending = None
+
+        timestamps = []
+        values = {}
+        for line in lines:
+            self._parse_line(line, timestamps, values)
+        if tail and settled and self.header is not None:
+            try:
+                ts, row = self._parse_row(tail)
+            except ValueError:
+                pass  # Read, or skipped, once its newline arrives
+            else:
+                self._add(ts, row, timestamps, values)
+                self._pending = tail
+        if timestamps:
+            added += self.station.extend(timestamps, values)
+        return added
+
+    def _parse_line(self, line, timestamps, values):
+        line = line.rstrip(b"\r")
+        if not line:
+            return
+        if self.header is None:
+            fields = line.decode(errors="replace").split(",")
+            self.header = fields
+            self._date_index = fields.index('date')
+            self._time_index = fields.index('time')
+            self._pollutants = [(i, name) for i, name in enumerate(fields) if name not in ('date', 'time')]
+            for _, name in self._pollutants:
+                self.station.columns.setdefault(name, array('d'))
+            return
+        try:
+            ts, row = self._parse_row(line)
+        except ValueError as error:
+            self._skip(f"{error}: {line!r}")
+            return
+        self._add(ts, row, timestamps, values)
+
+    def _parse_row(self, line):
+        # Raises ValueError for a line that is not a row of this file
+        fields = line.rstrip(b"\r").decode(errors="replace").split(",")
+        if len(fields) != len(self.header):
+            raise ValueError(f"expected {len(self.header)} fields, got {len(fields)}")
+        ts = timestamp(fields[self._date_index], fields[self._time_index])
+        return ts, [parse_value(fields[i]) for i, _ in self._pollutants]
+
+    def _add(self, ts, row, timestamps, values):
+        timestamps.append(ts)
+        for (_, name), value in zip(self._pollutants, row):
+            values.setdefault(name, []).append(value)
+
+    def _skip(self, reason):
+        self.skipped += 1
+        self.last_error = reason
+
+
+class Follower:
+    """
+    Keeps the data of several station files current by polling them for new rows.
+
+    Attributes:
+        data (dict): Maps each station code to its StationData, in the form the
+            functions in reporting.py expect.
+    """
+
+    def __init__(self, station_files=None):
+        if station_files is None:
+            station_files = reporting.STATION_FILES
+        self.readers = {code: TailReader(path, code) for code, path in station_files.items()}
+        self.data = {code: reader.station for code, reader in self.readers.items()}
+
+    def poll(self):
+        """
+        Read the rows appended to every file since the last poll.
+
+        Returns:
+            dict: Maps each station code to the number of rows added.
+        """
+        return {code: reader.poll() for code, reader in self.readers.items()}
+
+
+def follow_csv_files(station_files=None):
+    """
+    Start following the station CSV files and read everything they hold so far.
+
+    Args:
+        station_files (dict or None): Maps station codes to CSV paths. Defaults to
+            reporting.STATION_FILES.
+
+    Returns:
+        Follower: The follower; call its poll() method to pick up new rows.
+    """
+    follower = Follower(station_files)
+    follower.poll()
+    return follower
@@ -0,0 +1,308 @@
+# This module loads station data on demand, one station and one pollutant at a time.
+#
+# StationFiles stands in for the dictionary returned by reporting.read_csv_files:
+# a station is only opened when it is first looked up, and opening it reads just
+# the timestamps from its snapshot. Each pollutant column, and its validity mask,
+# is read the first time a report asks for it. The columns read are kept in a
+# ColumnCache shared by all stations, which drops the least recently used ones
+# once it holds more than its byte budget; a dropped column is read again from
+# the snapshot when needed.
+
+import threading
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+import snapshot
+from store import Bitmask, StationData
+
+# The default number of bytes of pollutant columns kept in memory
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+class ColumnCache:
+    """
+    A least-recently-used budget for the pollutant columns loaded by LazyColumns.
+
+    Attributes:
+        max_bytes (int): The number of bytes of columns kept in memory.
+        bytes (int): The number of bytes of columns currently held.
+        loads (int): The number of columns read from the snapshots.
+        evictions (int): The number of columns dropped to stay within the budget.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.loads = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, columns, name, values):
+        """
+        Account for a column that was just loaded, dropping older ones if needed.
+
+        Args:
+            columns (LazyColumns): The columns of the station it belongs to.
+            name (str): The name of the pollutant.
+            values (array or Bitmask): The loaded values.
+
+        Returns:
+            None
+        """
+        size = len(values.bits) if isinstance(values, Bitmask) else values.itemsize * len(values)
+        with self._lock:
+            key = (id(columns), name)
+            self.loads += 1
+            self._entries[key] = (columns, name, size)
+            self.bytes += size
+            # The column just loaded is never dropped, even if it exceeds the budget
+            while self.bytes > self.max_bytes and len(self._entries) > 1:
+                _, (owner, owner_name, owner_size) = self._entries.popitem(last=False)
+                self.bytes -= owner_size
+                if owner.evict(owner_name):
+                    self.evictions += 1
+
+    def touch(self, columns, name):
+        """
+        Mark a column as recently used.
+
+        Args:
+            columns (LazyColumns): The columns of the station it belongs to.
+            name (str): The name of the pollutant.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            key = (id(columns), name)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+
+    def discard(self, columns, name):
+        """
+        Stop accounting for a column, which is then kept until its station is dropped.
+
+        Args:
+            columns (LazyColumns): The columns of the station it belongs to.
+            name (str): The name of the pollutant.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            entry = self._entries.pop((id(columns), name), None)
+            if entry is not None:
+                self.bytes -= entry[2]
+
+    def stats(self):
+        """
+        Return the cache counters.
+
+        Returns:
+            dict: The columns held, their bytes, and the loads and evictions so far.
+        """
+        with self._lock:
+            return {"columns": len(self._entries), "bytes": self.bytes,
+                    "loads": self.loads, "evictions": self.evictions}
+
+
+class LazyColumns(MutableMapping):
+    """
+    The pollutant columns of a station, each read from its snapshot on first access.
+
+    Every pollutant is listed from the start, so membership tests and iteration
+    over the names never load anything. Columns can only be dropped while the
+    station is unchanged since it was opened; after that they are kept.
+    """
+
+    def __init__(self, names, loader, cache):
+        self._names = list(names)
+        self._loader = loader
+        self._cache = cache
+        self._values = {}
+        self._lock = threading.Lock()
+        self.station = None
+        self._version = 0
+
+    def bind(self, station):
+        """
+        Attach the columns to their station, so changes to it can be noticed.
+
+        Args:
+            station (StationData): The station that owns the columns.
+
+        Returns:
+            None
+        """
+        self.station = station
+        self._version = station.version
+
+    def __getitem__(self, name):
+        values = self._values.get(name)
+        if values is not None:
+            self._cache.touch(self, name)
+            return values
+        if name not in self._names:
+            raise KeyError(name)
+        with self._lock:
+            values = self._values.get(name)
+            if values is None:
+                values = self._loader(name)
+                self._values[name] = values
+                self._cache.add(self, name, values)
+        return values
+
+    def __setitem__(self, name, values):
+        if name not in self._names:
+            self._names.append(name)
+        self._cache.discard(self, name)
+        self._values[name] = values
+
+    def __delitem__(self, name):
+        self._names.remove(name)
+        self._cache.discard(self, name)
+        self._values.pop(name, None)
+
+    def __contains__(self, name):
+        return name in self._names
+
+    def __iter__(self):
+        return iter(list(self._names))
+
+    def __len__(self):
+        return len(self._names)
+
+    def loaded(self):
+        """Return the names of the columns currently in memory."""
+        return list(self._values)
+
+    def evict(self, name):
+        """
+        Drop a column from memory if it can be read again unchanged.
+
+        Args:
+            name (str): The name of the pollutant.
+
+        Returns:
+            bool: True if the column was dropped.
+        """
+        if self.station is not None and self.station.version != self._version:
+            return False
+        return self._values.pop(name, None) is not None
+
+
+def open_station(path, code, cache=None, start_date=None, end_date=None):
+    """
+    Open a station file, reading its timestamps now and its pollutant columns on demand.
+
+    The snapshot is refreshed first if it is missing or out of date, which parses
+    the whole CSV file once. If the snapshot cannot be written, the parsed data is
+    returned as it is.
+
+    Args:
+        path (str): The path of the station CSV file.
+        code (str): The code of the monitoring station.
+        cache (ColumnCache or None): The budget for the loaded columns. Defaults to
+            a new cache with DEFAULT_MAX_BYTES.
+        start_date (str or None): Only use rows from this date on, in 'YYYY-MM-DD' format.
+        end_date (str or None): Only use rows before this date, in 'YYYY-MM-DD' format.
+
+    Returns:
+        StationData: The station; its columns and masks are LazyColumns mappings.
+    """
+    if cache is None:
+        cache = ColumnCache()
+    meta = snapshot.read_meta(path)
+    if not snapshot.is_current(path, meta):
+        station = snapshot.load_station(path, code, start_date=start_date, end_date=end_date)
+        meta = snapshot.read_meta(path)
+        if not snapshot.is_current(path, meta):
+            return station
+
+    partitions = snapshot.select_partitions(meta, start_date, end_date)
+    timestamps = snapshot.read_column(path, meta, "ts", partitions)
+    if timestamps is None:
+        return snapshot.load_station(path, code, start_date=start_date, end_date=end_date)
+    start, stop = StationData(code, timestamps).date_range_span(start_date or '0001-01-01',
+                                                                end_date or '9999-12-31')
+    whole = (start, stop) == (0, len(timestamps))
+
+    def load_column(pollutant):
+        values = snapshot.read_column(path, meta, pollutant, partitions)
+        if values is None:
+            raise OSError(f"Snapshot of {path} is incomplete")
+        return values if whole else values[start:stop]
+
+    def load_mask(pollutant):
+        mask = snapshot.read_mask(path, meta, pollutant, partitions)
+        if mask is None:
+            raise OSError(f"Snapshot of {path} is incomplete")
+        return mask if whole else mask.slice(start, stop)
+
+    if not whole:
+        timestamps = timestamps[start:stop]
+    columns = LazyColumns(meta["pollutants"], load_column, cache)
+    masks = LazyColumns(meta["pollutants"], load_mask, cache)
+    station = StationData(code, timestamps, columns, masks)
+    station.build_index()
+    columns.bind(station)
+    masks.bind(station)
+    if whole and len(partitions) == len(meta["partitions"]):
+        # The stored aggregates describe exactly these rows
+        snapshot.attach_cube(station, path, meta)
+    return station
+
+
+class StationFiles(MutableMapping):
+    """
+    Maps station codes to their data, opening each station file on first access.
+
+    Attributes:
+        station_files (dict): Maps station codes to CSV paths.
+        cache (ColumnCache): The budget shared by the columns of every station.
+    """
+
+    def __init__(self, station_files, start_date=None, end_date=None, cache=None):
+        self.station_files = dict(station_files)
+        self.cache = ColumnCache() if cache is None else cache
+        self._start_date = start_date
+        self._end_date = end_date
+        self._stations = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, code):
+        station = self._stations.get(code)
+        if station is not None:
+            return station
+        if code not in self.station_files:
+            raise KeyError(code)
+        with self._lock:
+            station = self._stations.get(code)
+            if station is None:
+                station = open_station(self.station_files[code], code, self.cache,
+                                       self._start_date, self._end_date)
+                self._stations[code] = station
+        return station
+
+    def __setitem__(self, code, station):
+        self._stations[code] = station
+
+    def __delitem__(self, code):
+        if code not in self:
+            raise KeyError(code)
+        self.station_files.pop(code, None)
+        self._stations.pop(code, None)
+
+    def __contains__(self, code):
+        return code in self._stations or code in self.station_files
+
+    def __iter__(self):
+        return iter(list(dict.fromkeys(list(self.station_files) + list(self._stations))))
+
+    def __len__(self):
+        return len(set(self.station_files) | set(self._stations))
+
+    def loaded(self):
+        """Return the codes of the stations opened so far."""
+        return list(self._stations)
@@ -2,10 +2,19 @@
 # You should modify the functions below to match
 # the signatures determined by the project specification
 
+import argparse
+import csv
+import itertools
+import json
 import sys
+import time
+import api
+import memo
+import metrics
 import monitoring
 import reporting
 import datetime
+from batch import REPORTS
 
 def main_menu():
     """
@@ -50,7 +59,8 @@ def reporting_menu():
     menu_level = 1
     monitoring_station = ''
     pollutant = ''
-    data = reporting.read_csv_files()
+    # Stations and pollutant columns are only read when a report needs them
+    data = reporting.open_csv_files()
     while True:
         if menu_level == 1:
             print("Monitoring Station:")
@@ -139,21 +149,27 @@ def reporting_menu():
                     print(average)
                 input(">>> Press Enter to return to Hourly Report Menu...")
             elif choice4 == '2':
+                # The valid window is the span of the station's own data
+                station = reporting.get_station(data, monitoring_station)
+                bounds = station.date_bounds() if station is not None else None
+                if bounds is None:
+                    print(f"No data for {monitoring_station}.")
+                    input(">>> Press Enter to return to Hourly Report Menu...")
+                    continue
+                start_date, end_date = bounds
                 while True:
                     choice5 = input("Enter a date (YYYY-MM-DD): ")
 
                     try:
                         chosen_date = datetime.datetime.strptime(choice5, "%Y-%m-%d").date()
-                        start_date = datetime.date(2021, 1, 1)
-                        end_date = datetime.date(2021, 12, 31)
 
-                        if start_date <= chosen_date <= end_date:
+                        if start_date <= chosen_date.isoformat() <= end_date:
                             peak = reporting.peak_hour_date(data, choice5, monitoring_station, pollutant)
                             print(peak)
                             input(">>> Press Enter to return to Hourly Report Menu...")
                             break  # Exit the loop after successful processing
                         else:
-                            print("Invalid date! Please enter a date between 2021-01-01 and 2021-12-31.")
+                            print(f"Invalid date! Please enter a date between {start_date} and {end_date}.")
                     except ValueError:
                         print("Invalid date format! Please enter the date in the format YYYY-MM-DD.")
             elif choice4 == 'Q':
@@ -188,12 +204,14 @@ def monitoring_menu():
     Displays the monitoring menu and handles user input to navigate between different monitoring-related functionalities.
 
     The function presents a list of available options related to monitoring, such as real-time statistics, highest
-    pollutant value in the last 7 days, pollutant statistics retrieval and calculation, pollutant comparison, and air
-    quality index. It prompts the user for input and executes the corresponding functionality based on the chosen option.
+    pollutant value in the last 7 days, pollutant statistics retrieval and calculation, pollutant comparison, air quality
+    index and rolling averages. It prompts the user for input and executes the corresponding functionality based on the chosen option.
 
     Returns:
         None
     """
+    # Readings are kept up to date in the background while the menu is open
+    monitoring.start_polling()
     while True:
         print("Monitoring Menu:")
         print("1 - Real-time Statistics for a Monitoring Station and Pollutant")
@@ -201,6 +219,7 @@ def monitoring_menu():
         print("3 - Retrieve and Calculate Pollutant Statistics for a Monitoring Station")
         print("4 - Pollutant Comparison")
         print("5 - Air Quality Index")
+        print("6 - Rolling 8 and 24 Hour Averages")
         print("Q - Back to Main Menu")
         
         choice = input("Choose an option: ").upper()
@@ -220,7 +239,11 @@ def monitoring_menu():
         elif choice == "5":
             monitoring.get_air_quality_data()
             input(">>> Press Enter to return to the Monitoring Menu...")
+        elif choice == "6":
+            monitoring.get_rolling_averages()
+            input(">>> Press Enter to return to the Monitoring Menu...")
         elif choice == "Q":
+            monitoring.stop_polling()
             break  # Return to main menu
 
 def about():
@@ -253,5 +276,279 @@ def quit():
 
 
 
+# Report names accepted by run_query; peak_hour_date also needs a date
+QUERY_REPORTS = REPORTS + ('daily_percentiles', 'peak_hour_date')
+
+
+def run_query(data, monitoring_station, pollutant, report, start_date=None, end_date=None, date=None):
+    """
+    Run one report without any user interaction.
+
+    Args:
+        data (dict): The data dictionary returned by reporting.read_csv_files or
+            reporting.open_csv_files.
+        monitoring_station (str): The code of the monitoring station.
+        pollutant (str): The name of the pollutant.
+        report (str): One of QUERY_REPORTS.
+        start_date (str or None): Only use rows from this date on, in 'YYYY-MM-DD' format.
+        end_date (str or None): Only use rows before this date, in 'YYYY-MM-DD' format.
+        date (str or None): The date for peak_hour_date, in 'YYYY-MM-DD' format.
+
+    Returns:
+        The result of the report function.
+
+    Raises:
+        ValueError: If the report, station, pollutant or dates are not valid.
+    """
+    if report not in QUERY_REPORTS:
+        raise ValueError(f"Unknown report: {report}")
+    station = reporting.get_station(data, monitoring_station)
+    if station is None:
+        raise ValueError(f"Unknown monitoring station: {monitoring_station}")
+    if pollutant not in station:
+        raise ValueError(f"Unknown pollutant for {monitoring_station}: {pollutant}")
+
+    if report == 'peak_hour_date':
+        if date is None:
+            raise ValueError("peak_hour_date needs a date")
+        datetime.date.fromisoformat(date)
+
+    if start_date is not None or end_date is not None:
+        start, stop = station.date_range_span(start_date or '0001-01-01', end_date or '9999-12-31')
+        if (start, stop) != (0, len(station)):
+            # A slice is a new station each time, so its results are stored under the
+            # parent station and the span of rows
+            sliced = lambda: {monitoring_station: memo.exclude(station.slice(start, stop, [pollutant]))}
+            return memo.lookup(station, pollutant, report, ('rows', start, stop, date),
+                               lambda: _run_report(sliced(), monitoring_station, pollutant, report, date))
+    return _run_report(data, monitoring_station, pollutant, report, date)
+
+
+def _run_report(data, monitoring_station, pollutant, report, date):
+    if report == 'peak_hour_date':
+        return reporting.peak_hour_date(data, date, monitoring_station, pollutant)
+    return getattr(reporting, report)(data, monitoring_station, pollutant)
+
+
+def run_queries(queries, data=None):
+    """
+    Run many reports over data that is loaded once.
+
+    Args:
+        queries (list): Dictionaries with the keyword arguments of run_query other than
+            data: 'station', 'pollutant', 'report' and optionally 'start', 'end' and 'date'.
+        data (dict or None): The data dictionary. Defaults to reporting.open_csv_files().
+
+    Returns:
+        list: One dictionary per query with the query, its 'result' or 'error', and
+            the 'seconds' it took.
+    """
+    if data is None:
+        data = reporting.open_csv_files()
+    results = []
+    for query in queries:
+        entry = dict(query)
+        started = time.perf_counter()
+        try:
+            entry['result'] = run_query(data, query['station'], query['pollutant'], query['report'],
+                                        query.get('start'), query.get('end'), query.get('date'))
+        except (ValueError, KeyError, OSError) as error:
+            # Stations opened lazily are read here, so a missing file fails only its query
+            entry['error'] = str(error)
+        entry['seconds'] = time.perf_counter() - started
+        results.append(entry)
+    return results
+
+
+def _result_rows(entry):
+    """Flatten the result of one query into CSV rows of (key, value)."""
+    result = entry.get('result')
+    if isinstance(result, tuple):
+        return [(result[0], result[1])]
+    rows = []
+    for item in result or []:
+        values = list(item.values())
+        # Year-qualified keys, such as the year and week, are joined into one key
+        labels = list(itertools.takewhile(lambda value: isinstance(value, (str, int)), values[:-1]))
+        rows.append(('-'.join(str(label) for label in labels or values[:1]), values[-1]))
+    return rows
+
+
+def write_output(results, output_format, file=None):
+    """
+    Write query results in a machine-readable format.
+
+    Args:
+        results (list): The results returned by run_queries.
+        output_format (str): 'json', 'csv' or 'text'.
+        file (file or None): Where to write. Defaults to standard output.
+
+    Returns:
+        None
+    """
+    file = sys.stdout if file is None else file
+    if output_format == 'json':
+        json.dump([{k: v for k, v in entry.items() if k != 'seconds'} for entry in results], file, indent=1)
+        file.write("\n")
+    elif output_format == 'csv':
+        writer = csv.writer(file)
+        writer.writerow(['station', 'pollutant', 'report', 'key', 'value'])
+        for entry in results:
+            for key, value in _result_rows(entry):
+                writer.writerow([entry['station'], entry['pollutant'], entry['report'], key, value])
+    else:
+        for entry in results:
+            print(f"{entry['station']} {entry['pollutant']} {entry['report']}:", file=file)
+            if 'error' in entry:
+                print(f"  error: {entry['error']}", file=file)
+            elif isinstance(entry['result'], list):
+                for item in entry['result']:
+                    print(f"  {item}", file=file)
+            else:
+                print(f"  {entry['result']}", file=file)
+
+
+def write_timings(results, load_seconds, file=None):
+    """
+    Write how long loading and each query took.
+
+    Args:
+        results (list): The results returned by run_queries.
+        load_seconds (float): The time taken to load the data.
+        file (file or None): Where to write. Defaults to standard error.
+
+    Returns:
+        None
+    """
+    file = sys.stderr if file is None else file
+    print(f"load {load_seconds * 1000:.3f} ms", file=file)
+    for entry in results:
+        name = f"{entry['station']} {entry['pollutant']} {entry['report']}"
+        if entry.get('date'):
+            name += f" {entry['date']}"
+        print(f"{name} {entry['seconds'] * 1000:.3f} ms", file=file)
+    total = sum(entry['seconds'] for entry in results)
+    print(f"total {total * 1000:.3f} ms over {len(results)} queries", file=file)
+
+
+def build_parser():
+    """
+    Build the parser of the non-interactive command line.
+
+    Returns:
+        argparse.ArgumentParser: The parser.
+    """
+    parser = argparse.ArgumentParser(description="AQUA pollution reporting and monitoring. "
+                                                 "Run without arguments for the interactive menu.")
+    commands = parser.add_subparsers(dest='command')
+
+    report = commands.add_parser('report', help="run PR reports over the station files")
+    report.add_argument('-s', '--station', action='append', required=True, dest='stations',
+                        help="station code, e.g. MY1 (repeatable)")
+    report.add_argument('-p', '--pollutant', action='append', required=True, dest='pollutants',
+                        help="pollutant, e.g. pm10 (repeatable)")
+    report.add_argument('-r', '--report', action='append', required=True, dest='reports',
+                        choices=QUERY_REPORTS, help="report to run (repeatable)")
+    report.add_argument('--start', help="first date to include, YYYY-MM-DD")
+    report.add_argument('--end', help="first date to exclude, YYYY-MM-DD")
+    report.add_argument('-d', '--date', action='append', dest='dates',
+                        help="date for peak_hour_date, YYYY-MM-DD (repeatable)")
+    report.add_argument('-f', '--format', choices=('json', 'csv', 'text'), default='json')
+    report.add_argument('--timings', action='store_true', help="print per-query timings to standard error")
+    report.add_argument('--metrics', choices=('text', 'json'), help="print instrumentation metrics to standard error")
+
+    monitor = commands.add_parser('monitor', help="fetch live readings from the LondonAir API")
+    monitor.add_argument('--site', default='MY1', help="site code (default: MY1)")
+    monitor.add_argument('--species', action='append', dest='species', help="species code (repeatable, default: NO)")
+    monitor.add_argument('--start', help="start date, YYYY-MM-DD (default: today)")
+    monitor.add_argument('--end', help="end date, YYYY-MM-DD (default: the day after start)")
+    monitor.add_argument('--metrics', choices=('text', 'json'), help="print instrumentation metrics to standard error")
+    return parser
+
+
+def report_command(args):
+    """
+    Run the 'report' command.
+
+    Args:
+        args (argparse.Namespace): The parsed arguments.
+
+    Returns:
+        int: 0 if every query succeeded, otherwise 1.
+    """
+    queries = []
+    for station, pollutant, report in itertools.product(args.stations, args.pollutants, args.reports):
+        dates = (args.dates or [None]) if report == 'peak_hour_date' else [None]
+        for date in dates:
+            query = {'station': station, 'pollutant': pollutant, 'report': report}
+            for key, value in (('start', args.start), ('end', args.end), ('date', date)):
+                if value is not None:
+                    query[key] = value
+            queries.append(query)
+
+    started = time.perf_counter()
+    # Only the stations, pollutants and yearly partitions the queries touch are read
+    data = reporting.open_csv_files(start_date=args.start, end_date=args.end)
+    load_seconds = time.perf_counter() - started
+
+    results = run_queries(queries, data)
+    write_output(results, args.format)
+    if args.timings:
+        write_timings(results, load_seconds)
+    return 1 if any('error' in entry for entry in results) else 0
+
+
+def monitor_command(args):
+    """
+    Run the 'monitor' command.
+
+    Args:
+        args (argparse.Namespace): The parsed arguments.
+
+    Returns:
+        int: 0 if every request succeeded, otherwise 1.
+    """
+    species_codes = args.species or ['NO']
+    try:
+        responses = api.fetch_many([(args.site, species, args.start, args.end) for species in species_codes])
+    except Exception as error:
+        print(f"error: {error}", file=sys.stderr)
+        return 1
+    output = []
+    for species, response in zip(species_codes, responses):
+        readings = [{'date': date, 'value': value} for date, value in monitoring.response_readings(response)]
+        output.append({'site': args.site, 'species': species, 'readings': readings})
+    json.dump(output, sys.stdout, indent=1)
+    sys.stdout.write("\n")
+    return 0
+
+
+def main(argv=None):
+    """
+    Run the command line interface, or the interactive menu when no command is given.
+
+    Args:
+        argv (list or None): The command line arguments. Defaults to sys.argv.
+
+    Returns:
+        int: The exit code.
+    """
+    args = build_parser().parse_args(argv)
+    if args.command is None:
+        main_menu()
+        return 0
+
+    if args.metrics:
+        metrics.enable()
+    try:
+        if args.command == 'report':
+            return report_command(args)
+        return monitor_command(args)
+    finally:
+        if args.metrics:
+            metrics.disable()
+            print(metrics.render_text() if args.metrics == 'text' else metrics.to_json(), file=sys.stderr)
+
+
 if __name__ == '__main__':
-    main_menu()
+    sys.exit(main())
@@ -0,0 +1,336 @@
+# This module remembers the results of the report functions in reporting.py.
+#
+# Interactive sessions and the query service ask for the same few reports over
+# and over. Every report function is wrapped with memoized, which keys its result
+# by the station, pollutant, report, remaining parameters and data version, and
+# returns the stored result when the same query comes again.
+#
+# The results are tied to the station they were computed from through a marker
+# kept in station.derived. A station whose values change - filled, appended to, or
+# marked changed - drops its derived results and with them the marker, and a
+# station read again is a new object without one, so stale results are never
+# returned. They are also removed from the cache as soon as the marker is gone.
+#
+# The cache is shared by every station and holds at most MAX_ENTRIES results and
+# MAX_BYTES of them, dropping the least recently used. Every caller gets a copy of
+# the stored result, as it got a new list from the report function before, so a
+# caller that changes its result does not change it for the others.
+
+import functools
+import inspect
+import itertools
+import sys
+import threading
+import weakref
+from collections import OrderedDict
+
+from store import StationData
+
+# The number of report results kept
+MAX_ENTRIES = 1024
+
+# The estimated number of bytes of report results kept
+MAX_BYTES = 64 * 1024 * 1024
+
+# The key of the marker in StationData.derived
+MARKER = 'reports'
+
+# Stored as the marker of a station whose results are not kept; see exclude()
+EXCLUDED = 'excluded'
+
+_tokens = itertools.count()
+
+
+class _Marker:
+    """Identifies one version of the values of a station; see the module comment."""
+
+    def __init__(self, token):
+        self.token = token
+
+
+def result_bytes(value):
+    """
+    Estimate the memory held by a report result.
+
+    Args:
+        value: A report result: lists, tuples and dictionaries of numbers and strings.
+
+    Returns:
+        int: The estimated size in bytes.
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for key, item in value.items():
+            size += sys.getsizeof(key) + result_bytes(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            size += result_bytes(item)
+    return size
+
+
+def copy_result(value):
+    """
+    Copy a report result so that changing the copy leaves the original intact.
+
+    The reports return lists of dictionaries of numbers and strings, tuples, numbers
+    or None, so lists and dictionaries are copied and everything else is immutable.
+
+    Args:
+        value: A report result.
+
+    Returns:
+        A copy of the result.
+    """
+    if isinstance(value, list):
+        return [dict(item) if type(item) is dict else copy_result(item) for item in value]
+    if isinstance(value, dict):
+        return {key: copy_result(item) for key, item in value.items()}
+    return value
+
+
+class ReportCache:
+    """
+    A least-recently-used store of report results.
+
+    Attributes:
+        max_entries (int): The number of results kept.
+        max_bytes (int): The estimated number of bytes of results kept.
+        bytes (int): The estimated number of bytes of results currently held.
+        hits (int): The number of lookups answered from the cache.
+        misses (int): The number of lookups that had to run the report.
+        evictions (int): The number of results dropped to stay within the limits.
+        invalidations (int): The number of results dropped because their station changed.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._by_token = {}
+        # Reentrant: a marker may be collected, and discard called, while the lock is held
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def token(self, station):
+        """
+        Return the token of the current values of a station, creating its marker if needed.
+
+        Args:
+            station (StationData): The station.
+
+        Returns:
+            int or None: A number that changes whenever the values of the station
+                change, or None if the station is kept out of the cache.
+        """
+        marker = station.derived.get(MARKER)
+        if marker is EXCLUDED:
+            return None
+        if marker is None:
+            marker = _Marker(next(_tokens))
+            # Stored results of this version go once the station drops the marker
+            weakref.finalize(marker, self.discard, marker.token)
+            station.derived[MARKER] = marker
+        return marker.token
+
+    def get(self, key):
+        """
+        Look up a result, counting the hit or miss.
+
+        Args:
+            key (tuple): The key of the query; its first item is the station token.
+
+        Returns:
+            tuple: (True, result) if the result is stored, (False, None) otherwise.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[0]
+
+    def put(self, key, result):
+        """
+        Store a result, dropping the least recently used ones beyond the limits.
+
+        Args:
+            key (tuple): The key of the query; its first item is the station token.
+            result: The result of the report.
+
+        Returns:
+            None
+        """
+        size = result_bytes(result)
+        if size > self.max_bytes or self.max_entries <= 0:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = (result, size)
+            self._by_token.setdefault(key[0], set()).add(key)
+            self.bytes += size
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        _, size = self._entries.pop(key)
+        self.bytes -= size
+        keys = self._by_token.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_token[key[0]]
+
+    def discard(self, token):
+        """
+        Drop every result computed from one version of a station.
+
+        Args:
+            token (int): The station token.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            for key in list(self._by_token.get(token, ())):
+                self._remove(key)
+                self.invalidations += 1
+
+    def clear(self):
+        """
+        Drop every result. The counters are kept.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._entries.clear()
+            self._by_token.clear()
+            self.bytes = 0
+
+    def stats(self):
+        """
+        Return the counters of the cache.
+
+        Returns:
+            dict: The results and bytes held, the hits, misses, evictions and
+                invalidations so far, and the hit rate.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"entries": len(self._entries), "bytes": self.bytes,
+                    "hits": self.hits, "misses": self.misses,
+                    "evictions": self.evictions, "invalidations": self.invalidations,
+                    "hit_rate": self.hits / lookups if lookups else 0.0}
+
+
+# The cache shared by every report function
+cache = ReportCache()
+
+
+def _hashable(value):
+    if isinstance(value, list):
+        return tuple(_hashable(item) for item in value)
+    return value
+
+
+def memoized(report):
+    """
+    Wrap a report function so that repeated queries return the stored result.
+
+    The function must take the data dictionary first and have monitoring_station
+    and pollutant parameters. Queries for a station that is not in the data, or
+    with parameters that cannot be hashed, always run the function.
+
+    Args:
+        report (callable): The report function.
+
+    Returns:
+        callable: The wrapped function, with the same signature.
+    """
+    signature = inspect.signature(report)
+    names = list(signature.parameters)
+    others = [name for name in names[1:] if name not in ('monitoring_station', 'pollutant')]
+
+    @functools.wraps(report)
+    def wrapper(*args, **kwargs):
+        # get_station is imported here; reporting imports this module
+        from reporting import get_station
+
+        if len(args) == len(names) and not kwargs:
+            arguments = dict(zip(names, args))
+        else:
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = bound.arguments
+        station = get_station(arguments[names[0]], arguments['monitoring_station'])
+        if not isinstance(station, StationData):
+            return report(*args, **kwargs)
+        params = tuple(_hashable(arguments[name]) for name in others)
+        return lookup(station, arguments['pollutant'], report.__name__, params,
+                      lambda: report(*args, **kwargs))
+
+    wrapper.cache = cache
+    return wrapper
+
+
+def lookup(station, pollutant, report, params, compute):
+    """
+    Return the stored result of a query on a station, computing it if needed.
+
+    This is what memoized reports use. Callers that run a report over something
+    derived from a station, such as a slice of its rows, use it directly with the
+    parent station and parameters that identify the slice, so the result is kept
+    for as long as the parent's values do not change.
+
+    Args:
+        station (StationData): The station the result is computed from.
+        pollutant (str): The name of the pollutant.
+        report (str): The name of the report.
+        params (tuple): The other parameters of the query.
+        compute (callable): Called without arguments to compute the result.
+
+    Returns:
+        A copy of the result.
+    """
+    token = cache.token(station)
+    if token is None:
+        return compute()
+    key = (token, station.code, pollutant, report, params, station.version)
+    try:
+        found, result = cache.get(key)
+    except TypeError:
+        return compute()
+    if found:
+        return copy_result(result)
+    result = compute()
+    cache.put(key, result)
+    return copy_result(result)
+
+
+def exclude(station):
+    """
+    Keep the results of a station out of the cache.
+
+    For short-lived stations, such as a slice whose results are stored under its
+    parent with lookup(), which would otherwise fill the cache with entries that
+    are never asked for again.
+
+    Args:
+        station (StationData): The station.
+
+    Returns:
+        StationData: The station itself.
+    """
+    station.derived[MARKER] = EXCLUDED
+    return station
@@ -0,0 +1,346 @@
+# This module measures where time goes in the reporting and monitoring code.
+#
+# Instrumentation is off by default and then costs nothing: enable() replaces the
+# entry points listed in TARGETS with timing wrappers, in every module that holds a
+# reference to them, and disable() puts the original functions back. While it is
+# on, every wrapped call records a call count, a latency histogram and, where it
+# makes sense, the number of rows it processed. api.get_json also reports the
+# bytes it fetched.
+#
+#     import metrics
+#     metrics.enable()
+#     ...
+#     print(metrics.render_text())
+
+import json
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections.abc import Mapping
+
+# Upper bounds of the latency histogram buckets, in seconds
+BUCKETS = tuple(scale * 10 ** exponent for exponent in range(-6, 2) for scale in (1, 2.5, 5))
+
+# Modules searched for references to the instrumented functions
+MODULES = ('store', 'parallel_csv', 'cube', 'snapshot', 'lazy', 'aggregation', 'resample', 'rolling', 'aqi', 'reporting', 'ingest', 'batch', 'api', 'poller', 'monitoring', 'main', 'server')
+
+enabled = False
+
+_lock = threading.Lock()
+_timers = {}
+_counters = {}
+_installed = []
+
+
+def _station_rows(data, monitoring_station, *args, **kwargs):
+    station = data.get(monitoring_station) if isinstance(data, Mapping) else None
+    return len(station) if station is not None else 0
+
+
+def _peak_rows(data, date, monitoring_station, *args, **kwargs):
+    return _station_rows(data, monitoring_station)
+
+
+def _result_rows(result):
+    return len(result) if result is not None else 0
+
+
+# (module, attribute, metric name, rows counted from the arguments or None,
+#  rows counted from the result or None)
+TARGETS = (
+    ('store', 'load_csv', 'load.parse_csv', None, _result_rows),
+    ('parallel_csv', 'load_csv', 'load.parse_csv_parallel', None, _result_rows),
+    ('store.StationData', 'sort', 'load.sort', None, None),
+    ('store.StationData', 'build_index', 'load.build_index', None, None),
+    ('snapshot', 'load_station', 'load.snapshot', None, _result_rows),
+    ('snapshot', 'read_column', 'load.snapshot_column', None, _result_rows),
+    ('cube', 'read', 'load.stored_aggregates', None, None),
+    ('lazy', 'open_station', 'load.open_station', None, _result_rows),
+    ('reporting', 'read_station', 'load.read_station', None, _result_rows),
+    ('reporting', 'read_csv_files', 'load.read_csv_files', None, None),
+    ('reporting', 'count_missing_data', 'load.count_missing_data', _station_rows, None),
+    ('reporting', 'fill_missing_data', 'load.fill_missing_data', None, None),
+    ('aggregation', 'aggregate', 'compute.aggregate', None, None),
+    ('resample', 'resample', 'compute.resample', None, _result_rows),
+    ('rolling', 'rolling', 'compute.rolling', None, None),
+    ('aqi', 'hourly_indices', 'compute.aqi_hourly', None, None),
+    ('reporting', 'daily_average', 'report.daily_average', _station_rows, None),
+    ('reporting', 'daily_median', 'report.daily_median', _station_rows, None),
+    ('reporting', 'daily_percentiles', 'report.daily_percentiles', _station_rows, None),
+    ('reporting', 'hourly_average', 'report.hourly_average', _station_rows, None),
+    ('reporting', 'monthly_average', 'report.monthly_average', _station_rows, None),
+    ('reporting', 'weekly_average', 'report.weekly_average', _station_rows, None),
+    ('reporting', 'day_of_week_average', 'report.day_of_week_average', _station_rows, None),
+    ('reporting', 'peak_hour_date', 'report.peak_hour_date', None, None),
+    ('api', 'get_json', 'api.get_json', None, None),
+    ('poller.Poller', 'poll_once', 'poller.poll_once', None, None),
+    ('server.QueryServer', 'query', 'server.query', None, None),
+    ('monitoring', 'get_live_data_from_api', 'monitoring.get_live_data_from_api', None, None),
+    ('monitoring', 'display_real_time_statistics', 'monitoring.display_real_time_statistics', None, None),
+    ('monitoring', 'get_highest_pollutant_value', 'monitoring.get_highest_pollutant_value', None, None),
+    ('monitoring', 'get_rolling_averages', 'monitoring.get_rolling_averages', None, None),
+    ('monitoring', 'get_pollutant_statistics', 'monitoring.get_pollutant_statistics', None, None),
+    ('monitoring', 'compare_pollutant_levels', 'monitoring.compare_pollutant_levels', None, None),
+    ('monitoring', 'get_air_quality_data', 'monitoring.get_air_quality_data', None, None),
+)
+
+
+class Timer:
+    """
+    Call count, latency histogram and rows processed of one instrumented function.
+
+    Attributes:
+        calls (int): The number of completed calls.
+        errors (int): The number of calls that raised an exception.
+        total (float): The total time spent, in seconds.
+        minimum (float): The fastest call, in seconds.
+        maximum (float): The slowest call, in seconds.
+        rows (int): The number of rows processed.
+        buckets (list): Call counts per BUCKETS upper bound, plus one for slower calls.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total = 0.0
+        self.minimum = float('inf')
+        self.maximum = 0.0
+        self.rows = 0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def observe(self, seconds, rows=0, error=False):
+        """
+        Record one call.
+
+        Args:
+            seconds (float): How long the call took.
+            rows (int): The number of rows the call processed.
+            error (bool): Whether the call raised an exception.
+
+        Returns:
+            None
+        """
+        self.calls += 1
+        self.errors += error
+        self.total += seconds
+        self.rows += rows
+        if seconds < self.minimum:
+            self.minimum = seconds
+        if seconds > self.maximum:
+            self.maximum = seconds
+        self.buckets[bisect_left(BUCKETS, seconds)] += 1
+
+    def quantile(self, q):
+        """
+        Estimate a latency quantile from the histogram.
+
+        Args:
+            q (float): The quantile, between 0 and 1.
+
+        Returns:
+            float: The upper bound of the bucket holding the quantile, in seconds.
+        """
+        if self.calls == 0:
+            return 0.0
+        rank = q * self.calls
+        seen = 0
+        for bound, count in zip(BUCKETS + (self.maximum,), self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.maximum)
+        return self.maximum
+
+    def as_dict(self):
+        """Return the recorded values as a dictionary."""
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "total_seconds": self.total,
+            "mean_seconds": self.total / self.calls if self.calls else 0.0,
+            "min_seconds": self.minimum if self.calls else 0.0,
+            "max_seconds": self.maximum,
+            "p50_seconds": self.quantile(0.5),
+            "p99_seconds": self.quantile(0.99),
+            "rows": self.rows,
+            "histogram": {str(bound): count for bound, count in zip(BUCKETS + ("+Inf",), self.buckets) if count},
+        }
+
+
+def observe(name, seconds, rows=0, error=False):
+    """
+    Record one timed call under a metric name.
+
+    Args:
+        name (str): The metric name.
+        seconds (float): How long the call took.
+        rows (int): The number of rows the call processed.
+        error (bool): Whether the call raised an exception.
+
+    Returns:
+        None
+    """
+    with _lock:
+        timer = _timers.get(name)
+        if timer is None:
+            timer = _timers[name] = Timer()
+        timer.observe(seconds, rows, error)
+
+
+def count(name, amount=1):
+    """
+    Add to a counter, such as the bytes fetched from the API.
+
+    Args:
+        name (str): The counter name.
+        amount (int): The amount to add.
+
+    Returns:
+        None
+    """
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def timed(name, function, rows_from_args=None, rows_from_result=None):
+    """
+    Wrap a function so that every call is recorded under a metric name.
+
+    Args:
+        name (str): The metric name.
+        function (callable): The function to wrap.
+        rows_from_args (callable or None): Returns the rows processed given the arguments.
+        rows_from_result (callable or None): Returns the rows processed given the result.
+
+    Returns:
+        callable: The wrapper.
+    """
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            result = function(*args, **kwargs)
+        except BaseException:
+            observe(name, time.perf_counter() - started, error=True)
+            raise
+        seconds = time.perf_counter() - started
+        rows = 0
+        try:
+            if rows_from_args is not None:
+                rows = rows_from_args(*args, **kwargs)
+            elif rows_from_result is not None:
+                rows = rows_from_result(result)
+        except Exception:
+            rows = 0
+        observe(name, seconds, rows)
+        return result
+
+    wrapper.__name__ = getattr(function, '__name__', name)
+    wrapper.__doc__ = function.__doc__
+    wrapper.__wrapped__ = function
+    return wrapper
+
+
+def _resolve(path):
+    module_name, _, class_name = path.partition('.')
+    module = sys.modules.get(module_name)
+    if module is None or not class_name:
+        return module
+    return getattr(module, class_name, None)
+
+
+def enable():
+    """
+    Start recording metrics by installing the timing wrappers.
+
+    Only modules that are already imported are instrumented.
+
+    Returns:
+        None
+    """
+    global enabled
+    if enabled:
+        return
+    modules = [sys.modules[name] for name in MODULES if name in sys.modules]
+    for owner_path, attribute, name, rows_from_args, rows_from_result in TARGETS:
+        owner = _resolve(owner_path)
+        if owner is None or not hasattr(owner, attribute):
+            continue
+        original = getattr(owner, attribute)
+        wrapper = timed(name, original, rows_from_args, rows_from_result)
+        holders = [owner] if isinstance(owner, type) else [
+            module for module in modules if getattr(module, attribute, None) is original
+        ]
+        for holder in holders:
+            setattr(holder, attribute, wrapper)
+            _installed.append((holder, attribute, original))
+    enabled = True
+
+
+def disable():
+    """
+    Stop recording metrics and restore the original functions. Recorded values are kept.
+
+    Returns:
+        None
+    """
+    global enabled
+    while _installed:
+        holder, attribute, original = _installed.pop()
+        setattr(holder, attribute, original)
+    enabled = False
+
+
+def reset():
+    """
+    Forget every recorded value.
+
+    Returns:
+        None
+    """
+    with _lock:
+        _timers.clear()
+        _counters.clear()
+
+
+def as_dict():
+    """
+    Return every recorded value.
+
+    Returns:
+        dict: The 'timers', keyed by metric name, and the 'counters'.
+    """
+    with _lock:
+        return {
+            "timers": {name: timer.as_dict() for name, timer in sorted(_timers.items())},
+            "counters": dict(sorted(_counters.items())),
+        }
+
+
+def to_json():
+    """
+    Return every recorded value as a JSON document.
+
+    Returns:
+        str: The JSON text.
+    """
+    return json.dumps(as_dict(), indent=1)
+
+
+def render_text():
+    """
+    Return every recorded value as a human-readable table.
+
+    Returns:
+        str: One line per metric.
+    """
+    snapshot = as_dict()
+    lines = [f"{'metric':<40} {'calls':>7} {'total ms':>10} {'mean ms':>9} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9} {'rows':>10}"]
+    for name, timer in snapshot["timers"].items():
+        lines.append(
+            f"{name:<40} {timer['calls']:>7} {timer['total_seconds'] * 1000:>10.3f} "
+            f"{timer['mean_seconds'] * 1000:>9.3f} {timer['p50_seconds'] * 1000:>9.3f} "
+            f"{timer['p99_seconds'] * 1000:>9.3f} {timer['max_seconds'] * 1000:>9.3f} {timer['rows']:>10}"
+        )
+    for name, value in snapshot["counters"].items():
+        lines.append(f"{name:<40} {value:>7}")
+    return "\n".join(lines)
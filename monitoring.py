@@ -7,9 +7,87 @@
 # 
 # You can access the API documentation here http://api.erg.ic.ac.uk/AirQuality/help
 #
-import requests
 import datetime
+from array import array
+
+import api
+import aqi
+import poller as polling
+import rolling
 import utils
+from store import MISSING
+
+# The background poller started by start_polling, whose buffers the functions
+# below read before going to the API
+poller = None
+
+
+def start_polling(site_codes=('MY1',), species_codes=('NO', 'NO2', 'O3'), interval=polling.POLL_INTERVAL):
+    """
+    Start polling the API in the background, unless a poller is already running.
+
+    Args:
+        site_codes (list): The codes of the monitoring stations to follow.
+        species_codes (list): The codes of the pollutants to follow.
+        interval (float): Seconds between two polls.
+
+    Returns:
+        poller.Poller: The running poller.
+    """
+    global poller
+    if poller is None or not poller.running:
+        poller = polling.Poller(site_codes, species_codes, interval).start()
+    return poller
+
+
+def stop_polling():
+    """
+    Stop the background poller, if one is running.
+
+    Returns:
+        None
+    """
+    global poller
+    if poller is not None:
+        poller.stop()
+        poller = None
+
+
+def buffered_readings(site_code, species_code, since):
+    """
+    Return the readings of a series from the background poller.
+
+    Args:
+        site_code (str): The code of the monitoring station.
+        species_code (str): The code of the pollutant.
+        since (str): The earliest time wanted, in 'YYYY-MM-DD' format.
+
+    Returns:
+        list or None: (measurement date, value) pairs from that time on, or None if
+            the series is not polled or its buffer does not reach back that far.
+    """
+    series = poller.get(site_code, species_code) if poller is not None else None
+    if series is None or not series.covers(since):
+        return None
+    return series.readings(since)
+
+
+def response_readings(response):
+    """
+    Extract the readings of a SiteSpecies response.
+
+    Args:
+        response (dict): The decoded response.
+
+    Returns:
+        list: (measurement date, value) pairs; the value is None when missing.
+    """
+    data = response['RawAQData']['Data'] or []
+    if isinstance(data, dict):
+        data = [data]
+    return [(item['@MeasurementDateGMT'], polling.parse_value(item['@Value'])) for item in data]
+
+
 def get_live_data_from_api(site_code='MY1',species_code='NO',start_date=None,end_date=None):
     """
     Return data from the LondonAir API using its AirQuality API. 
@@ -18,22 +96,11 @@ def get_live_data_from_api(site_code='MY1',species_code='NO',start_date=None,end
     It requires the `requests` library which needs to be installed. 
     In order to use this function you first have to install the `requests` library.
     This code is provided as-is. 
+
+    Requests go through the pooled session in api.py, so repeated calls reuse their
+    connections to the API.
     """
-    start_date = datetime.date.today() if start_date is None else start_date
-    end_date = start_date + datetime.timedelta(days=1) if end_date is None else end_date
-    
-    
-    endpoint = "https://api.erg.ic.ac.uk/AirQuality/Data/SiteSpecies/SiteCode={site_code}/SpeciesCode={species_code}/StartDate={start_date}/EndDate={end_date}/Json"
-   
-    url = endpoint.format(
-        site_code = site_code,
-        species_code = species_code,
-        start_date = start_date,
-        end_date = end_date
-    )
-    
-    res = requests.get(url)
-    return res.json()
+    return api.fetch_site_species(site_code, species_code, start_date, end_date)
 
 
 def display_real_time_statistics(site_code='MY1', species_code='NO'):
@@ -46,20 +113,18 @@ def display_real_time_statistics(site_code='MY1', species_code='NO'):
         site_code (str): The code of the monitoring station. Defaults to 'MY1'.
         species_code (str): The code of the pollutant. Defaults to 'NO'.
     """
-    # Retrieve the latest data from the API
-    data = get_live_data_from_api(site_code, species_code)
-    
-    # Extract relevant information from the data
-    data = data['RawAQData']['Data']
-    data = list(reversed(data))  # Reverse the list to get the latest data first
+    # Use the background poller if it follows this series, otherwise ask the API
+    readings = buffered_readings(site_code, species_code, datetime.date.today().isoformat())
+    if readings is None:
+        readings = response_readings(get_live_data_from_api(site_code, species_code))
+    readings = list(reversed(readings))  # Reverse the list to get the latest data first
     
     print(f"Real-time Statistics for Monitoring Station {site_code} - {species_code}:")
     
     # Iterate over the data and print the pollutant values and measurement dates
-    for item in data:
-        if item['@Value'] == "":
-            item['@Value'] = 0
-        print(f"Pollutant Value: {item['@Value']} at {item['@MeasurementDateGMT']}")
+    for measurement_date, value in readings:
+        value = value if value is not None else 0
+        print(f"Pollutant Value: {value} at {measurement_date}")
 
 
 def get_highest_pollutant_value(site_code='MY1', species_code='NO', days=7):
@@ -75,23 +140,50 @@ def get_highest_pollutant_value(site_code='MY1', species_code='NO', days=7):
     end_date = datetime.date.today()
     start_date = end_date - datetime.timedelta(days=days)
 
-    data_api = get_live_data_from_api(site_code, species_code, start_date=start_date.strftime('%Y-%m-%d'), end_date=end_date.strftime('%Y-%m-%d'))
-
-    highest_pollutant = None
-    highest_value = None
-    highest_measurement_date = None
+    series = poller.get(site_code, species_code) if poller is not None else None
+    if series is not None and series.covers(start_date.isoformat()):
+        # The poller keeps the maximum of the window current as readings arrive
+        statistics = series.rolling(days * 24)
+        highest_value, highest_measurement_date = statistics['max'], statistics['max_at']
+    else:
+        # The window is fetched as day-sized pieces in parallel, with retries
+        data_api = api.fetch_range(site_code, species_code, start_date, end_date, chunk_days=1)
+        # The values are compared as numbers, not as the strings the API returns
+        highest_value, highest_measurement_date = rolling.window_extreme(response_readings(data_api), days * 24)
+
+    print(f"Highest Pollutant Value for Monitoring Station {site_code} - {species_code} in Last {days} Days:")
+    print(f"• Value: {highest_value}") 
+    print(f"• Date: {highest_measurement_date}")
 
-    for entry in data_api['RawAQData']['Data']:
-        measurement_date = entry["@MeasurementDateGMT"]
-        value = entry["@Value"]
 
-        if highest_value is None or value > highest_value:
-            highest_value = value
-            highest_measurement_date = measurement_date
+def get_rolling_averages(site_code='MY1', species_code='NO', hours=(8, 24)):
+    """
+    Display the rolling averages of a pollutant over the latest hours.
 
-    print(f"Highest Pollutant Value for Monitoring Station {site_code} - {species_code} in Last 7 Days:")
-    print(f"• Value: {highest_value}") 
-    print(f"• Date: {highest_measurement_date}")
+    Args:
+        site_code (str): The code of the monitoring station. Defaults to 'MY1'.
+        species_code (str): The code of the pollutant. Defaults to 'NO'.
+        hours (tuple): The lengths of the windows, in hours. Defaults to 8 and 24.
+    """
+    series = poller.get(site_code, species_code) if poller is not None else None
+    if series is not None and series.start is not None:
+        averages = {length: series.rolling(length) for length in hours}
+    else:
+        end_date = datetime.date.today() + datetime.timedelta(days=1)
+        start_date = end_date - datetime.timedelta(days=max(hours) // 24 + 2)
+        readings = response_readings(api.fetch_range(site_code, species_code, start_date, end_date, chunk_days=1))
+        averages = {}
+        for length in hours:
+            window = rolling.RollingWindow(length)
+            for measurement_date, value in readings:
+                window.push(rolling.measurement_hour(measurement_date), value, measurement_date)
+            averages[length] = window.stats()
+
+    print(f"Rolling Averages for Monitoring Station {site_code} - {species_code}:")
+    for length, statistics in averages.items():
+        mean = statistics['mean']
+        mean = round(mean, 2) if mean is not None else "No data"
+        print(f"• {length}-hour average: {mean} ({statistics['count']} readings)")
 
 
 def get_pollutant_statistics(site_code='MY1', species_codes=['NO', 'NO2', 'O3']):
@@ -105,21 +197,21 @@ def get_pollutant_statistics(site_code='MY1', species_codes=['NO', 'NO2', 'O3'])
         species_codes (list): A list of species codes to retrieve data for (default: ['NO', 'NO2', 'O3'])
     """
     start_date = datetime.date.today()
-    data = []
 
-    for species_code in species_codes:
-        data.append(get_live_data_from_api(site_code, species_code))
+    # Series followed by the background poller are read from memory; the others are
+    # independent of each other, so they are fetched concurrently
+    readings = {code: buffered_readings(site_code, code, start_date.isoformat()) for code in species_codes}
+    missing = [code for code in species_codes if readings[code] is None]
+    for code, response in zip(missing, api.fetch_many([(site_code, code) for code in missing])):
+        readings[code] = response_readings(response)
 
     print(f"Pollutant statistics for Monitoring Station {site_code} at {start_date}:")
-    for i, entry in enumerate(data):
-        pollutant_name = entry['RawAQData']['@SpeciesCode']
-        values = []
-
-        data_array = entry['RawAQData']['Data']
-        values = [float(item['@Value']) if item['@Value'] != "" else 0 for item in data_array]
-        max_value = utils.maxvalue(values)
-        min_value = utils.minvalue(values)
-        mean_value = utils.meanvalue(values)
+    for pollutant_name in species_codes:
+        values = [value if value is not None else 0 for _, value in readings[pollutant_name]]
+        statistics = utils.describe(values)
+        max_value = statistics['max']
+        min_value = statistics['min']
+        mean_value = statistics['mean']
         print(f"{pollutant_name}:")
         print(f"• Minimum pollution level: {min_value}")
         print(f"• Maximum pollution level: {max_value}")
@@ -145,10 +237,11 @@ def compare_pollutant_levels(site_code='MY1', species_code='NO', start_date=None
     day_before_yesterday = current_date - datetime.timedelta(days=2)
     
     # Retrieve data for the first time period (day before yesterday to yesterday)
-    data1 = get_live_data_from_api(site_code, start_date=day_before_yesterday, end_date=yesterday)
-
-    # Retrieve data for the second time period (yesterday onwards)
-    data2 = get_live_data_from_api(site_code, start_date=yesterday, end_date=None)
+    # and the second time period (yesterday onwards) concurrently
+    data1, data2 = api.fetch_many([
+        (site_code, species_code, day_before_yesterday, yesterday),
+        (site_code, species_code, yesterday, None),
+    ])
 
     print(f"Pollutant Comparison for Monitoring Station {site_code} - Pollutant {species_code}:")
     
@@ -188,53 +281,49 @@ def get_air_quality_data(site_code='MY1', species_code='NO', start_date=None, en
         Air quality data for the specified site, date range, and species.
     """
     
-    # Set default start and end dates if not provided
-    start_date = datetime.date.today() if start_date is None else start_date
-    end_date = start_date + datetime.timedelta(days=1) if end_date is None else end_date
-
-    # Construct the API endpoint URL
-    endpoint = "https://api.erg.ic.ac.uk/AirQuality/Data/Wide/Site/SiteCode={site_code}/StartDate={start_date}/EndDate={end_date}/Json"
-    url = endpoint.format(
-        site_code=site_code,
-        start_date=start_date,
-        end_date=end_date
-    )
-
     # Send request to the API and retrieve the data
-    res = requests.get(url)
-    data = res.json()
+    data = api.fetch_wide(site_code, start_date, end_date)
     
     # Extract air quality data and column information
     air_quality_data = data["AirQualityData"]["RawAQData"]["Data"]
     columns = data["AirQualityData"]["Columns"]["Column"]
-
-    # Parse the data into a more readable format
-    parsed_data = []
-
-    for measurement in air_quality_data:
-        parsed_measurement = {"MeasurementDateGMT": measurement["@MeasurementDateGMT"]}
-
-        for column in columns:
-            column_id = column["@ColumnId"]
-            column_name = column["@ColumnName"]
-            column_data = measurement.get("@{}".format(column_id), None)
-
-            if column_data:
-                parsed_measurement[column_name] = float(column_data)
-            else:
-                parsed_measurement[column_name] = 0.0
-
-        parsed_data.append(parsed_measurement)
+    if isinstance(air_quality_data, dict):
+        air_quality_data = [air_quality_data]
+    if isinstance(columns, dict):
+        columns = [columns]
+
+    # Column names look like "Site: Species (units)"; each is split once, not per row
+    fields = []
+    for column in columns:
+        column_name = column["@ColumnName"]
+        pollutant = column_name.split(":")[1].split("(")[0].strip()
+        fields.append(("@{}".format(column["@ColumnId"]), pollutant))
+
+    # Parse the data into one column of values per pollutant
+    dates = [measurement["@MeasurementDateGMT"] for measurement in air_quality_data]
+    values = {}
+    for key, pollutant in fields:
+        values[pollutant] = array('d', [float(measurement[key]) if measurement.get(key) else MISSING
+                                        for measurement in air_quality_data])
+
+    # The index of every hour, banded in one pass per pollutant
+    timestamps = array('q', map(rolling.measurement_hour, dates))
+    indices = {}
+    for pollutant, column in values.items():
+        code = aqi.pollutant_code(pollutant)
+        if code is not None:
+            indices[pollutant] = aqi.index_values(code, aqi.running_mean(timestamps, column, aqi.AVERAGING_HOURS[code]))
+    highest, dominant = aqi.combine(indices)
 
     # Extract location from the column information and print it as a title
     location = columns[0]["@ColumnName"].split(":")[0].strip()
     print("Location:", location)
 
     # Print the air quality data for each measurement date
-    for entry in parsed_data:
-        date = entry["MeasurementDateGMT"]
+    for row, date in enumerate(dates):
         print("\n• Date:", date)
-        for key, value in entry.items():
-            if key != "MeasurementDateGMT":
-                pollutant = key.split(":")[1].split("(")[0].strip()
-                print("- {}: {}".format(pollutant, value))
\ No newline at end of file
+        for pollutant, column in values.items():
+            value = column[row]
+            print("- {}: {}".format(pollutant, value if value == value else 0.0))
+        if highest and highest[row]:
+            print("- Air Quality Index: {} ({}), set by {}".format(highest[row], aqi.band(highest[row]), dominant[row]))
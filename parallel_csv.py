@@ -0,0 +1,120 @@
+# This module parses large station CSV files on several cores.
+#
+# The file is split into byte ranges that each start and end on a line boundary,
+# every range is parsed into typed columns by a worker process, and the columns
+# are joined back together in file order. Sorting and indexing then happen once,
+# exactly as in store.load_csv, so both paths build the same station. Files
+# smaller than PARALLEL_MIN_BYTES are parsed serially, since starting the worker
+# processes would cost more than it saves.
+#
+# The station files never quote fields, so a newline always ends a row.
+
+import csv
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import store
+from store import StationData, build_station, parse_header, parse_rows
+
+# Files smaller than this are parsed in the calling process
+PARALLEL_MIN_BYTES = 8 * 1024 * 1024
+
+# Byte ranges handed to each worker process, on average
+CHUNKS_PER_WORKER = 4
+
+
+def split_ranges(path, start, chunks):
+    """
+    Split a file into byte ranges that begin and end on line boundaries.
+
+    Args:
+        path (str): The path of the file.
+        start (int): The offset of the first byte to include, at the start of a line.
+        chunks (int): The number of ranges wanted.
+
+    Returns:
+        list: (start, stop) byte offsets covering [start, end of file), in order.
+    """
+    size = os.path.getsize(path)
+    step = max((size - start) // max(chunks, 1), 1)
+    ranges = []
+    with open(path, "rb") as file:
+        while start < size:
+            stop = min(start + step, size)
+            if stop < size:
+                file.seek(stop)
+                file.readline()
+                stop = file.tell()
+            ranges.append((start, stop))
+            start = stop
+    return ranges
+
+
+def parse_range(path, start, stop, header):
+    """
+    Parse the rows in a byte range of a station CSV file.
+
+    Args:
+        path (str): The path of the file.
+        start (int): The offset of the first byte, at the start of a line.
+        stop (int): The offset after the last byte, at the start of a line or the end
+            of the file.
+        header (list): The field names from the first line of the file.
+
+    Returns:
+        tuple: The timestamps, value arrays and validity flags of the rows, as
+            returned by store.parse_rows.
+    """
+    with open(path, "rb") as file:
+        file.seek(start)
+        text = file.read(stop - start).decode()
+    return parse_rows(csv.reader(io.StringIO(text, newline="")), *parse_header(header))
+
+
+def _header(path):
+    with open(path, "rb") as file:
+        line = file.readline()
+        offset = file.tell()
+    rows = list(csv.reader(io.StringIO(line.decode(), newline="")))
+    return (rows[0] if rows else None), offset
+
+
+def load_csv(path, code, workers=None, min_bytes=PARALLEL_MIN_BYTES):
+    """
+    Read a station CSV file into columnar form, parsing large files in parallel.
+
+    The result is identical to store.load_csv.
+
+    Args:
+        path (str): The path of the CSV file.
+        code (str): The code of the monitoring station.
+        workers (int or None): The number of worker processes. Defaults to the number
+            of CPUs.
+        min_bytes (int): Files smaller than this are parsed serially.
+
+    Returns:
+        StationData: The columnar data of the station.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or os.path.getsize(path) < min_bytes:
+        return store.load_csv(path, code)
+
+    header, offset = _header(path)
+    if header is None:
+        return StationData(code)
+    ranges = split_ranges(path, offset, workers * CHUNKS_PER_WORKER)
+    if len(ranges) <= 1:
+        return store.load_csv(path, code)
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(ranges))) as executor:
+        futures = [executor.submit(parse_range, path, start, stop, header) for start, stop in ranges]
+        parts = [future.result() for future in futures]
+
+    timestamps, columns, flags = parts[0]
+    for part_timestamps, part_columns, part_flags in parts[1:]:
+        timestamps.extend(part_timestamps)
+        for name, values in part_columns.items():
+            columns[name].extend(values)
+            flags[name].extend(part_flags[name])
+    return build_station(code, timestamps, columns, flags)
@@ -0,0 +1,308 @@
+# This module keeps the latest LondonAir readings in memory, refreshed in the background.
+#
+#     poller = Poller(sites=['MY1', 'KC1'], species=['NO', 'NO2'], interval=300)
+#     poller.start()
+#     poller.get('MY1', 'NO').readings(since='2021-01-01')
+#
+# A Poller thread fetches every site and species it follows once per interval,
+# concurrently and straight from the API, since live readings must not come from
+# the response cache. After the first poll only the days from the latest reading
+# on are fetched again. Each series is held in a Series, a fixed-size ring buffer
+# that keeps a reading once per @MeasurementDateGMT and drops the oldest readings
+# when it is full, so the monitoring functions can answer from memory. A Series
+# can also keep rolling windows over its readings, such as the 8 and 24 hour
+# means, which are updated as each reading arrives.
+
+import datetime
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import api
+import metrics
+from rolling import RollingWindow, measurement_hour
+
+# Seconds between two polls; the API publishes one reading per hour
+POLL_INTERVAL = 300
+
+# Readings kept per series: eight days of hourly readings
+CAPACITY = 8 * 24
+
+# Days of readings fetched by the first poll of a series
+HISTORY_DAYS = 7
+
+# Rolling windows kept up to date for every series, in hours
+WINDOWS = (8, 24, HISTORY_DAYS * 24)
+
+
+def parse_value(value):
+    """
+    Convert an @Value field of the API to a number.
+
+    Args:
+        value (str): The field, empty when the reading is missing.
+
+    Returns:
+        float or None: The value, or None if it is missing or not a number.
+    """
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class Series:
+    """
+    A ring buffer of the readings of one site and pollutant, in time order.
+
+    Attributes:
+        capacity (int): The largest number of readings kept.
+        start (str or None): The time from which the buffer holds every reading,
+            or None before the first poll.
+    """
+
+    def __init__(self, capacity=CAPACITY, windows=()):
+        self.capacity = capacity
+        self.start = None
+        self._readings = deque()
+        self._index = {}
+        self._windows = {hours: RollingWindow(hours) for hours in windows}
+        self._lock = threading.Lock()
+
+    def add(self, readings, start=None):
+        """
+        Add readings from the API, skipping those already held.
+
+        A reading that was missing is replaced if the API later returns its value.
+
+        Args:
+            readings (list): The 'Data' entries of a SiteSpecies response.
+            start (str or None): The start of the range the readings were fetched for.
+
+        Returns:
+            int: The number of readings added or updated.
+        """
+        changed = 0
+        filled = False
+        with self._lock:
+            if self.start is None:
+                self.start = start
+            for item in readings:
+                date = item['@MeasurementDateGMT']
+                value = parse_value(item.get('@Value'))
+                held = self._index.get(date)
+                if held is not None:
+                    if held[1] is None and value is not None:
+                        held[1] = value
+                        changed += 1
+                        filled = True
+                    continue
+                if self._readings and date < self._readings[-1][0]:
+                    # Older than the newest reading and not held: already dropped
+                    continue
+                reading = [date, value]
+                self._readings.append(reading)
+                self._index[date] = reading
+                changed += 1
+                if not filled:
+                    hour = measurement_hour(date)
+                    for window in self._windows.values():
+                        window.push(hour, value, date)
+                if len(self._readings) > self.capacity:
+                    dropped = self._readings.popleft()
+                    del self._index[dropped[0]]
+                    self.start = self._readings[0][0]
+            if filled:
+                # A value filled in behind the newest reading: the windows start again
+                for hours in self._windows:
+                    self._windows[hours] = self._window(hours)
+        return changed
+
+    def _window(self, hours):
+        window = RollingWindow(hours)
+        for date, value in self._readings:
+            window.push(measurement_hour(date), value, date)
+        return window
+
+    def rolling(self, hours):
+        """
+        Return the rolling statistics of the readings of the last `hours` hours.
+
+        Windows given to the constructor are updated as readings arrive; any other
+        length is built from the buffer on first use and then kept up to date too.
+
+        Args:
+            hours (int): The length of the window, ending at the newest reading.
+
+        Returns:
+            dict: The statistics of rolling.RollingWindow.stats, with the
+                measurement dates of the minimum and maximum as 'min_at' and 'max_at'.
+        """
+        with self._lock:
+            window = self._windows.get(hours)
+            if window is None:
+                window = self._windows[hours] = self._window(hours)
+            return window.stats()
+
+    def readings(self, since=None):
+        """
+        Return the readings held, oldest first.
+
+        Args:
+            since (str or None): Only return readings at or after this time, as a
+                'YYYY-MM-DD' date or a 'YYYY-MM-DD HH:MM:SS' time.
+
+        Returns:
+            list: (measurement date, value) pairs; the value is None when missing.
+        """
+        with self._lock:
+            return [(date, value) for date, value in self._readings
+                    if since is None or date >= since]
+
+    def covers(self, since):
+        """
+        Tell whether every reading from a time on is held.
+
+        Args:
+            since (str): The time, as a 'YYYY-MM-DD' date or a 'YYYY-MM-DD HH:MM:SS' time.
+
+        Returns:
+            bool: True if the buffer has been filled from that time or earlier.
+        """
+        with self._lock:
+            return self.start is not None and self.start <= since
+
+    @property
+    def last_date(self):
+        """The measurement date of the newest reading, or None if there is none."""
+        with self._lock:
+            return self._readings[-1][0] if self._readings else None
+
+    def __len__(self):
+        return len(self._readings)
+
+
+class Poller:
+    """
+    Polls the API in a background thread and keeps a Series per site and pollutant.
+
+    Attributes:
+        interval (float): Seconds between two polls.
+        history_days (int): Days of readings fetched by the first poll.
+        windows (tuple): The rolling windows kept for every series, in hours.
+        series (dict): Maps (site code, species code) to its Series.
+        polls (int): The number of completed polls.
+        errors (int): The number of failed requests.
+        last_error (Exception or None): The error of the latest failed request.
+    """
+
+    def __init__(self, sites=('MY1',), species=('NO',), interval=POLL_INTERVAL,
+                 capacity=CAPACITY, history_days=HISTORY_DAYS, windows=WINDOWS):
+        self.interval = interval
+        self.history_days = history_days
+        self.windows = tuple(windows)
+        self.series = {(site, code): Series(capacity, self.windows) for site in sites for code in species}
+        self.polls = 0
+        self.errors = 0
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def get(self, site_code, species_code):
+        """
+        Return the buffer of a site and pollutant.
+
+        Args:
+            site_code (str): The code of the monitoring station.
+            species_code (str): The code of the pollutant.
+
+        Returns:
+            Series or None: The buffer, or None if the pair is not polled.
+        """
+        return self.series.get((site_code, species_code))
+
+    def _fetch(self, key):
+        # Runs on the pool of poll_once; returns the readings added and the error, if any
+        site_code, species_code = key
+        series = self.series[key]
+        today = datetime.date.today()
+        last = series.last_date
+        if last is None:
+            start = today - datetime.timedelta(days=self.history_days)
+        else:
+            # The API returns whole days, so the day of the newest reading is fetched again
+            start = min(datetime.date.fromisoformat(last[:10]), today)
+        end = today + datetime.timedelta(days=1)
+        try:
+            response = api.get_json(api.site_species_url(site_code, species_code, start, end))
+        except Exception as error:
+            return 0, error
+        data = response.get('RawAQData', {}).get('Data') or []
+        if isinstance(data, dict):
+            data = [data]
+        return series.add(data, start.isoformat()), None
+
+    def poll_once(self):
+        """
+        Fetch the new readings of every series once.
+
+        Returns:
+            int: The number of readings added or updated.
+        """
+        keys = list(self.series)
+        if not keys:
+            return 0
+        with ThreadPoolExecutor(max_workers=min(len(keys), api.MAX_CONCURRENCY)) as executor:
+            results = list(executor.map(self._fetch, keys))
+        added = sum(count for count, _ in results)
+        errors = [error for _, error in results if error is not None]
+        # The counters are updated here, once the pool is done, and not by its threads
+        with self._lock:
+            self.polls += 1
+            self.errors += len(errors)
+            if errors:
+                self.last_error = errors[-1]
+        if metrics.enabled:
+            metrics.count("poller.readings", added)
+        return added
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            self.poll_once()
+            self._stop.wait(max(self.interval - (time.monotonic() - started), 0))
+
+    def start(self):
+        """
+        Start polling in a daemon thread, unless it is already running.
+
+        Returns:
+            Poller: The poller itself.
+        """
+        if not self.running:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="aqua-poller", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """
+        Stop polling and wait for the thread to finish its current poll.
+
+        Args:
+            timeout (float or None): Seconds to wait for the thread.
+
+        Returns:
+            None
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    @property
+    def running(self):
+        """True while the polling thread is alive."""
+        return self._thread is not None and self._thread.is_alive()
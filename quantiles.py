@@ -0,0 +1,165 @@
+# This module computes medians and other percentiles of groups of readings.
+#
+# Values are grouped by day through the day index of the station, so no group is
+# built by comparing date strings, and each percentile is found by selection
+# rather than by sorting the whole group. Percentiles are interpolated linearly
+# between the two nearest ranks, so the 50th percentile equals statistics.median.
+
+import random
+
+from store import day_of, day_to_date
+
+# Groups up to this size are sorted, which is faster than selection in Python
+SMALL_GROUP = 32
+
+_rng = random.Random(0)
+
+
+def select(values, k):
+    """
+    Return the k-th smallest value of a list in expected linear time.
+
+    Args:
+        values (list): The values; the list is not modified.
+        k (int): The rank, from 0 for the smallest value.
+
+    Returns:
+        float: The k-th smallest value.
+
+    Raises:
+        IndexError: If k is outside the list.
+    """
+    if not 0 <= k < len(values):
+        raise IndexError("rank out of range")
+    while len(values) > SMALL_GROUP:
+        pivot = sorted((_rng.choice(values), _rng.choice(values), _rng.choice(values)))[1]
+        lower = [value for value in values if value < pivot]
+        if k < len(lower):
+            values = lower
+            continue
+        upper = [value for value in values if value > pivot]
+        equal = len(values) - len(lower) - len(upper)
+        if k < len(lower) + equal:
+            return pivot
+        k -= len(lower) + equal
+        values = upper
+    return sorted(values)[k]
+
+
+def percentile(values, q):
+    """
+    Return a percentile of a list of values.
+
+    Args:
+        values (list): The values; the list is not modified.
+        q (float): The percentile, from 0 to 100.
+
+    Returns:
+        float: The percentile, or None if the list is empty.
+
+    Raises:
+        ValueError: If q is not between 0 and 100.
+    """
+    return percentiles(values, (q,))[0]
+
+
+def percentiles(values, qs):
+    """
+    Return several percentiles of a list of values.
+
+    Args:
+        values (list): The values; the list is not modified.
+        qs (tuple): The percentiles, each from 0 to 100.
+
+    Returns:
+        list: One value per percentile, or None for each if the list is empty.
+
+    Raises:
+        ValueError: If a percentile is not between 0 and 100.
+    """
+    for q in qs:
+        if not 0 <= q <= 100:
+            raise ValueError(f"Percentile out of range: {q}")
+    count = len(values)
+    if count == 0:
+        return [None] * len(qs)
+
+    small = count <= SMALL_GROUP or len(qs) > 2
+    ordered = sorted(values) if small else None
+
+    def rank(k):
+        return ordered[k] if small else select(values, k)
+
+    results = []
+    for q in qs:
+        position = (count - 1) * q / 100
+        low = int(position)
+        fraction = position - low
+        below = rank(low)
+        if fraction == 0:
+            results.append(below)
+            continue
+        above = rank(low + 1)
+        if fraction == 0.5:
+            results.append((below + above) / 2)
+        else:
+            results.append(below + (above - below) * fraction)
+    return results
+
+
+def daily_percentiles(station, pollutant, qs=(50,)):
+    """
+    Calculate percentiles of a pollutant for every day of a station.
+
+    Args:
+        station (StationData): The station data.
+        pollutant (str): The name of the pollutant.
+        qs (tuple): The percentiles, each from 0 to 100.
+
+    Returns:
+        dict: Maps each day number to a list with one value per percentile. Days
+            without valid values map to a list of None.
+    """
+    values = station.column(pollutant)
+    mask = station.validity(pollutant)
+    result = {}
+    for day, (start, stop) in station.day_index.items():
+        if values is None:
+            group = []
+        elif mask.all(start, stop):
+            # The validity mask shows the day has no missing values to skip
+            group = values[start:stop].tolist()
+        else:
+            group = [value for value in values[start:stop] if value == value]
+        result[day] = percentiles(group, qs)
+    return result
+
+
+def stream_daily_percentiles(readings, qs=(50,)):
+    """
+    Yield the percentiles of each day as soon as the readings move on to the next day.
+
+    Only the values of the current day are kept in memory, so this works on
+    readings that arrive one by one or on histories too long to hold at once.
+
+    Args:
+        readings (iterable): (epoch-hour timestamp, value) pairs in time order;
+            missing values are NaN or None.
+        qs (tuple): The percentiles, each from 0 to 100.
+
+    Yields:
+        tuple: The 'YYYY-MM-DD' date and a list with one value per percentile.
+    """
+    current_day = None
+    group = []
+    for ts, value in readings:
+        day = day_of(ts)
+        if day != current_day:
+            if current_day is not None:
+                yield day_to_date(current_day), percentiles(group, qs)
+            current_day = day
+            group = []
+        if value is not None and value == value:
+            group.append(value)
+    if current_day is not None:
+        yield day_to_date(current_day), percentiles(group, qs)
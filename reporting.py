@@ -1,11 +1,68 @@
-# This is a template. 
+# This is a template.
 # You should modify the functions below to match
 # the signatures determined by the project specification
 
-import csv
-from datetime import datetime
-import statistics
+from datetime import date
 
+import aggregation
+import lazy
+import memo
+import parallel_csv
+import quantiles
+import resample
+import snapshot
+from aggregation import COUNT, mean
+from store import StationData, day_to_date
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+STATION_FILES = {
+    "MY1": "data/Pollution-London Marylebone Road.csv",
+    "KC1": "data/Pollution-London N Kensington.csv",
+    "HRL": "data/Pollution-London Harlington.csv",
+}
+
+
+def get_station(data, monitoring_station):
+    """
+    Return the columnar data of a monitoring station.
+
+    Args:
+        data (dict): The data dictionary containing the pollution records.
+        monitoring_station (str): The code of the monitoring station.
+
+    Returns:
+        StationData: The station data, or None if the station is not in the dictionary.
+    """
+    station = data.get(monitoring_station)
+    if isinstance(station, list):
+        # Rows straight from csv.DictReader are converted once and kept
+        station = StationData.from_records(monitoring_station, station)
+        data[monitoring_station] = station
+    if isinstance(station, StationData):
+        return station
+    return None
+
+
+def _aggregates(data, monitoring_station, pollutant):
+    """
+    Return the aggregates of a pollutant at a monitoring station.
+
+    Args:
+        data (dict): The data dictionary containing the pollution records.
+        monitoring_station (str): The code of the monitoring station.
+        pollutant (str): The name of the pollutant.
+
+    Returns:
+        Aggregates: The aggregates, or None if the station or pollutant is not in the data.
+    """
+    station = get_station(data, monitoring_station)
+    if station is None:
+        return None
+    return aggregation.aggregate(station, [pollutant]).get(pollutant)
+
+
+@memo.memoized
 def daily_average(data, monitoring_station, pollutant):
     """
     Calculate the daily averages for a specific pollutant and monitoring station.
@@ -20,46 +77,18 @@ def daily_average(data, monitoring_station, pollutant):
     """
     daily_averages = []
 
-    if monitoring_station in data and isinstance(data[monitoring_station], list):
-        records = data[monitoring_station]
-        records.sort(key=lambda x: datetime.strptime(x['date'], '%Y-%m-%d'))  # Sort records by date
-
-        current_date = records[0]['date']
-        total = 0
-        count = 0
-
-        for record in records:
-            if record['date'] == current_date:
-                if pollutant in record:
-                    total += float(record[pollutant])
-                    count += 1
-            else:
-                if count > 0:
-                    daily_average = total / count
-                    daily_averages.append({
-                        'date': current_date,
-                        'average': daily_average
-                    })
-
-                # Move to the next date
-                current_date = record['date']
-                total = 0
-                count = 0
-
-                if pollutant in record:
-                    total += float(record[pollutant])
-                    count += 1
-
-        # Add the last daily average
-        if count > 0:
-            daily_average = total / count
-            daily_averages.append({
-                'date': current_date,
-                'average': daily_average
-            })
+    station = get_station(data, monitoring_station)
+    if station is not None and pollutant in station:
+        for bucket in resample.resample(station, pollutant, '1D', ('mean', 'count')):
+            if bucket['count'] > 0:
+                daily_averages.append({
+                    'date': bucket['start'],
+                    'average': bucket['mean']
+                })
 
     return daily_averages
 
+@memo.memoized
 def daily_median(data, monitoring_station, pollutant):
     """
     Calculate the daily medians for a specific pollutant and monitoring station.
@@ -74,56 +103,44 @@ def daily_median(data, monitoring_station, pollutant):
     """
     daily_medians = []
 
-    if monitoring_station in data and isinstance(data[monitoring_station], list):
-        records = data[monitoring_station]
-        records.sort(key=lambda x: datetime.strptime(x['date'], '%Y-%m-%d'))  # Sort records by date
-
-        current_date = records[0]['date']
-        values = []
-
-        for record in records:
-            if record['date'] == current_date:
-                if pollutant in record:
-                    value = record[pollutant]
-                    if value != "No data":
-                        values.append(float(value))
-            else:
-                if len(values) > 0:
-                    median = statistics.median(values)
-                    daily_medians.append({
-                        'date': current_date,
-                        'median': median
-                    })
-                else:
-                    daily_medians.append({
-                        'date': current_date,
-                        'median': None
-                    })
-                    
-                # Move to the next date
-                current_date = record['date']
-                values = []
-
-                if pollutant in record:
-                    value = record[pollutant]
-                    if value != "No data":
-                        values.append(float(value))
-
-        # Add the last daily median
-        if len(values) > 0:
-            median = statistics.median(values)
+    station = get_station(data, monitoring_station)
+    if station is not None:
+        for day, (median,) in quantiles.daily_percentiles(station, pollutant, (50,)).items():
             daily_medians.append({
-                'date': current_date,
+                'date': day_to_date(day),
                 'median': median
             })
-        else:
-            daily_medians.append({
-                'date': current_date,
-                'median': None
-            })
 
     return daily_medians
 
+@memo.memoized
+def daily_percentiles(data, monitoring_station, pollutant, percentiles=(25, 50, 75, 95)):
+    """
+    Calculate daily percentiles, such as the interquartile range, for a specific pollutant
+    and monitoring station.
+
+    Args:
+        data (dict): The data dictionary containing the pollution records.
+        monitoring_station (str): The code of the monitoring station.
+        pollutant (str): The name of the pollutant.
+        percentiles (tuple): The percentiles to calculate, each from 0 to 100.
+
+    Returns:
+        list: A list of dictionaries, each containing the date and a 'pNN' entry per percentile.
+    """
+    daily_values = []
+
+    station = get_station(data, monitoring_station)
+    if station is not None:
+        names = [f'p{q:g}' for q in percentiles]
+        for day, values in quantiles.daily_percentiles(station, pollutant, tuple(percentiles)).items():
+            entry = {'date': day_to_date(day)}
+            entry.update(zip(names, values))
+            daily_values.append(entry)
+
+    return daily_values
+
+@memo.memoized
 def hourly_average(data, monitoring_station, pollutant):
     """
     Calculate the hourly averages for a specific pollutant and monitoring station.
@@ -138,25 +155,16 @@ def hourly_average(data, monitoring_station, pollutant):
     """
     hourly_averages = []
 
-    if monitoring_station in data and isinstance(data[monitoring_station], list):
-        records = data[monitoring_station]
-
+    aggregates = _aggregates(data, monitoring_station, pollutant)
+    if aggregates is not None:
         for hour in range(1, 25):  #the range from 1 to 25 for hours 1 to 24
-            values = []
-            for record in records:
-                record_hour = int(record['time'].split(':')[0])
-                if record_hour == hour and pollutant in record:
-                    value = float(record[pollutant])
-                    values.append(value)
-
-            if values:
-                average = sum(values) / len(values)
-                hourly_averages.append({'time': f'{hour:02}:00:00', 'average': average})
-            else:
-                hourly_averages.append({'time': f'{hour:02}:00:00', 'average': None})
+            accumulator = aggregates.hourly.get(hour)
+            average = mean(accumulator) if accumulator is not None else None
+            hourly_averages.append({'time': f'{hour:02}:00:00', 'average': average})
 
     return hourly_averages
 
+@memo.memoized
 def monthly_average(data, monitoring_station, pollutant):
     """
     Calculate the monthly averages for a specific pollutant and monitoring station.
@@ -167,51 +175,24 @@ def monthly_average(data, monitoring_station, pollutant):
         pollutant (str): The name of the pollutant.
 
     Returns:
-        list: A list of dictionaries, each containing the month and its corresponding monthly average.
+        list: A list of dictionaries, each containing the year, the month and its corresponding
+              monthly average.
     """
     monthly_averages = []
 
-    if monitoring_station in data and isinstance(data[monitoring_station], list):
-        records = data[monitoring_station]
-        records.sort(key=lambda x: datetime.strptime(x['date'], '%Y-%m-%d'))  # Sort records by date
-
-        current_month = None
-        total = 0
-        count = 0
-
-        for record in records:
-            record_date = datetime.strptime(record['date'], '%Y-%m-%d')
-            month = record_date.strftime('%B')
-
-            if current_month is None:
-                current_month = month
-
-            if month != current_month:
-                if count > 0:
-                    monthly_average = total / count
-                    monthly_averages.append({'month': current_month, 'monthly_average': monthly_average})
-                else:
-                    monthly_averages.append({'month': current_month, 'monthly_average': None})
-
-                # Move to the next month
-                current_month = month
-                total = 0
-                count = 0
-
-            if pollutant in record:
-                value = record[pollutant]
-                total += float(value)
-                count += 1
-
-        # Add the last monthly average
-        if count > 0:
-            monthly_average = total / count
-            monthly_averages.append({'month': current_month, 'monthly_average': monthly_average})
-        else:
-            monthly_averages.append({'month': current_month, 'monthly_average': None})
+    station = get_station(data, monitoring_station)
+    if station is not None and pollutant in station:
+        for bucket in resample.resample(station, pollutant, '1M', 'mean'):
+            month_start = date.fromisoformat(bucket['start'])
+            monthly_averages.append({
+                'year': month_start.year,
+                'month': month_start.strftime('%B'),
+                'monthly_average': bucket['mean']
+            })
 
     return monthly_averages
 
+@memo.memoized
 def peak_hour_date(data, date, monitoring_station, pollutant):
     """
     Find the hour of the day with the highest pollution level and its corresponding value for a given date,
@@ -227,23 +208,30 @@ def peak_hour_date(data, date, monitoring_station, pollutant):
         tuple: A tuple containing the hour of the day (in the format 'HH:00:00') and the corresponding pollution value.
                Returns None if no matching records are found.
     """
-    records = data.get(monitoring_station, [])
-    filtered_records = [record for record in records if record.get('date') == date and pollutant in record]
-    
-    if not filtered_records:
+    station = get_station(data, monitoring_station)
+    if station is None or pollutant not in station:
         return None
 
-    max_value = float(filtered_records[0][pollutant])
-    max_hour = filtered_records[0]['time']
-    
-    for record in filtered_records:
-        value = float(record[pollutant])
-        if value > max_value:
+    try:
+        start, stop = station.day_span(date)
+    except (TypeError, ValueError):
+        return None
+
+    values = station.column(pollutant)
+    max_row = None
+    max_value = None
+
+    for row in range(start, stop):
+        value = values[row]
+        if value == value and (max_value is None or value > max_value):
             max_value = value
-            max_hour = record['time']
+            max_row = row
 
-    return (max_hour, max_value)
+    if max_row is None:
+        return None
+    return (station.time(max_row), max_value)
 
+@memo.memoized
 def weekly_average(data, monitoring_station, pollutant):
     """
     Calculate the weekly averages for a specific pollutant and monitoring station.
@@ -254,30 +242,21 @@ def weekly_average(data, monitoring_station, pollutant):
         pollutant (str): The name of the pollutant.
 
     Returns:
-        list: A list of dictionaries, each containing the week number and its corresponding weekly average.
+        list: A list of dictionaries, each containing the ISO year, the week number and its
+              corresponding weekly average.
     """
     weekly_averages = []
 
-    if monitoring_station in data and isinstance(data[monitoring_station], list):
-        records = data[monitoring_station]
-
-        # Group records by week
-        weekly_records = {}
-        for record in records:
-            if pollutant in record:
-                date = record['date']
-                week_number = datetime.strptime(date, '%Y-%m-%d').isocalendar()[1]
-                if week_number not in weekly_records:
-                    weekly_records[week_number] = []
-                weekly_records[week_number].append(float(record[pollutant]))
-
-        # Calculate weekly averages
-        for week_number, records in weekly_records.items():
-            average = sum(records) / len(records)
-            weekly_averages.append({'week': week_number, 'weekly_average': average})
+    station = get_station(data, monitoring_station)
+    if station is not None and pollutant in station:
+        for bucket in resample.resample(station, pollutant, '1W', ('mean', 'count')):
+            if bucket['count'] > 0:
+                year, week_number, _ = date.fromisoformat(bucket['start']).isocalendar()
+                weekly_averages.append({'year': year, 'week': week_number, 'weekly_average': bucket['mean']})
 
     return weekly_averages
 
+@memo.memoized
 def day_of_week_average(data, monitoring_station, pollutant):
     """
     Calculate the day-of-the-week averages for a specific pollutant and monitoring station.
@@ -292,29 +271,16 @@ def day_of_week_average(data, monitoring_station, pollutant):
     """
     day_of_week_averages = []
 
-    if monitoring_station in data and isinstance(data[monitoring_station], list):
-        records = data[monitoring_station]
-
-        # Group records by day of the week
-        day_of_week_records = {}
-        for record in records:
-            if pollutant in record:
-                date = record['date']
-                day_of_week = datetime.strptime(date, '%Y-%m-%d').strftime('%A')
-                if day_of_week not in day_of_week_records:
-                    day_of_week_records[day_of_week] = []
-                day_of_week_records[day_of_week].append(float(record[pollutant]))
-
-        # Calculate day of the week averages
-        weekdays = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-        for day_of_week in weekdays:
-            if day_of_week in day_of_week_records:
-                records = day_of_week_records[day_of_week]
-                average = sum(records) / len(records)
-                day_of_week_averages.append({'day_of_week': day_of_week, 'average': average})
+    aggregates = _aggregates(data, monitoring_station, pollutant)
+    if aggregates is not None:
+        for weekday, day_of_week in enumerate(WEEKDAYS):
+            accumulator = aggregates.day_of_week.get(weekday)
+            if accumulator is not None and accumulator[COUNT] > 0:
+                day_of_week_averages.append({'day_of_week': day_of_week, 'average': mean(accumulator)})
 
     return day_of_week_averages
 
+@memo.memoized
 def count_missing_data(data, monitoring_station, pollutant):
     """
     Count the number of missing data occurrences for a specific pollutant and monitoring station.
@@ -327,12 +293,11 @@ def count_missing_data(data, monitoring_station, pollutant):
     Returns:
         int: The count of missing data occurrences.
     """
-    count = 0
-    if monitoring_station in data and isinstance(data[monitoring_station], list):
-        for record in data[monitoring_station]:
-            if pollutant in record and record[pollutant] == "No data":
-                count += 1
-    return count
+    station = get_station(data, monitoring_station)
+    if station is None:
+        return 0
+    # A population count of the validity mask recorded when the data was read
+    return station.missing_count(pollutant)
 
 def fill_missing_data(data, new_value, monitoring_station, pollutant):
     """
@@ -347,48 +312,97 @@ def fill_missing_data(data, new_value, monitoring_station, pollutant):
     Returns:
         None
     """
-    if monitoring_station in data and isinstance(data[monitoring_station], list):
-        for record in data[monitoring_station]:
-            if pollutant in record and record[pollutant] == "No data":
-                record[pollutant] = new_value
+    station = get_station(data, monitoring_station)
+    if station is not None and pollutant in station:
+        # Marked first, so that columns loaded on demand stay in memory while they change
+        station.mark_changed()
+        values = station.column(pollutant)
+        mask = station.validity(pollutant)
+        new_value = float(new_value)
+        for row in list(mask.unset()):
+            values[row] = new_value
+            mask.set(row)
+
+
+def read_station(station_code, path=None, use_cache=True, start_date=None, end_date=None, workers=None):
+    """
+    Read the CSV file of one monitoring station.
 
+    Missing values are left missing: they are recorded in the validity mask of
+    each column and left out of every report, rather than filled with 0.
 
-def read_csv_files():
+    Args:
+        station_code (str): The code of the monitoring station.
+        path (str or None): The path of the CSV file. Defaults to the file listed in
+            STATION_FILES.
+        use_cache (bool): Whether to use and refresh the binary snapshot of the file.
+        start_date (str or None): Only read rows from this date on, in 'YYYY-MM-DD' format.
+        end_date (str or None): Only read rows before this date, in 'YYYY-MM-DD' format.
+        workers (int or None): The number of processes used to parse a large CSV file.
+            Defaults to the number of CPUs.
+
+    Returns:
+        StationData: The columnar data of the station.
+    """
+    if path is None:
+        path = STATION_FILES[station_code]
+    if use_cache:
+        # Only the yearly partitions that overlap the date range are read
+        station = snapshot.load_station(path, station_code, start_date=start_date, end_date=end_date,
+                                        workers=workers)
+    else:
+        station = parallel_csv.load_csv(path, station_code, workers)
+        if start_date is not None or end_date is not None:
+            start, stop = station.date_range_span(start_date or '0001-01-01', end_date or '9999-12-31')
+            station = station.slice(start, stop)
+
+    # Uncomment the following lines to print the missing data count for each pollutant
+    # for pollutant in station.pollutants:
+    #     print(f"Missing data count for {station_code} {pollutant}: {station.missing_count(pollutant)}")
+
+    return station
+
+
+def read_csv_files(use_cache=True, start_date=None, end_date=None):
     """
     Read the CSV files for each monitoring station and store the data in a dictionary.
 
+    Unless use_cache is False, each file is loaded from its binary snapshot in
+    data/.cache/ when the snapshot is still current, and parsed otherwise. The
+    snapshots are partitioned by year, so with a date range only the years it
+    touches are read.
+
+    Args:
+        use_cache (bool): Whether to use and refresh the binary snapshots.
+        start_date (str or None): Only read rows from this date on, in 'YYYY-MM-DD' format.
+        end_date (str or None): Only read rows before this date, in 'YYYY-MM-DD' format.
+
     Returns:
-        dict: A dictionary containing the data from the CSV files for each monitoring station.
+        dict: A dictionary mapping each monitoring station code to its StationData.
     """
     data = {}
 
-    MY1 = "data/Pollution-London Marylebone Road.csv"
-    KC1 = "data/Pollution-London N Kensington.csv"
-    HRL = "data/Pollution-London Harlington.csv"
-
-    # Read MY1 data
-    with open(MY1, "r") as file:
-        reader = csv.DictReader(file)
-        data["MY1"] = [row for row in reader]
-
-    # Read KC1 data
-    with open(KC1, "r") as file:
-        reader = csv.DictReader(file)
-        data["KC1"] = [row for row in reader]
-
-    # Read HRL data
-    with open(HRL, "r") as file:
-        reader = csv.DictReader(file)
-        data["HRL"] = [row for row in reader]
-
-    # Count and fill missing data for all pollutants and monitoring stations
-    for station_code, station_data in data.items():
-        for pollutant in station_data[0].keys():
-            if pollutant != "date" and pollutant != "time":
-                missing_count = count_missing_data(data, station_code, pollutant)
-                # Uncomment the following line to print the missing data count for each pollutant
-                # print(f"Missing data count for {station_code} {pollutant}: {missing_count}")
-                if missing_count > 0:
-                    fill_missing_data(data, 0, station_code, pollutant)
-
-    return data
\ No newline at end of file
+    for station_code, path in STATION_FILES.items():
+        data[station_code] = read_station(station_code, path, use_cache, start_date, end_date)
+
+    return data
+
+
+def open_csv_files(start_date=None, end_date=None, max_bytes=lazy.DEFAULT_MAX_BYTES):
+    """
+    Open the CSV files for each monitoring station without reading them yet.
+
+    This returns the same mapping of station codes to StationData as read_csv_files,
+    but a station is only read when it is first looked up, and then only its
+    timestamps; each pollutant column is read from the binary snapshot the first
+    time a report uses it. At most max_bytes of columns are kept in memory.
+
+    Args:
+        start_date (str or None): Only use rows from this date on, in 'YYYY-MM-DD' format.
+        end_date (str or None): Only use rows before this date, in 'YYYY-MM-DD' format.
+        max_bytes (int): The number of bytes of pollutant columns kept in memory.
+
+    Returns:
+        StationFiles: A mapping of each monitoring station code to its StationData.
+    """
+    return lazy.StationFiles(STATION_FILES, start_date, end_date, lazy.ColumnCache(max_bytes))
@@ -0,0 +1,283 @@
+# This module resamples the readings of a station into calendar-aligned time buckets.
+#
+#     resample(station, 'pm10', bucket='8h', agg=['mean', 'max', 'p95', 'count'])
+#
+# A bucket is a count followed by a unit: 'h' for hours, 'D' for days, 'W' for ISO
+# weeks, 'M' for calendar months and 'Y' for calendar years. Buckets start at
+# midnight, on a Monday, on the first of a month or on the first of January, so
+# '8h' splits every day into 00-08, 08-16 and 16-24 and '3M' gives quarters.
+# Hour buckets restart every day and day buckets every month, so the last bucket
+# of a day or month is cut short when the count does not divide it: '5h' ends
+# each day with 20-24 and '7D' ends each month with the days from the 29th on.
+#
+# The rows of a station are sorted, so every bucket is one contiguous span of rows
+# and is found with a binary search. Daily, weekly and monthly sums, counts, minima,
+# maxima and means are read from the cached aggregates instead, without reading
+# the column itself.
+
+from bisect import bisect_right
+from datetime import date
+
+import aggregation
+import quantiles
+from aggregation import SUM, COUNT, MIN, MAX
+from store import EPOCH_ORDINAL, day_to_date
+
+UNITS = ('h', 'D', 'W', 'M', 'Y')
+
+# Aggregators that can be answered from the cached aggregates
+ACCUMULATED = ('sum', 'count', 'min', 'max', 'mean')
+
+# The Aggregates table holding each bucket size that is computed in advance
+TABLES = {(1, 'D'): 'daily', (1, 'W'): 'weekly', (1, 'M'): 'monthly'}
+
+
+def _mean(values):
+    return sum(values) / len(values) if values else None
+
+
+def _min(values):
+    return min(values) if values else None
+
+
+def _max(values):
+    return max(values) if values else None
+
+
+def _median(values):
+    return quantiles.percentile(values, 50)
+
+
+# Maps an aggregator name to a function of the list of valid values in a bucket
+AGGREGATORS = {
+    'sum': sum,
+    'count': len,
+    'min': _min,
+    'max': _max,
+    'mean': _mean,
+    'median': _median,
+}
+
+
+def register_aggregator(name, function):
+    """
+    Make an aggregator available to resample() by name.
+
+    Args:
+        name (str): The name used in the agg argument and as the result key.
+        function (callable): Takes the list of valid values of a bucket, which may be
+            empty, and returns the aggregated value.
+
+    Returns:
+        None
+
+    Raises:
+        ValueError: If the name is one of the built-in aggregators.
+    """
+    if name in ('sum', 'count', 'min', 'max', 'mean', 'median'):
+        raise ValueError(f"Cannot replace the built-in aggregator {name!r}")
+    AGGREGATORS[name] = function
+
+
+def aggregator(spec):
+    """
+    Resolve an aggregator from its name.
+
+    Besides the names in AGGREGATORS, 'pNN' stands for the NN-th percentile, as in
+    'p95' or 'p99.9'. A callable is used as it is, under its __name__.
+
+    Args:
+        spec (str or callable): The name of the aggregator, or the function itself.
+
+    Returns:
+        tuple: The result key and the function.
+
+    Raises:
+        ValueError: If the name is unknown or the percentile is out of range.
+    """
+    if callable(spec):
+        return spec.__name__, spec
+    function = AGGREGATORS.get(spec)
+    if function is not None:
+        return spec, function
+    if isinstance(spec, str) and spec.startswith('p'):
+        try:
+            q = float(spec[1:])
+        except ValueError:
+            q = None
+        if q is not None:
+            if not 0 <= q <= 100:
+                raise ValueError(f"Percentile out of range: {spec}")
+            return spec, lambda values: quantiles.percentile(values, q)
+    raise ValueError(f"Unknown aggregator: {spec!r}")
+
+
+def parse_bucket(bucket):
+    """
+    Split a bucket size such as '3h' or '1W' into its count and unit.
+
+    Args:
+        bucket (str): The bucket size; the count defaults to 1, as in 'D'.
+
+    Returns:
+        tuple: The count and the unit, one of UNITS.
+
+    Raises:
+        ValueError: If the bucket is malformed, finer than the hourly readings, or
+            more hours than a day or more days than a month.
+    """
+    digits = len(bucket) - len(bucket.lstrip('0123456789'))
+    count = int(bucket[:digits]) if digits else 1
+    unit = bucket[digits:]
+    if unit in ('min', 'T', 's'):
+        raise ValueError(f"Bucket {bucket!r} is finer than the hourly station readings")
+    if unit not in UNITS or count < 1:
+        raise ValueError(f"Unknown bucket size: {bucket!r}")
+    if unit == 'h' and count > 24:
+        raise ValueError(f"Bucket {bucket!r} spans more than a day; use 'D' buckets instead")
+    if unit == 'D' and count > 31:
+        raise ValueError(f"Bucket {bucket!r} spans more than a month; use 'W' or 'M' buckets instead")
+    return count, unit
+
+
+def _first_of_month(index):
+    return date(index // 12, index % 12 + 1, 1).toordinal() - EPOCH_ORDINAL
+
+
+def bucket_bounds(ts, count, unit):
+    """
+    Return the bucket a reading falls in.
+
+    Args:
+        ts (int): The epoch-hour timestamp of the reading, which marks the end of its hour.
+        count (int): The number of units per bucket.
+        unit (str): One of UNITS.
+
+    Returns:
+        tuple: The epoch hours at which the bucket starts and ends; it holds the
+            readings with start < ts <= end.
+    """
+    day, hour = divmod(ts - 1, 24)
+    if unit == 'h':
+        start = day * 24 + hour // count * count
+        return start, min(start + count, day * 24 + 24)
+    if unit == 'D':
+        day_date = date.fromordinal(day + EPOCH_ORDINAL)
+        first = day - (day_date.day - 1) % count
+        index = day_date.year * 12 + day_date.month - 1
+        last = min(first + count, _first_of_month(index + 1))
+    elif unit == 'W':
+        # 1969-12-29, day -3, is the Monday before the epoch
+        first = (day + 3) // (7 * count) * (7 * count) - 3
+        last = first + 7 * count
+    else:
+        day_date = date.fromordinal(day + EPOCH_ORDINAL)
+        months = 12 * count if unit == 'Y' else count
+        index = (day_date.year * 12 + day_date.month - 1) // months * months
+        first = _first_of_month(index)
+        last = _first_of_month(index + months)
+    return first * 24, last * 24
+
+
+def _label(hour, unit):
+    day, hour = divmod(hour, 24)
+    if unit == 'h':
+        return f'{day_to_date(day)} {hour:02}:00:00'
+    return day_to_date(day)
+
+
+def spans(station, count, unit):
+    """
+    Iterate over the buckets that hold rows of a station.
+
+    Args:
+        station (StationData): The station data.
+        count (int): The number of units per bucket.
+        unit (str): One of UNITS.
+
+    Yields:
+        tuple: The start and end epoch hours of a bucket and its (start, stop) row span.
+    """
+    timestamps = station.timestamps
+    row = 0
+    total = len(timestamps)
+    while row < total:
+        first, last = bucket_bounds(timestamps[row], count, unit)
+        stop = bisect_right(timestamps, last, row)
+        yield first, last, row, stop
+        row = stop
+
+
+def _from_aggregates(station, pollutant, table, names):
+    accumulators = getattr(aggregation.aggregate(station, [pollutant])[pollutant], table)
+    for key, accumulator in accumulators.items():
+        if table == 'monthly':
+            first = _first_of_month(key[0] * 12 + key[1] - 1)
+        else:
+            first = key
+        count = accumulator[COUNT]
+        values = {
+            'sum': accumulator[SUM],
+            'count': count,
+            'min': accumulator[MIN] if count else None,
+            'max': accumulator[MAX] if count else None,
+            'mean': accumulator[SUM] / count if count else None,
+        }
+        yield first * 24, {name: values[name] for name in names}
+
+
+def resample(station, pollutant, bucket='1D', agg=('mean',)):
+    """
+    Aggregate a pollutant of a station over calendar-aligned time buckets.
+
+    Missing values are left out of every aggregate. Buckets without any rows are
+    left out of the result; buckets whose rows are all missing are kept, with a
+    count and sum of zero and None for the other built-in aggregates.
+
+    Args:
+        station (StationData): The station data.
+        pollutant (str): The name of the pollutant.
+        bucket (str): The bucket size, such as '8h', '1D', '1W', '1M' or '1Y'.
+        agg (str, callable or list): The aggregators, as names ('mean', 'sum',
+            'count', 'min', 'max', 'median', 'pNN' or any registered name) or
+            functions of the list of valid values in a bucket.
+
+    Returns:
+        list: One dictionary per bucket in time order, with its 'start' and an entry
+            per aggregator. The start is a 'YYYY-MM-DD' date, or a 'YYYY-MM-DD HH:00:00'
+            time for hourly buckets.
+
+    Raises:
+        KeyError: If the station has no such pollutant.
+        ValueError: If the bucket size or an aggregator is not valid.
+    """
+    count, unit = parse_bucket(bucket)
+    if isinstance(agg, str) or callable(agg):
+        agg = [agg]
+    aggregators = [aggregator(spec) for spec in agg]
+    if pollutant not in station:
+        raise KeyError(pollutant)
+
+    names = [name for name, _ in aggregators]
+    table = TABLES.get((count, unit))
+    if table is not None and all(isinstance(spec, str) and spec in ACCUMULATED for spec in agg):
+        result = []
+        for first, values in _from_aggregates(station, pollutant, table, names):
+            entry = {'start': _label(first, unit)}
+            entry.update(values)
+            result.append(entry)
+        return result
+
+    values = station.column(pollutant)
+    mask = station.validity(pollutant)
+    result = []
+    for first, _, start, stop in spans(station, count, unit):
+        if mask.all(start, stop):
+            valid = values[start:stop].tolist()
+        else:
+            valid = [value for value in values[start:stop] if value == value]
+        entry = {'start': _label(first, unit)}
+        for name, function in aggregators:
+            entry[name] = function(valid)
+        result.append(entry)
+    return result
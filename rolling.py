@@ -0,0 +1,216 @@
+# This module computes rolling statistics over a sliding time window.
+#
+# A RollingWindow is fed readings in time order and always knows the sum, count,
+# mean, minimum and maximum of the valid values within the last `hours` hours.
+# The values are kept in a queue and the running sum is updated as they enter and
+# leave the window. The maximum and minimum are the heads of two monotonic queues:
+# a new value first removes the values it dominates from their tails, so each
+# value is added and removed at most once and every reading costs O(1) amortized,
+# whatever the length of the window.
+#
+# The same windows serve live series, through poller.Series, and the historical
+# station store, through rolling().
+
+from array import array
+from collections import deque
+
+from store import MISSING, timestamp
+
+# The statistics a window keeps, in the order stats() returns them
+STATISTICS = ('sum', 'count', 'mean', 'min', 'max')
+
+
+def measurement_hour(measurement_date):
+    """
+    Convert an @MeasurementDateGMT field of the API into an epoch-hour timestamp.
+
+    Args:
+        measurement_date (str): The time in 'YYYY-MM-DD HH:MM:SS' format.
+
+    Returns:
+        int: The number of hours since 1970-01-01 00:00:00.
+    """
+    return timestamp(measurement_date[:10], measurement_date[11:])
+
+
+class RollingWindow:
+    """
+    Rolling statistics of the readings within the last `hours` hours.
+
+    The window ends at the newest reading pushed, and holds the readings with
+    newest - hours < ts <= newest. Missing values move the window on but are left
+    out of the statistics.
+
+    Attributes:
+        hours (int): The length of the window in hours.
+        newest (int or None): The timestamp of the newest reading pushed.
+        sum (float): The sum of the valid values in the window.
+    """
+
+    def __init__(self, hours):
+        if hours < 1:
+            raise ValueError(f"The window must be at least one hour long, not {hours}")
+        self.hours = hours
+        self.newest = None
+        self.sum = 0.0
+        self._values = deque()
+        self._max = deque()
+        self._min = deque()
+
+    def push(self, ts, value, label=None):
+        """
+        Add the newest reading to the window.
+
+        Args:
+            ts (int): The epoch-hour timestamp of the reading.
+            value (float or None): The value; None or NaN when it is missing.
+            label (str or None): Returned by max_at and min_at for this reading.
+                Defaults to the timestamp itself.
+
+        Returns:
+            None
+
+        Raises:
+            ValueError: If the reading is older than the newest one pushed.
+        """
+        if self.newest is not None and ts < self.newest:
+            raise ValueError("Readings must be pushed in time order")
+        self.newest = ts
+        if value is not None and value == value:
+            entry = (ts, value, ts if label is None else label)
+            self._values.append(entry)
+            self.sum += value
+            while self._max and self._max[-1][1] < value:
+                self._max.pop()
+            self._max.append(entry)
+            while self._min and self._min[-1][1] > value:
+                self._min.pop()
+            self._min.append(entry)
+        self._expire(ts - self.hours)
+
+    def advance(self, ts):
+        """
+        Move the end of the window on to a time without adding a reading.
+
+        Args:
+            ts (int): The epoch-hour timestamp the window now ends at.
+
+        Returns:
+            None
+        """
+        self.push(ts, None)
+
+    def _expire(self, cutoff):
+        values = self._values
+        while values and values[0][0] <= cutoff:
+            self.sum -= values.popleft()[1]
+        if not values:
+            # Start again from an exact zero rather than carry rounding errors
+            self.sum = 0.0
+        while self._max and self._max[0][0] <= cutoff:
+            self._max.popleft()
+        while self._min and self._min[0][0] <= cutoff:
+            self._min.popleft()
+
+    @property
+    def count(self):
+        """The number of valid values in the window."""
+        return len(self._values)
+
+    @property
+    def mean(self):
+        """The mean of the valid values in the window, or None if there are none."""
+        return self.sum / len(self._values) if self._values else None
+
+    @property
+    def max(self):
+        """The largest valid value in the window, or None if there are none."""
+        return self._max[0][1] if self._max else None
+
+    @property
+    def min(self):
+        """The smallest valid value in the window, or None if there are none."""
+        return self._min[0][1] if self._min else None
+
+    @property
+    def max_at(self):
+        """The label of the earliest reading holding the maximum, or None."""
+        return self._max[0][2] if self._max else None
+
+    @property
+    def min_at(self):
+        """The label of the earliest reading holding the minimum, or None."""
+        return self._min[0][2] if self._min else None
+
+    def stats(self):
+        """
+        Return the statistics of the window.
+
+        Returns:
+            dict: The 'sum', 'count', 'mean', 'min' and 'max' of the valid values,
+                and 'min_at' and 'max_at', the labels of the readings holding them.
+        """
+        return {'sum': self.sum, 'count': self.count, 'mean': self.mean,
+                'min': self.min, 'max': self.max,
+                'min_at': self.min_at, 'max_at': self.max_at}
+
+
+def rolling(station, pollutant, hours, agg=('mean',)):
+    """
+    Compute rolling statistics of a pollutant at every reading of a station.
+
+    Args:
+        station (StationData): The station data.
+        pollutant (str): The name of the pollutant.
+        hours (int): The length of the window in hours; the window at a reading
+            holds the readings of the `hours` hours ending with it.
+        agg (str or list): The statistics to compute, from STATISTICS.
+
+    Returns:
+        dict: Maps each statistic to an array('d') aligned with station.timestamps;
+            the entries are NaN where the window holds no valid value.
+
+    Raises:
+        KeyError: If the station has no such pollutant.
+        ValueError: If a statistic is unknown or the window is shorter than an hour.
+    """
+    if isinstance(agg, str):
+        agg = [agg]
+    for name in agg:
+        if name not in STATISTICS:
+            raise ValueError(f"Unknown rolling statistic: {name!r}")
+    values = station.column(pollutant)
+    if values is None:
+        raise KeyError(pollutant)
+
+    window = RollingWindow(hours)
+    results = {name: array('d', bytes(8 * len(values))) for name in agg}
+    outputs = [(results[name], name) for name in agg]
+    for row, (ts, value) in enumerate(zip(station.timestamps, values)):
+        window.push(ts, value)
+        for output, name in outputs:
+            result = getattr(window, name)
+            output[row] = MISSING if result is None else result
+    return results
+
+
+def window_extreme(readings, hours, largest=True):
+    """
+    Find the largest or smallest value among the readings of the last `hours` hours.
+
+    Args:
+        readings (iterable): (measurement date, value) pairs in time order, with
+            dates in the API's 'YYYY-MM-DD HH:MM:SS' format and None for missing values.
+        hours (int): The length of the window, ending at the last reading.
+
+    Returns:
+        tuple: The value and the measurement date holding it, or (None, None) if
+            the window holds no valid value.
+    """
+    window = RollingWindow(hours)
+    for measurement_date, value in readings:
+        window.push(measurement_hour(measurement_date), value, measurement_date)
+    if largest:
+        return window.max, window.max_at
+    return window.min, window.min_at
+
@@ -0,0 +1,264 @@
+# This module serves the PR reports as JSON over HTTP from one warm dataset.
+#
+#     python server.py --port 8000
+#     curl 'http://127.0.0.1:8000/report/monthly_average?station=MY1&pollutant=pm10'
+#
+# The station data is loaded once when the server starts and shared by every
+# request, so clients neither load the CSV files nor keep a copy of the data.
+# Connections are handled by a fixed pool of threads, and each query runs on a
+# second pool with a time limit: a query that is still running after
+# REQUEST_TIMEOUT seconds is answered with 504, while it finishes in the
+# background.
+#
+# Endpoints:
+#     GET /reports             the report names
+#     GET /stations            the pollutants of every station
+#     GET /report/<name>       a report; station and pollutant are required, and
+#                              start, end and date are passed on to main.run_query
+#     GET /stats               request counters and report cache statistics
+
+import argparse
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as QueryTimeout
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import memo
+import reporting
+from main import QUERY_REPORTS, run_query
+
+# Threads handling connections, and threads running queries
+WORKERS = 16
+
+# Seconds a query may run before the request is answered with 504
+REQUEST_TIMEOUT = 10.0
+
+# Query parameters accepted by /report/<name>, with the run_query argument they fill
+PARAMETERS = {'station': 'monitoring_station', 'pollutant': 'pollutant',
+              'start': 'start_date', 'end': 'end_date', 'date': 'date'}
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """Answers one HTTP request with the JSON result of a query."""
+
+    server_version = "AQUA/1.0"
+
+    def setup(self):
+        # A client that stops sending does not hold a thread for longer than a query could
+        self.timeout = self.server.request_timeout
+        super().setup()
+
+    def do_GET(self):
+        started = time.perf_counter()
+        url = urlsplit(self.path)
+        parts = [part for part in url.path.split("/") if part]
+        try:
+            if parts == ["reports"] or not parts:
+                status, body = 200, {"reports": list(QUERY_REPORTS)}
+            elif parts == ["stations"]:
+                status, body = 200, self.server.stations()
+            elif parts == ["stats"]:
+                status, body = 200, self.server.stats()
+            elif len(parts) == 2 and parts[0] == "report":
+                status, body = self.server.query(parts[1], parse_qs(url.query))
+            else:
+                status, body = 404, {"error": f"Not found: {url.path}"}
+        except Exception as error:
+            status, body = 500, {"error": str(error)}
+        self.send_json(status, body)
+        self.server.count(status, time.perf_counter() - started)
+
+    def send_json(self, status, body):
+        """
+        Send a JSON response.
+
+        Args:
+            status (int): The HTTP status.
+            body: The value to encode.
+
+        Returns:
+            None
+        """
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class QueryServer(HTTPServer):
+    """
+    An HTTP server answering report queries over shared station data.
+
+    Attributes:
+        data (dict): Maps station codes to their StationData.
+        request_timeout (float): Seconds a query may run.
+        verbose (bool): Whether to log every request to standard error.
+    """
+
+    # Connections waiting to be accepted; the default of 5 drops bursts of clients
+    request_queue_size = 128
+
+    def __init__(self, address, data, workers=WORKERS, request_timeout=REQUEST_TIMEOUT, verbose=False):
+        super().__init__(address, QueryHandler)
+        self.data = data
+        self.request_timeout = request_timeout
+        self.verbose = verbose
+        self._connections = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="aqua-http")
+        self._queries = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="aqua-query")
+        self._lock = threading.Lock()
+        self._counters = {"requests": 0, "errors": 0, "timeouts": 0, "seconds": 0.0}
+
+    def process_request(self, request, client_address):
+        self._connections.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self._connections.shutdown(wait=False)
+        self._queries.shutdown(wait=False)
+
+    def query(self, report, params):
+        """
+        Run a report query within the time limit.
+
+        Args:
+            report (str): The name of the report.
+            params (dict): The query string, as parsed by urllib.parse.parse_qs.
+
+        Returns:
+            tuple: The HTTP status and the response body.
+        """
+        unknown = sorted(set(params) - set(PARAMETERS))
+        if unknown:
+            return 400, {"error": f"Unknown parameters: {', '.join(unknown)}"}
+        arguments = {PARAMETERS[name]: values[-1] for name, values in params.items()}
+        if 'monitoring_station' not in arguments or 'pollutant' not in arguments:
+            return 400, {"error": "station and pollutant are required"}
+
+        future = self._queries.submit(run_query, self.data, report=report, **arguments)
+        try:
+            result = future.result(timeout=self.request_timeout)
+        except QueryTimeout:
+            with self._lock:
+                self._counters["timeouts"] += 1
+            return 504, {"error": f"The query took longer than {self.request_timeout:g} seconds"}
+        except ValueError as error:
+            return 400, {"error": str(error)}
+        return 200, {"result": result}
+
+    def stations(self):
+        """
+        List the pollutants of every station.
+
+        Returns:
+            dict: Maps each station code to its pollutant names.
+        """
+        result = {}
+        for code in self.data:
+            station = reporting.get_station(self.data, code)
+            if station is not None:
+                result[code] = station.pollutants
+        return result
+
+    def count(self, status, seconds):
+        """
+        Record a finished request.
+
+        Args:
+            status (int): The HTTP status it was answered with.
+            seconds (float): How long it took.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._counters["requests"] += 1
+            self._counters["seconds"] += seconds
+            if status >= 400:
+                self._counters["errors"] += 1
+
+    def stats(self):
+        """
+        Return the request counters.
+
+        Returns:
+            dict: The number of requests, errors and timeouts, the seconds spent,
+                and the statistics of the report cache under 'cache'.
+        """
+        with self._lock:
+            counters = dict(self._counters)
+        counters["cache"] = memo.cache.stats()
+        return counters
+
+
+def serve(host="127.0.0.1", port=8000, data=None, workers=WORKERS, request_timeout=REQUEST_TIMEOUT, verbose=False):
+    """
+    Load the station data and answer queries until interrupted.
+
+    Args:
+        host (str): The address to listen on.
+        port (int): The port to listen on.
+        data (dict or None): The station data. Defaults to reporting.read_csv_files().
+        workers (int): The number of threads handling connections, and running queries.
+        request_timeout (float): Seconds a query may run.
+        verbose (bool): Whether to log every request.
+
+    Returns:
+        None
+    """
+    if data is None:
+        data = reporting.read_csv_files()
+    server = QueryServer((host, port), data, workers, request_timeout, verbose)
+    print(f"Serving {len(data)} stations on http://{host}:{server.server_port}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main(argv=None):
+    """
+    Run the query service from the command line.
+
+    Args:
+        argv (list or None): The command line arguments. Defaults to sys.argv.
+
+    Returns:
+        int: The exit code.
+    """
+    parser = argparse.ArgumentParser(description="Serve the PR reports as JSON over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8000, help="port to listen on (default: 8000)")
+    parser.add_argument("--workers", type=int, default=WORKERS, help=f"threads (default: {WORKERS})")
+    parser.add_argument("--timeout", type=float, default=REQUEST_TIMEOUT,
+                        help=f"seconds a query may run (default: {REQUEST_TIMEOUT:g})")
+    parser.add_argument("--lazy", action="store_true",
+                        help="read stations and pollutants on first use instead of at start")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log every request")
+    args = parser.parse_args(argv)
+    data = reporting.open_csv_files() if args.lazy else reporting.read_csv_files()
+    serve(args.host, args.port, data, args.workers, args.timeout, args.verbose)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,466 @@
+# This module keeps a binary snapshot of every parsed station CSV file.
+#
+# The first time a station file is read, its typed columns are written next to it
+# in data/.cache/ as raw machine-format arrays, together with a small JSON manifest
+# describing the source file. Later runs map those files instead of parsing the
+# CSV again. A snapshot is thrown away as soon as the size, modification time or
+# content hash of its source file no longer match.
+#
+# The columns are partitioned by calendar year, one file per year and column, and
+# the manifest records the rows and time bounds of every partition. A query over
+# a date range only reads the partitions the range touches, so a long history
+# never has to be held in memory at once. The validity mask of each pollutant
+# column is stored next to it, packed eight rows to the byte.
+#
+# The aggregates of every pollutant column (see cube.py) are saved with the
+# snapshot too. A station loaded in full from its snapshot reads them back when a
+# report needs them, instead of computing them from the rows.
+
+import hashlib
+import json
+import mmap
+import os
+import sys
+from array import array
+from bisect import bisect_left
+from datetime import date
+
+import aggregation
+import cube
+import parallel_csv
+from store import EPOCH_ORDINAL, Bitmask, StationData, date_to_day, day_of, day_to_date
+
+# Bump whenever the layout of the snapshot files changes
+FORMAT_VERSION = 4
+
+CACHE_DIR_NAME = ".cache"
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """
+    Calculate the SHA-256 hash of a file's contents.
+
+    Args:
+        path (str): The path of the file.
+        chunk_size (int): The number of bytes read at a time.
+
+    Returns:
+        str: The hexadecimal digest.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fingerprint(path, with_hash=True):
+    """
+    Describe the current state of a source file.
+
+    Args:
+        path (str): The path of the file.
+        with_hash (bool): Whether to include the content hash, which reads the whole file.
+
+    Returns:
+        dict: The size, modification time and, optionally, the content hash of the file.
+    """
+    stat = os.stat(path)
+    result = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    if with_hash:
+        result["sha256"] = file_hash(path)
+    return result
+
+
+def cache_paths(path, cache_dir=None):
+    """
+    Return the locations of the snapshot files for a source CSV file.
+
+    Args:
+        path (str): The path of the source CSV file.
+        cache_dir (str or None): The snapshot directory. Defaults to a .cache directory
+            next to the source file.
+
+    Returns:
+        tuple: The directory and the file name prefix used for the snapshot files.
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    if cache_dir is None:
+        cache_dir = os.path.join(directory, CACHE_DIR_NAME)
+    return cache_dir, os.path.splitext(name)[0]
+
+
+def _column_file(cache_dir, prefix, year, column):
+    return os.path.join(cache_dir, f"{prefix}.{year}.{column}.bin")
+
+
+def _cube_file(cache_dir, prefix, index):
+    return os.path.join(cache_dir, f"{prefix}.{index}.cube.bin")
+
+
+def _meta_file(cache_dir, prefix):
+    return os.path.join(cache_dir, f"{prefix}.meta.json")
+
+
+def _write_atomic(target, data):
+    temporary = f"{target}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as file:
+        file.write(data)
+    os.replace(temporary, target)
+
+
+def _read_into(values, file_name):
+    with open(file_name, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            values.frombytes(mapped)
+
+
+def year_hours(year):
+    """
+    Return the epoch-hour timestamps that bound the readings of a calendar year.
+
+    Args:
+        year (int): The year.
+
+    Returns:
+        tuple: The first timestamp of the year and the first timestamp of the next year.
+    """
+    first = date(year, 1, 1).toordinal() - EPOCH_ORDINAL
+    following = date(year + 1, 1, 1).toordinal() - EPOCH_ORDINAL
+    return first * 24 + 1, following * 24 + 1
+
+
+def year_spans(station):
+    """
+    Split the rows of a station by the calendar year they are reported under.
+
+    Args:
+        station (StationData): The station data, sorted by timestamp.
+
+    Returns:
+        list: (year, start, stop) for every year with rows, in order.
+    """
+    timestamps = station.timestamps
+    spans = []
+    row = 0
+    while row < len(timestamps):
+        year = int(day_to_date(day_of(timestamps[row]))[:4])
+        stop = bisect_left(timestamps, year_hours(year)[1], row)
+        spans.append((year, row, stop))
+        row = stop
+    return spans
+
+
+def read_meta(path, cache_dir=None):
+    """
+    Read the description stored with the snapshot of a source file.
+
+    Args:
+        path (str): The path of the source CSV file.
+        cache_dir (str or None): The snapshot directory.
+
+    Returns:
+        dict: The stored description, or None if there is no readable snapshot.
+    """
+    cache_dir, prefix = cache_paths(path, cache_dir)
+    try:
+        with open(_meta_file(cache_dir, prefix), "r") as file:
+            meta = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if meta.get("version") != FORMAT_VERSION or meta.get("byteorder") != sys.byteorder:
+        return None
+    return meta
+
+
+def is_current(path, meta, verify=False):
+    """
+    Check whether a snapshot still describes its source file.
+
+    The size and modification time are compared first. The content hash is only
+    calculated when they differ, so that a file that was touched or copied without
+    being changed keeps its snapshot, or when verify is set.
+
+    Args:
+        path (str): The path of the source CSV file.
+        meta (dict): The description stored with the snapshot.
+        verify (bool): Whether to compare the content hash even when the size and
+            modification time match.
+
+    Returns:
+        bool: True if the snapshot can be used.
+    """
+    if meta is None:
+        return False
+    current = fingerprint(path, with_hash=False)
+    if current["size"] != meta["size"]:
+        return False
+    if current["mtime_ns"] == meta["mtime_ns"] and not verify:
+        return True
+    return file_hash(path) == meta["sha256"]
+
+
+def save(station, path, cache_dir=None, source=None):
+    """
+    Write the snapshot of a station, one partition per calendar year.
+
+    Args:
+        station (StationData): The parsed station data.
+        path (str): The path of the source CSV file the data was parsed from.
+        cache_dir (str or None): The snapshot directory.
+        source (dict or None): The fingerprint of the source file at the time it was parsed.
+
+    Returns:
+        None
+    """
+    cache_dir, prefix = cache_paths(path, cache_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+    if source is None:
+        source = fingerprint(path)
+
+    # Column files are numbered in the order of meta["pollutants"], so pollutant
+    # names never have to be valid file names
+    partitions = []
+    written = set()
+    for year, start, stop in year_spans(station):
+        targets = [(_column_file(cache_dir, prefix, year, "ts"), station.timestamps[start:stop])]
+        for index, (pollutant, values) in enumerate(station.columns.items()):
+            targets.append((_column_file(cache_dir, prefix, year, index), values[start:stop]))
+            targets.append((_column_file(cache_dir, prefix, year, f"{index}.valid"),
+                            station.validity(pollutant).slice(start, stop)))
+        for target, values in targets:
+            _write_atomic(target, values.tobytes())
+            written.add(os.path.basename(target))
+        partitions.append({
+            "year": year,
+            "rows": stop - start,
+            "first": station.timestamps[start],
+            "last": station.timestamps[stop - 1],
+        })
+
+    # The aggregates cover every row, so they are computed in one pass if needed
+    aggregates = aggregation.aggregate(station)
+    for index, pollutant in enumerate(station.pollutants):
+        target = _cube_file(cache_dir, prefix, index)
+        _write_atomic(target, cube.encode(aggregates[pollutant], source["sha256"]))
+        written.add(os.path.basename(target))
+
+    meta = dict(source)
+    meta.update({
+        "version": FORMAT_VERSION,
+        "byteorder": sys.byteorder,
+        "code": station.code,
+        "rows": len(station),
+        "pollutants": station.pollutants,
+        "partitions": partitions,
+    })
+    # The manifest is written last, so a half-written snapshot is never used
+    _write_atomic(_meta_file(cache_dir, prefix), json.dumps(meta).encode())
+
+    # Remove the partitions of years the source file no longer has, and the
+    # aggregates of pollutants it no longer has
+    for name in os.listdir(cache_dir):
+        if name.startswith(prefix + ".") and name.endswith(".bin") and name not in written:
+            try:
+                os.remove(os.path.join(cache_dir, name))
+            except OSError:
+                pass
+
+
+def select_partitions(meta, start_date=None, end_date=None):
+    """
+    Return the partitions of a snapshot that hold rows in a date range.
+
+    Args:
+        meta (dict): The manifest stored with the snapshot.
+        start_date (str or None): The first date included, in 'YYYY-MM-DD' format.
+        end_date (str or None): The first date excluded, in 'YYYY-MM-DD' format.
+
+    Returns:
+        list: The manifest entries of the partitions, in order.
+    """
+    first = date_to_day(start_date) * 24 + 1 if start_date is not None else None
+    end = date_to_day(end_date) * 24 + 1 if end_date is not None else None
+    return [
+        partition for partition in meta["partitions"]
+        if (first is None or partition["last"] >= first) and (end is None or partition["first"] < end)
+    ]
+
+
+def attach_cube(station, path, meta, cache_dir=None):
+    """
+    Let a station read the aggregates stored with its snapshot when they are needed.
+
+    Only use this for a station that holds every row of the snapshot, unchanged.
+
+    Args:
+        station (StationData): The station loaded from the snapshot.
+        path (str): The path of the source CSV file.
+        meta (dict): The manifest stored with the snapshot.
+        cache_dir (str or None): The snapshot directory.
+
+    Returns:
+        None
+    """
+    cache_dir, prefix = cache_paths(path, cache_dir)
+    files = {pollutant: _cube_file(cache_dir, prefix, index)
+             for index, pollutant in enumerate(meta["pollutants"])}
+    station.derived['aggregates'] = aggregation.AggregateCache(cube.loader(files, meta["sha256"]))
+
+
+def read_column(path, meta, column, partitions=None, cache_dir=None):
+    """
+    Read one column of a snapshot, concatenated over several partitions.
+
+    Args:
+        path (str): The path of the source CSV file.
+        meta (dict): The manifest stored with the snapshot.
+        column (str): 'ts' for the timestamps, or the name of a pollutant.
+        partitions (list or None): The manifest entries of the partitions to read.
+            Defaults to all of them.
+        cache_dir (str or None): The snapshot directory.
+
+    Returns:
+        array: The values, or None if the column files are missing or incomplete.
+    """
+    cache_dir, prefix = cache_paths(path, cache_dir)
+    if partitions is None:
+        partitions = meta["partitions"]
+    if column == "ts":
+        values, name = array('q'), "ts"
+    else:
+        values, name = array('d'), meta["pollutants"].index(column)
+    try:
+        for partition in partitions:
+            _read_into(values, _column_file(cache_dir, prefix, partition["year"], name))
+    except (OSError, ValueError):
+        return None
+    if len(values) != sum(partition["rows"] for partition in partitions):
+        return None
+    return values
+
+
+def read_mask(path, meta, pollutant, partitions=None, cache_dir=None):
+    """
+    Read the validity mask of one pollutant column, concatenated over several partitions.
+
+    Args:
+        path (str): The path of the source CSV file.
+        meta (dict): The manifest stored with the snapshot.
+        pollutant (str): The name of the pollutant.
+        partitions (list or None): The manifest entries of the partitions to read.
+            Defaults to all of them.
+        cache_dir (str or None): The snapshot directory.
+
+    Returns:
+        Bitmask: The mask, or None if the mask files are missing or incomplete.
+    """
+    cache_dir, prefix = cache_paths(path, cache_dir)
+    if partitions is None:
+        partitions = meta["partitions"]
+    name = f'{meta["pollutants"].index(pollutant)}.valid'
+    mask = Bitmask()
+    try:
+        for partition in partitions:
+            with open(_column_file(cache_dir, prefix, partition["year"], name), "rb") as file:
+                bits = file.read()
+            if len(bits) != (partition["rows"] + 7) // 8:
+                return None
+            mask.extend(Bitmask(partition["rows"], bytearray(bits)))
+    except OSError:
+        return None
+    return mask
+
+
+def load(path, meta, cache_dir=None, start_date=None, end_date=None):
+    """
+    Map the snapshot files of a station back into memory.
+
+    Args:
+        path (str): The path of the source CSV file.
+        meta (dict): The manifest stored with the snapshot.
+        cache_dir (str or None): The snapshot directory.
+        start_date (str or None): Only load rows from this date on, in 'YYYY-MM-DD' format.
+        end_date (str or None): Only load rows before this date, in 'YYYY-MM-DD' format.
+
+    Returns:
+        StationData: The station data, or None if the snapshot files are incomplete.
+    """
+    partitions = select_partitions(meta, start_date, end_date)
+    timestamps = read_column(path, meta, "ts", partitions, cache_dir)
+    columns = {}
+    masks = {}
+    for pollutant in meta["pollutants"]:
+        columns[pollutant] = read_column(path, meta, pollutant, partitions, cache_dir)
+        masks[pollutant] = read_mask(path, meta, pollutant, partitions, cache_dir)
+    if timestamps is None or any(values is None for values in columns.values()) \
+            or any(mask is None for mask in masks.values()):
+        return None
+
+    station = StationData(meta["code"], timestamps, columns, masks)
+    if start_date is not None or end_date is not None:
+        trimmed = _trim(station, start_date, end_date)
+        if trimmed is not station or len(partitions) != len(meta["partitions"]):
+            return trimmed
+    station.build_index()
+    attach_cube(station, path, meta, cache_dir)
+    return station
+
+
+def _trim(station, start_date, end_date):
+    start, stop = station.date_range_span(start_date or '0001-01-01', end_date or '9999-12-31')
+    if start == 0 and stop == len(station):
+        station.build_index()
+        return station
+    return station.slice(start, stop)
+
+
+def load_station(path, code, cache_dir=None, verify=False, start_date=None, end_date=None, workers=None):
+    """
+    Read a station CSV file, using its snapshot when it is still current.
+
+    When there is no usable snapshot the CSV file is parsed and a new snapshot is
+    written. Failing to write the snapshot is not an error. With a date range, only
+    the partitions the range touches are read from the snapshot.
+
+    Args:
+        path (str): The path of the source CSV file.
+        code (str): The code of the monitoring station.
+        cache_dir (str or None): The snapshot directory.
+        verify (bool): Whether to always compare the content hash of the source file.
+        start_date (str or None): Only return rows from this date on, in 'YYYY-MM-DD' format.
+        end_date (str or None): Only return rows before this date, in 'YYYY-MM-DD' format.
+        workers (int or None): The number of processes used to parse a large CSV file.
+            Defaults to the number of CPUs.
+
+    Returns:
+        StationData: The columnar data of the station.
+    """
+    meta = read_meta(path, cache_dir)
+    if is_current(path, meta, verify):
+        station = load(path, meta, cache_dir, start_date, end_date)
+        if station is not None:
+            station.code = code
+            mtime_ns = os.stat(path).st_mtime_ns
+            if mtime_ns != meta["mtime_ns"]:
+                # The file was touched but not changed; remember the new time so the
+                # hash is not calculated again on the next run
+                meta["mtime_ns"] = mtime_ns
+                try:
+                    _write_atomic(_meta_file(*cache_paths(path, cache_dir)), json.dumps(meta).encode())
+                except OSError:
+                    pass
+            return station
+
+    source = fingerprint(path)
+    station = parallel_csv.load_csv(path, code, workers)
+    try:
+        save(station, path, cache_dir, source)
+    except OSError:
+        pass
+    if start_date is not None or end_date is not None:
+        return _trim(station, start_date, end_date)
+    return station
+
@@ -0,0 +1,748 @@
+# This module holds the in-memory representation of the monitoring station data.
+#
+# Every station is stored column by column: one integer timestamp column and one
+# typed float column per pollutant, built once when the CSV file is read. The
+# reporting functions work directly on these columns instead of re-parsing
+# strings on every call.
+#
+# Missing values are stored as NaN, and each pollutant column also has a validity
+# bitmask, recorded while the file is parsed, with one bit set per valid row.
+# Counting the missing values of a column is then a population count, and spans
+# with no missing values can be used without checking every value.
+
+import csv
+from bisect import bisect_left
+from array import array
+from datetime import date
+
+# Day numbers are counted from 1970-01-01
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# Marker stored in a pollutant column for cells that read "No data"
+MISSING = float('nan')
+
+_date_cache = {}
+_day_cache = {}
+
+
+def date_to_day(text):
+    """
+    Convert a 'YYYY-MM-DD' date string into a day number since 1970-01-01.
+
+    Args:
+        text (str): The date string.
+
+    Returns:
+        int: The number of days since 1970-01-01.
+    """
+    day = _day_cache.get(text)
+    if day is None:
+        day = date.fromisoformat(text).toordinal() - EPOCH_ORDINAL
+        _day_cache[text] = day
+    return day
+
+
+def day_to_date(day):
+    """
+    Convert a day number since 1970-01-01 back into a 'YYYY-MM-DD' date string.
+
+    Args:
+        day (int): The number of days since 1970-01-01.
+
+    Returns:
+        str: The date string.
+    """
+    text = _date_cache.get(day)
+    if text is None:
+        text = date.fromordinal(day + EPOCH_ORDINAL).isoformat()
+        _date_cache[day] = text
+    return text
+
+
+def timestamp(date_text, time_text):
+    """
+    Convert the 'date' and 'time' fields of a CSV row into an epoch-hour timestamp.
+
+    The station files label each reading with the hour it ends on, from 01:00:00 to
+    24:00:00, so a reading stamped 24:00:00 belongs to the date it is written with.
+
+    Args:
+        date_text (str): The date in 'YYYY-MM-DD' format.
+        time_text (str): The time in 'HH:MM:SS' format.
+
+    Returns:
+        int: The number of hours since 1970-01-01 00:00:00.
+    """
+    return date_to_day(date_text) * 24 + int(time_text[:2])
+
+
+def day_of(ts):
+    """
+    Return the day number a timestamp is reported under.
+
+    Args:
+        ts (int): An epoch-hour timestamp.
+
+    Returns:
+        int: The day number since 1970-01-01.
+    """
+    return (ts - 1) // 24
+
+
+def hour_of(ts):
+    """
+    Return the hour of the day, from 1 to 24, a timestamp is reported under.
+
+    Args:
+        ts (int): An epoch-hour timestamp.
+
+    Returns:
+        int: The hour of the day.
+    """
+    return (ts - 1) % 24 + 1
+
+
+# Translates 0 and 1 bytes into the digits of a binary number
+_FLAG_DIGITS = bytes.maketrans(b"\x00\x01", b"01")
+
+
+class Bitmask:
+    """
+    A packed sequence of bits, with bit i of the mask stored in bit i % 8 of byte i // 8.
+
+    Attributes:
+        bits (bytearray): The packed bits.
+        length (int): The number of bits.
+    """
+
+    def __init__(self, length=0, bits=None):
+        self.length = length
+        self.bits = bits if bits is not None else bytearray((length + 7) // 8)
+
+    @classmethod
+    def from_flags(cls, flags):
+        """
+        Pack a sequence of 0 and 1 bytes into a mask.
+
+        Args:
+            flags (bytes): One byte per bit, 0 or 1.
+
+        Returns:
+            Bitmask: The mask.
+        """
+        digits = bytes(flags).translate(_FLAG_DIGITS)[::-1]
+        number = int(digits, 2) if digits else 0
+        return cls(len(flags), bytearray(number.to_bytes((len(flags) + 7) // 8, 'little')))
+
+    @classmethod
+    def from_values(cls, values):
+        """
+        Build the validity mask of a column, with a bit set for every value that is not NaN.
+
+        Args:
+            values (iterable): The values.
+
+        Returns:
+            Bitmask: The mask.
+        """
+        return cls.from_flags(bytes(value == value for value in values))
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if not 0 <= index < self.length:
+            raise IndexError("bit index out of range")
+        return (self.bits[index >> 3] >> (index & 7)) & 1
+
+    def __iter__(self):
+        bits = self.bits
+        return ((bits[i >> 3] >> (i & 7)) & 1 for i in range(self.length))
+
+    def __eq__(self, other):
+        if not isinstance(other, Bitmask):
+            return NotImplemented
+        return self.length == other.length and self._number(0, self.length) == other._number(0, other.length)
+
+    def __repr__(self):
+        return f"Bitmask(length={self.length}, set={self.count()})"
+
+    def set(self, index, flag=True):
+        """
+        Set or clear one bit.
+
+        Args:
+            index (int): The position of the bit.
+            flag (bool): Whether the bit is set.
+
+        Returns:
+            None
+        """
+        if not 0 <= index < self.length:
+            raise IndexError("bit index out of range")
+        if flag:
+            self.bits[index >> 3] |= 1 << (index & 7)
+        else:
+            self.bits[index >> 3] &= ~(1 << (index & 7)) & 0xFF
+
+    def _number(self, start, stop):
+        # The bits in [start, stop) as an integer, bit start first
+        if stop <= start:
+            return 0
+        number = int.from_bytes(self.bits[start >> 3:(stop + 7) >> 3], 'little') >> (start & 7)
+        return number & ((1 << (stop - start)) - 1)
+
+    def count(self, start=0, stop=None):
+        """
+        Count the bits set in a range.
+
+        Args:
+            start (int): The first position included.
+            stop (int or None): The first position excluded. Defaults to the length.
+
+        Returns:
+            int: The number of bits set.
+        """
+        if stop is None:
+            stop = self.length
+        if start == 0 and stop == self.length:
+            return int.from_bytes(self.bits, 'little').bit_count()
+        return self._number(start, stop).bit_count()
+
+    def all(self, start=0, stop=None):
+        """Return whether every bit in [start, stop) is set."""
+        if stop is None:
+            stop = self.length
+        return self.count(start, stop) == stop - start
+
+    def unset(self):
+        """
+        Iterate over the positions of the bits that are not set.
+
+        Yields:
+            int: The position of each clear bit, in order.
+        """
+        bits = self.bits
+        for byte_index, byte in enumerate(bits):
+            if byte == 0xFF:
+                continue
+            base = byte_index << 3
+            for bit in range(8):
+                if not byte & (1 << bit) and base + bit < self.length:
+                    yield base + bit
+
+    def slice(self, start, stop):
+        """
+        Return the bits in [start, stop) as a mask of their own.
+
+        Args:
+            start (int): The first position included.
+            stop (int): The first position excluded.
+
+        Returns:
+            Bitmask: The copied bits.
+        """
+        length = max(stop - start, 0)
+        return Bitmask(length, bytearray(self._number(start, stop).to_bytes((length + 7) // 8, 'little')))
+
+    def extend(self, other):
+        """
+        Append the bits of another mask.
+
+        Args:
+            other (Bitmask): The mask to append.
+
+        Returns:
+            None
+        """
+        shift = self.length & 7
+        if shift == 0:
+            self.bits[len(self.bits):] = other.bits
+        else:
+            number = int.from_bytes(other.bits, 'little') << shift
+            shifted = number.to_bytes((other.length + shift + 7) // 8, 'little')
+            self.bits[-1] |= shifted[0]
+            self.bits.extend(shifted[1:])
+        self.length += other.length
+        del self.bits[(self.length + 7) // 8:]
+
+    def take(self, order):
+        """
+        Return the bits in a new order.
+
+        Args:
+            order (iterable): The positions to take, in the order they are wanted.
+
+        Returns:
+            Bitmask: The reordered mask.
+        """
+        return Bitmask.from_flags(bytes(self[i] for i in order))
+
+    def tobytes(self):
+        """Return the packed bits."""
+        return bytes(self.bits)
+
+
+def parse_value(text):
+    """
+    Convert a pollutant cell from a CSV file into a float.
+
+    Args:
+        text (str): The cell contents.
+
+    Returns:
+        float: The value, or MISSING if the cell reads "No data" or is empty.
+    """
+    if text == "No data" or text == "" or text is None:
+        return MISSING
+    return float(text)
+
+
+class StationData:
+    """
+    Columnar data for a single monitoring station.
+
+    Attributes:
+        code (str): The code of the monitoring station.
+        timestamps (array): Epoch-hour timestamps, one per row, in ascending order.
+        columns (dict): Maps each pollutant name to an array of float values.
+        masks (dict): Maps pollutant names to the validity Bitmask of their column.
+            Masks missing from it are built from the values when first needed.
+        version (int): Incremented every time the values of the station change.
+        derived (dict): Results computed from the columns, such as aggregates, which
+            are only valid for the version they were computed at. Results that define
+            an extend(station, start, stop) method are updated when rows are appended
+            instead of being discarded.
+    """
+
+    def __init__(self, code, timestamps=None, columns=None, masks=None):
+        self.code = code
+        self.timestamps = timestamps if timestamps is not None else array('q')
+        self.columns = columns if columns is not None else {}
+        self.masks = masks if masks is not None else {}
+        self.version = 0
+        self.derived = {}
+        self._day_index = None
+
+    def mark_changed(self):
+        """
+        Record that the values of the station have changed, discarding derived results.
+
+        Returns:
+            None
+        """
+        self.version += 1
+        self.derived.clear()
+
+    def clear(self):
+        """
+        Remove every row and column from the station.
+
+        Returns:
+            None
+        """
+        self.timestamps = array('q')
+        self.columns = {}
+        self.masks = {}
+        self._day_index = None
+        self.mark_changed()
+
+    def truncate(self, length):
+        """
+        Remove the rows from a position to the end, discarding derived results.
+
+        Args:
+            length (int): The number of rows kept.
+
+        Returns:
+            int: The number of rows removed.
+        """
+        removed = len(self.timestamps) - length
+        if removed <= 0:
+            return 0
+        del self.timestamps[length:]
+        for pollutant, values in self.columns.items():
+            del values[length:]
+            mask = self.masks.get(pollutant)
+            if mask is not None:
+                self.masks[pollutant] = mask.slice(0, min(length, len(mask)))
+        self._day_index = None
+        self.mark_changed()
+        return removed
+
+    def extend(self, timestamps, columns):
+        """
+        Append rows to the end of the station.
+
+        Rows that are not later than the existing ones are still accepted, but then the
+        station is sorted again and every derived result is discarded.
+
+        Args:
+            timestamps (iterable): The epoch-hour timestamps of the new rows.
+            columns (dict): Maps each pollutant of the station to the new values.
+
+        Returns:
+            int: The number of rows appended.
+        """
+        start = len(self.timestamps)
+        self.timestamps.extend(timestamps)
+        stop = len(self.timestamps)
+        for pollutant, values in self.columns.items():
+            new_values = columns.get(pollutant)
+            if new_values is None:
+                new_values = [MISSING] * (stop - start)
+            mask = self.masks.get(pollutant)
+            if mask is not None and len(mask) == len(values):
+                mask.extend(Bitmask.from_values(new_values))
+            values.extend(new_values)
+        if start == stop:
+            return 0
+
+        ordered = all(self.timestamps[i] <= self.timestamps[i + 1] for i in range(max(start - 1, 0), stop - 1))
+        if not ordered:
+            self.sort()
+            return stop - start
+
+        if self._day_index is not None:
+            index = self._day_index
+            for row in range(start, stop):
+                day = (self.timestamps[row] - 1) // 24
+                span = index.get(day)
+                index[day] = (row, row + 1) if span is None else (span[0], row + 1)
+
+        self.version += 1
+        for key, result in list(self.derived.items()):
+            if hasattr(result, 'extend'):
+                result.extend(self, start, stop)
+            else:
+                del self.derived[key]
+        return stop - start
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __contains__(self, pollutant):
+        return pollutant in self.columns
+
+    def __repr__(self):
+        return f"StationData({self.code!r}, rows={len(self)}, pollutants={self.pollutants})"
+
+    @property
+    def pollutants(self):
+        """list: The names of the pollutant columns."""
+        return list(self.columns)
+
+    @property
+    def loaded_pollutants(self):
+        """list: The names of the pollutant columns currently held in memory."""
+        loaded = getattr(self.columns, 'loaded', None)
+        return loaded() if loaded is not None else list(self.columns)
+
+    def validity(self, pollutant):
+        """
+        Return the validity mask of a pollutant column.
+
+        Args:
+            pollutant (str): The name of the pollutant.
+
+        Returns:
+            Bitmask: A bit set for every row whose value is not missing, or None if the
+                station has no such pollutant.
+        """
+        mask = self.masks.get(pollutant)
+        if mask is not None and len(mask) == len(self.timestamps):
+            return mask
+        values = self.column(pollutant)
+        if values is None:
+            return None
+        mask = self.masks[pollutant] = Bitmask.from_values(values)
+        return mask
+
+    def missing_count(self, pollutant):
+        """
+        Count the missing values of a pollutant column.
+
+        Args:
+            pollutant (str): The name of the pollutant.
+
+        Returns:
+            int: The number of rows without a valid value, or 0 if the station has no
+                such pollutant.
+        """
+        mask = self.validity(pollutant)
+        return 0 if mask is None else len(mask) - mask.count()
+
+    def column(self, pollutant):
+        """
+        Return the values of a pollutant column.
+
+        Args:
+            pollutant (str): The name of the pollutant.
+
+        Returns:
+            array: The column, or None if the station has no such pollutant.
+        """
+        return self.columns.get(pollutant)
+
+    @property
+    def day_index(self):
+        """dict: Maps each day number to the (start, stop) span of its rows."""
+        if self._day_index is None:
+            self.build_index()
+        return self._day_index
+
+    def build_index(self):
+        """
+        Build the index from day numbers to row spans in one pass over the timestamps.
+
+        Returns:
+            None
+        """
+        index = {}
+        start = 0
+        current_day = None
+        for row, ts in enumerate(self.timestamps):
+            day = (ts - 1) // 24
+            if day != current_day:
+                if current_day is not None:
+                    index[current_day] = (start, row)
+                current_day = day
+                start = row
+        if current_day is not None:
+            index[current_day] = (start, len(self.timestamps))
+        self._day_index = index
+
+    def day_span(self, day):
+        """
+        Return the rows reported under a day.
+
+        Args:
+            day (int or str): The day number since 1970-01-01, or a 'YYYY-MM-DD' date.
+
+        Returns:
+            tuple: The (start, stop) row span, which is empty if there are no rows.
+        """
+        if isinstance(day, str):
+            day = date_to_day(day)
+        return self.day_index.get(day, (0, 0))
+
+    def range_span(self, start, end):
+        """
+        Return the rows whose timestamps fall in [start, end).
+
+        Args:
+            start (int): The first epoch-hour timestamp included.
+            end (int): The first epoch-hour timestamp excluded.
+
+        Returns:
+            tuple: The (start, stop) row span.
+        """
+        first = bisect_left(self.timestamps, start)
+        return first, max(first, bisect_left(self.timestamps, end, first))
+
+    def date_range_span(self, start_date, end_date):
+        """
+        Return the rows reported under the dates in [start_date, end_date).
+
+        Args:
+            start_date (str): The first date included, in 'YYYY-MM-DD' format.
+            end_date (str): The first date excluded, in 'YYYY-MM-DD' format.
+
+        Returns:
+            tuple: The (start, stop) row span.
+        """
+        return self.range_span(date_to_day(start_date) * 24 + 1, date_to_day(end_date) * 24 + 1)
+
+    def slice(self, start, stop, pollutants=None):
+        """
+        Return a copy of a span of rows as a station of its own.
+
+        Args:
+            start (int): The first row included.
+            stop (int): The first row excluded.
+            pollutants (list or None): The pollutant columns to copy. Defaults to all of them.
+
+        Returns:
+            StationData: The rows in [start, stop).
+        """
+        if pollutants is None:
+            pollutants = self.pollutants
+        columns = {pollutant: self.columns[pollutant][start:stop] for pollutant in pollutants}
+        masks = {pollutant: self.validity(pollutant).slice(start, stop) for pollutant in pollutants}
+        station = StationData(self.code, self.timestamps[start:stop], columns, masks)
+        station.build_index()
+        return station
+
+    def date_bounds(self):
+        """
+        Return the dates of the first and last rows.
+
+        Returns:
+            tuple: The first and last 'YYYY-MM-DD' dates, or None if there are no rows.
+        """
+        if not len(self):
+            return None
+        return self.date(0), self.date(len(self) - 1)
+
+    def date(self, row):
+        """Return the 'YYYY-MM-DD' date of a row."""
+        return day_to_date(day_of(self.timestamps[row]))
+
+    def time(self, row):
+        """Return the 'HH:00:00' time of a row."""
+        return f'{hour_of(self.timestamps[row]):02}:00:00'
+
+    def records(self):
+        """
+        Iterate over the rows in the same shape as the rows of the CSV file.
+
+        Yields:
+            dict: A dictionary with the date, time and every pollutant of a row.
+        """
+        names = self.pollutants
+        columns = [self.columns[name] for name in names]
+        for row in range(len(self)):
+            record = {'date': self.date(row), 'time': self.time(row)}
+            for name, values in zip(names, columns):
+                record[name] = values[row]
+            yield record
+
+    def sort(self):
+        """
+        Sort the rows by timestamp, keeping the original order of equal timestamps.
+
+        Returns:
+            None
+        """
+        timestamps = self.timestamps
+        if all(timestamps[i] <= timestamps[i + 1] for i in range(len(timestamps) - 1)):
+            return
+        order = sorted(range(len(timestamps)), key=timestamps.__getitem__)
+        self.timestamps = array('q', (timestamps[i] for i in order))
+        for pollutant, values in self.columns.items():
+            mask = self.masks.get(pollutant)
+            if mask is not None and len(mask) == len(values):
+                self.masks[pollutant] = mask.take(order)
+            self.columns[pollutant] = array('d', (values[i] for i in order))
+        self._day_index = None
+        self.mark_changed()
+
+    @classmethod
+    def from_records(cls, code, records):
+        """
+        Build the columnar data of a station from a list of row dictionaries.
+
+        Args:
+            code (str): The code of the monitoring station.
+            records (iterable): Dictionaries with 'date', 'time' and pollutant keys, as
+                produced by csv.DictReader.
+
+        Returns:
+            StationData: The columnar data, sorted by timestamp.
+        """
+        records = list(records)
+        pollutants = []
+        if records:
+            pollutants = [key for key in records[0] if key not in ('date', 'time')]
+
+        timestamps = array('q', (timestamp(record['date'], record['time']) for record in records))
+        columns = {}
+        masks = {}
+        for pollutant in pollutants:
+            columns[pollutant] = array('d', (parse_value(record.get(pollutant)) for record in records))
+            masks[pollutant] = Bitmask.from_values(columns[pollutant])
+        station = cls(code, timestamps, columns, masks)
+        station.sort()
+        station.build_index()
+        return station
+
+
+def parse_rows(rows, date_index, time_index, pollutants):
+    """
+    Parse CSV rows into typed columns and validity flags.
+
+    Args:
+        rows (iterable): The rows, as lists of fields, without the header.
+        date_index (int): The position of the 'date' field.
+        time_index (int): The position of the 'time' field.
+        pollutants (list): (position, name) of every pollutant field.
+
+    Returns:
+        tuple: The timestamps array, a dictionary of value arrays and a dictionary of
+            validity flags, one byte per row, both keyed by pollutant name.
+    """
+    timestamps = array('q')
+    columns = {name: array('d') for _, name in pollutants}
+    flags = {name: bytearray() for _, name in pollutants}
+    appenders = [(i, columns[name].append, flags[name].append) for i, name in pollutants]
+    for row in rows:
+        if not row:
+            continue
+        timestamps.append(timestamp(row[date_index], row[time_index]))
+        for i, append, flag in appenders:
+            text = row[i]
+            if text == "No data" or text == "":
+                append(MISSING)
+                flag(0)
+            else:
+                append(float(text))
+                flag(1)
+    return timestamps, columns, flags
+
+
+def parse_header(header):
+    """
+    Find the date, time and pollutant fields of a CSV header.
+
+    Args:
+        header (list): The field names.
+
+    Returns:
+        tuple: The position of 'date', the position of 'time' and (position, name) of
+            every pollutant field.
+    """
+    date_index = header.index('date')
+    time_index = header.index('time')
+    pollutants = [(i, name) for i, name in enumerate(header) if name not in ('date', 'time')]
+    return date_index, time_index, pollutants
+
+
+def build_station(code, timestamps, columns, flags):
+    """
+    Assemble parsed columns into a station, sorted and indexed by day.
+
+    Args:
+        code (str): The code of the monitoring station.
+        timestamps (array): The epoch-hour timestamps, in file order.
+        columns (dict): The value arrays, keyed by pollutant name.
+        flags (dict): The validity flags, one byte per row, keyed by pollutant name.
+
+    Returns:
+        StationData: The station data.
+    """
+    masks = {name: Bitmask.from_flags(flags[name]) for name in flags}
+    station = StationData(code, timestamps, columns, masks)
+    station.sort()
+    station.build_index()
+    return station
+
+
+def load_csv(path, code):
+    """
+    Read a station CSV file into columnar form.
+
+    Args:
+        path (str): The path of the CSV file.
+        code (str): The code of the monitoring station.
+
+    Returns:
+        StationData: The columnar data of the station.
+    """
+    with open(path, "r", newline="") as file:
+        reader = csv.reader(file)
+        header = next(reader, None)
+        if header is None:
+            return StationData(code)
+        timestamps, columns, flags = parse_rows(reader, *parse_header(header))
+
+    return build_station(code, timestamps, columns, flags)
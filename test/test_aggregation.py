@@ -0,0 +1,39 @@
+# test/test_aggregation.py
+import sys
+import os
+
+# Get the parent directory of the current file
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.join(current_dir, '..')
+
+# Add the parent directory to the sys.path list
+sys.path.append(parent_dir)
+from store import StationData
+from aggregation import aggregate, mean
+
+def make_station():
+    records = [
+        {'date': '2021-01-01', 'time': '01:00:00', 'no': '1.0', 'pm10': '10'},
+        {'date': '2021-01-01', 'time': '02:00:00', 'no': '5.0', 'pm10': 'No data'},
+        {'date': '2021-01-04', 'time': '01:00:00', 'no': '3.0', 'pm10': '30'},
+    ]
+    return StationData.from_records('MY1', records)
+
+def test_aggregate_all_groupings():
+    station = make_station()
+    result = aggregate(station)
+    no = result['no']
+    assert no.hourly[1] == [4.0, 2, 1.0, 3.0]
+    assert list(no.daily.values()) == [[6.0, 2, 1.0, 5.0], [3.0, 1, 3.0, 3.0]]
+    assert no.weekly == {18624: [6.0, 2, 1.0, 5.0], 18631: [3.0, 1, 3.0, 3.0]}
+    assert no.monthly == {(2021, 1): [9.0, 3, 1.0, 5.0]}
+    assert no.day_of_week == {4: [6.0, 2, 1.0, 5.0], 0: [3.0, 1, 3.0, 3.0]}
+    assert mean(result['pm10'].daily[18628]) == 10.0
+    assert result['pm10'].hourly[2][1] == 0
+
+def test_aggregate_cached_until_changed():
+    station = make_station()
+    first = aggregate(station, ['no'])['no']
+    assert aggregate(station, ['no'])['no'] is first
+    station.mark_changed()
+    assert aggregate(station, ['no'])['no'] is not first
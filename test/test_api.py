@@ -0,0 +1,181 @@
+# test/test_api.py
+import sys
+import os
+import datetime
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# Get the parent directory of the current file
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.join(current_dir, '..')
+
+# Add the parent directory to the sys.path list
+sys.path.append(parent_dir)
+pytest.importorskip("requests")
+import api
+
+DELAY = 0.2
+
+
+def hourly_readings(start_date, end_date):
+    """Return a reading per hour from start_date to end_date, both midnights included."""
+    start = datetime.datetime.fromisoformat(start_date)
+    hours = int((datetime.datetime.fromisoformat(end_date) - start).total_seconds() // 3600)
+    return [{"@MeasurementDateGMT": str(start + datetime.timedelta(hours=hour)),
+             "@Value": str(hour % 24)} for hour in range(hours + 1)]
+
+
+class FakeAPIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    connections = 0
+    # The number of requests still to be answered with a 503
+    failures = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        FakeAPIHandler.connections += 1
+
+    def do_GET(self):
+        time.sleep(DELAY)
+        parts = dict(part.split("=", 1) for part in self.path.split("/") if "=" in part)
+        with FakeAPIHandler.lock:
+            fail = FakeAPIHandler.failures > 0
+            FakeAPIHandler.failures -= fail
+        if fail:
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        data = []
+        if parts.get("StartDate") and parts.get("EndDate"):
+            data = hourly_readings(parts["StartDate"], parts["EndDate"])
+        body = json.dumps({"RawAQData": {"@SiteCode": parts.get("SiteCode"),
+                                         "@SpeciesCode": parts.get("SpeciesCode"),
+                                         "Data": data}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def fake_api(monkeypatch, tmp_path):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeAPIHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    FakeAPIHandler.connections = 0
+    FakeAPIHandler.failures = 0
+    monkeypatch.setattr(api, "API_BASE", f"http://127.0.0.1:{server.server_port}")
+    monkeypatch.setattr(api, "cache", api.ResponseCache(directory=str(tmp_path)))
+    api.close_session()
+    yield server
+    api.close_session()
+    server.shutdown()
+    server.server_close()
+
+
+def test_fetch_many_runs_concurrently(fake_api):
+    queries = [("MY1", species) for species in ("NO", "NO2", "O3", "PM10", "PM25")]
+    start = time.perf_counter()
+    results = api.fetch_many(queries)
+    elapsed = time.perf_counter() - start
+    assert [result["RawAQData"]["@SpeciesCode"] for result in results] == ["NO", "NO2", "O3", "PM10", "PM25"]
+    assert elapsed < DELAY * 3
+
+
+def test_session_reuses_connections(fake_api, monkeypatch):
+    monkeypatch.setattr(api, "cache", None)
+    for _ in range(3):
+        api.fetch_site_species("KC1", "NO", "2021-01-01", "2021-01-02")
+    assert FakeAPIHandler.connections == 1
+
+
+def test_cache_hits_memory_then_disk(fake_api, tmp_path):
+    first = api.fetch_site_species("KC1", "NO", "2021-01-01", "2021-01-02")
+    assert api.fetch_site_species("KC1", "NO", "2021-01-01", "2021-01-02") == first
+    assert api.cache.stats() == {"hits": 1, "disk_hits": 0, "misses": 1, "entries": 1}
+
+    # A fresh cache over the same directory finds the response on disk
+    api.cache = api.ResponseCache(directory=str(tmp_path))
+    assert api.fetch_site_species("KC1", "NO", "2021-01-01", "2021-01-02") == first
+    assert api.cache.stats()["disk_hits"] == 1
+    assert FakeAPIHandler.connections == 1
+
+
+def test_cache_expires_ranges_reaching_today(fake_api):
+    api.cache.ttl = 0
+    api.fetch_site_species("KC1", "NO")
+    api.fetch_site_species("KC1", "NO")
+    assert api.cache.stats()["misses"] == 2
+
+
+def test_cache_evicts_least_recently_used():
+    cache = api.ResponseCache(max_entries=2, directory=None)
+    cache.put(("a",), 1, True)
+    cache.put(("b",), 2, True)
+    cache.get(("a",))
+    cache.put(("c",), 3, True)
+    assert cache.get(("b",)) is None
+    assert cache.get(("a",)) == 1
+
+
+def test_cache_returns_copies(tmp_path):
+    cache = api.ResponseCache(directory=str(tmp_path))
+    response = {"RawAQData": {"Data": [{"@Value": "1.0"}]}}
+    cache.put(("a",), response, True)
+    response["RawAQData"]["Data"].append({"@Value": "2.0"})
+    first = cache.get(("a",))
+    first["RawAQData"]["Data"][0]["@Value"] = "9.0"
+    assert cache.get(("a",)) == {"RawAQData": {"Data": [{"@Value": "1.0"}]}}
+
+    # The same from a fresh cache reading the response from disk
+    cache = api.ResponseCache(directory=str(tmp_path))
+    cache.get(("a",))["RawAQData"]["Data"].clear()
+    assert cache.get(("a",)) == {"RawAQData": {"Data": [{"@Value": "1.0"}]}}
+    assert cache.stats()["disk_hits"] == 1 and cache.stats()["hits"] == 1
+
+
+def test_split_range():
+    assert api.split_range("2021-01-01", "2021-01-20", days=7) == [
+        (datetime.date(2021, 1, 1), datetime.date(2021, 1, 8)),
+        (datetime.date(2021, 1, 8), datetime.date(2021, 1, 15)),
+        (datetime.date(2021, 1, 15), datetime.date(2021, 1, 20)),
+    ]
+    assert api.split_range("2021-01-01", "2021-01-01") == []
+
+
+def test_fetch_range_merges_chunks_in_parallel(fake_api):
+    start = time.perf_counter()
+    result = api.fetch_range("MY1", "NO", "2021-01-01", "2021-01-29", chunk_days=7)
+    elapsed = time.perf_counter() - start
+    assert elapsed < DELAY * 3
+    assert result["RawAQData"]["@SiteCode"] == "MY1"
+    # Each chunk repeats the midnight that ends the previous one, which is kept once
+    assert result["RawAQData"]["Data"] == hourly_readings("2021-01-01", "2021-01-29")
+    assert api.cache.stats()["entries"] == 4
+
+
+def test_transient_errors_are_retried(fake_api, monkeypatch):
+    monkeypatch.setattr(api, "BACKOFF", 0.01)
+    FakeAPIHandler.failures = 3
+    result = api.fetch_range("MY1", "NO", "2021-01-01", "2021-01-03", chunk_days=1)
+    assert len(result["RawAQData"]["Data"]) == 49
+    assert FakeAPIHandler.failures == 0
+
+
+def test_retries_give_up(fake_api, monkeypatch):
+    monkeypatch.setattr(api, "BACKOFF", 0.01)
+    FakeAPIHandler.failures = 10
+    with pytest.raises(api.requests.HTTPError):
+        api.fetch_site_species("MY1", "NO", "2021-01-01", "2021-01-02")
+    # The first attempt and RETRIES retries
+    assert FakeAPIHandler.failures == 10 - 1 - api.RETRIES
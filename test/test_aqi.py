@@ -0,0 +1,74 @@
+# test/test_aqi.py
+import sys
+import os
+from array import array
+
+import pytest
+
+# Get the parent directory of the current file
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.join(current_dir, '..')
+
+# Add the parent directory to the sys.path list
+sys.path.append(parent_dir)
+import aqi
+from store import MISSING, StationData
+
+def test_breakpoints():
+    values = array('d', [0, 11.9, 12, 35.5, 36, 70.9, 71, 500, MISSING])
+    assert list(aqi.index_values('pm25', values)) == [1, 1, 2, 3, 4, 9, 10, 10, 0]
+    assert list(aqi.index_values('PM10', [16, 17, None])) == [1, 2, 0]
+    assert list(aqi.index_values('Nitrogen Dioxide', [67.5, 68, 601])) == [1, 2, 10]
+    assert [aqi.band(index) for index in (0, 1, 4, 7, 10)] == [None, 'Low', 'Moderate', 'High', 'Very High']
+    with pytest.raises(ValueError):
+        aqi.index_values('no', [1.0])
+
+def test_combine_picks_dominant_pollutant():
+    highest, dominant = aqi.combine({'pm10': array('b', [1, 3, 0]), 'pm25': array('b', [2, 3, 0])})
+    assert list(highest) == [2, 3, 0]
+    assert dominant == ['pm25', 'pm10', None]
+
+def make_data():
+    records = [
+        {'date': '2021-01-01', 'time': f'{hour:02}:00:00', 'no': '1.0', 'pm10': pm10, 'pm25': pm25}
+        for hour, pm10, pm25 in ((1, '10', '30'), (2, '200', 'No data'), (3, 'No data', 'No data'))
+    ] + [{'date': '2021-01-02', 'time': '01:00:00', 'no': '1.0', 'pm10': 'No data', 'pm25': 'No data'}]
+    return {'MY1': StationData.from_records('MY1', records),
+            'KC1': StationData.from_records('KC1', records[:1])}
+
+def test_hourly_indices_use_running_means():
+    result = aqi.hourly_indices(make_data())
+    # The means run over 24 hours: pm10 is 10, then (10 + 200) / 2, then 200 alone
+    # on the next day, when the only pm25 reading has aged out
+    assert list(result['MY1']['pollutants']['pm10']) == [1, 10, 10, 10]
+    assert list(result['MY1']['pollutants']['pm25']) == [3, 3, 3, 0]
+    assert list(result['MY1']['index']) == [3, 10, 10, 10]
+    assert result['MY1']['dominant'] == ['pm25', 'pm10', 'pm10', 'pm10']
+    assert list(result['KC1']['index']) == [3]
+
+def test_daily_index():
+    assert aqi.daily_index(make_data(), 'MY1') == [
+        {'date': '2021-01-01', 'index': 10, 'band': 'Very High', 'dominant': 'pm10'},
+        {'date': '2021-01-02', 'index': 10, 'band': 'Very High', 'dominant': 'pm10'},
+    ]
+
+def test_air_quality_data_prints_index(monkeypatch, capsys):
+    pytest.importorskip("requests")
+    import monitoring
+    response = {"AirQualityData": {
+        "Columns": {"Column": [
+            {"@ColumnId": "Data1", "@ColumnName": "Westminster - Marylebone Road: Nitrogen Dioxide (ug/m3)"},
+            {"@ColumnId": "Data2", "@ColumnName": "Westminster - Marylebone Road: Carbon Monoxide (mg/m3)"},
+        ]},
+        "RawAQData": {"Data": [
+            {"@MeasurementDateGMT": "2021-01-01 00:00:00", "@Data1": "150", "@Data2": "0.4"},
+            {"@MeasurementDateGMT": "2021-01-01 01:00:00", "@Data1": "", "@Data2": "0.5"},
+        ]},
+    }}
+    monkeypatch.setattr(monitoring.api, "fetch_wide", lambda *args: response)
+    monitoring.get_air_quality_data()
+    output = capsys.readouterr().out
+    assert "Location: Westminster - Marylebone Road" in output
+    assert "- Nitrogen Dioxide: 150.0" in output and "- Nitrogen Dioxide: 0.0" in output
+    assert output.count("Air Quality Index") == 1
+    assert "- Air Quality Index: 3 (Low), set by Nitrogen Dioxide" in output
@@ -0,0 +1,32 @@
+# test/test_batch.py
+import sys
+import os
+
+# Get the parent directory of the current file
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.join(current_dir, '..')
+
+# Add the parent directory to the sys.path list
+sys.path.append(parent_dir)
+import pytest
+from batch import run_batch, REPORTS
+
+def test_run_batch_in_parallel(tmp_path):
+    station_files = {}
+    for code, offset in (('AAA', 0.0), ('BBB', 10.0)):
+        path = tmp_path / f"{code}.csv"
+        path.write_text("date,time,no,pm10\n"
+                        f"2021-01-01,01:00:00,{1 + offset},2\n"
+                        f"2021-01-01,02:00:00,{3 + offset},No data\n")
+        station_files[code] = str(path)
+
+    results = run_batch(station_files, workers=2, use_cache=False)
+    assert list(results) == ['AAA', 'BBB']
+    assert set(results['AAA']['no']) == set(REPORTS)
+    assert results['BBB']['no']['daily_average'] == [{'date': '2021-01-01', 'average': 12.0}]
+    # "No data" is left out rather than counted as 0
+    assert results['AAA']['pm10']['daily_median'] == [{'date': '2021-01-01', 'median': 2.0}]
+
+def test_run_batch_rejects_unknown_report(tmp_path):
+    with pytest.raises(ValueError):
+        run_batch({}, reports=('no_such_report',))
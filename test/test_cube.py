@@ -0,0 +1,71 @@
+# test/test_cube.py
+import sys
+import os
+
+# Get the parent directory of the current file
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.join(current_dir, '..')
+
+# Add the parent directory to the sys.path list
+sys.path.append(parent_dir)
+import aggregation
+import cube
+import reporting
+import snapshot
+from store import StationData
+
+CSV = ("date,time,no,pm10\n"
+       "2021-01-31,24:00:00,1.0,No data\n"
+       "2021-02-01,01:00:00,3.0,20\n"
+       "2021-02-01,02:00:00,No data,40\n")
+
+def test_encode_round_trip():
+    station = StationData.from_records('MY1', [
+        {'date': '2021-01-31', 'time': '24:00:00', 'no': '1.0'},
+        {'date': '2021-02-01', 'time': '01:00:00', 'no': 'No data'},
+    ])
+    aggregates = aggregation.aggregate(station)['no']
+    stored = cube.decode(cube.encode(aggregates, 'abc'), 'abc')
+    for grouping in aggregation.GROUPINGS:
+        assert stored.table(grouping) == aggregates.table(grouping)
+    assert stored.rows == 2
+    assert cube.decode(cube.encode(aggregates, 'abc'), 'def') is None
+    assert cube.decode(cube.encode(aggregates, 'abc')[:-8], 'abc') is None
+
+def test_reports_read_stored_aggregates(tmp_path, monkeypatch):
+    path = tmp_path / "MY1.csv"
+    path.write_text(CSV)
+    expected = reporting.daily_average({'MY1': snapshot.load_station(str(path), 'MY1')}, 'MY1', 'pm10')
+
+    folds = []
+    monkeypatch.setattr(aggregation, 'fold', lambda *args, **kwargs: folds.append(args))
+    data = {'MY1': snapshot.load_station(str(path), 'MY1')}
+    assert reporting.daily_average(data, 'MY1', 'pm10') == expected == [{'date': '2021-02-01', 'average': 30.0}]
+    assert reporting.monthly_average(data, 'MY1', 'no') == [
+        {'year': 2021, 'month': 'January', 'monthly_average': 1.0},
+        {'year': 2021, 'month': 'February', 'monthly_average': 3.0},
+    ]
+    assert reporting.hourly_average(data, 'MY1', 'pm10')[:2] == [
+        {'time': '01:00:00', 'average': 20.0}, {'time': '02:00:00', 'average': 40.0}]
+    assert folds == []
+
+def test_stale_aggregates_are_not_used(tmp_path):
+    path = tmp_path / "MY1.csv"
+    path.write_text(CSV)
+    snapshot.load_station(str(path), 'MY1')
+    # A changed source file gets a new snapshot with new aggregates
+    path.write_text(CSV.replace("3.0,20", "15.0,20"))
+    data = {'MY1': snapshot.load_station(str(path), 'MY1')}
+    assert reporting.daily_average(data, 'MY1', 'no')[1] == {'date': '2021-02-01', 'average': 15.0}
+
+    # Changing the values in memory drops the stored aggregates
+    reporting.fill_missing_data(data, 7.0, 'MY1', 'no')
+    assert reporting.daily_average(data, 'MY1', 'no')[1] == {'date': '2021-02-01', 'average': 11.0}
+
+def test_date_range_computes_aggregates(tmp_path):
+    path = tmp_path / "MY1.csv"
+    path.write_text(CSV)
+    snapshot.load_station(str(path), 'MY1')
+    data = {'MY1': snapshot.load_station(str(path), 'MY1', start_date='2021-02-01')}
+    assert reporting.monthly_average(data, 'MY1', 'no') == [
+        {'year': 2021, 'month': 'February', 'monthly_average': 3.0}]
@@ -0,0 +1,92 @@
+# test/test_ingest.py
+import sys
+import os
+
+# Get the parent directory of the current file
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.join(current_dir, '..')
+
+# Add the parent directory to the sys.path list
+sys.path.append(parent_dir)
+import aggregation
+from ingest import follow_csv_files
+import reporting
+from reporting import daily_average, hourly_average, monthly_average
+
+def test_follow_appended_rows(tmp_path):
+    path = tmp_path / "station.csv"
+    path.write_text("date,time,no\n2021-01-01,01:00:00,1.0\n2021-01-01,02:00:00,3.0")
+    follower = follow_csv_files({'MY1': str(path)})
+    assert daily_average(follower.data, 'MY1', 'no') == [{'date': '2021-01-01', 'average': 2.0}]
+    cached = aggregation.aggregate(follower.data['MY1'])['no']
+
+    with open(path, "a") as file:
+        file.write("\n2021-01-01,03:00:00,5.0\n2021-02-01,01:00:00,No data\n2021-02-01,02:00:00,4")
+    # The new last line is read once the file has stopped growing
+    assert follower.poll() == {'MY1': 2}
+    assert follower.poll() == {'MY1': 1}
+    assert follower.poll() == {'MY1': 0}
+
+    # The cached aggregates were updated in place rather than recomputed
+    assert aggregation.aggregate(follower.data['MY1'])['no'] is cached
+    assert daily_average(follower.data, 'MY1', 'no') == [
+        {'date': '2021-01-01', 'average': 3.0},
+        {'date': '2021-02-01', 'average': 4.0},
+    ]
+    assert monthly_average(follower.data, 'MY1', 'no')[1] == {'year': 2021, 'month': 'February', 'monthly_average': 4.0}
+
+def test_partial_line_waits_for_newline(tmp_path):
+    path = tmp_path / "station.csv"
+    path.write_text("date,time,no\n2021-01-01,01:00:00,1.0\n2021-01-01,02:00")
+    follower = follow_csv_files({'MY1': str(path)})
+    assert len(follower.data['MY1']) == 1
+    with open(path, "a") as file:
+        file.write(":00,2.0\n")
+    assert follower.poll() == {'MY1': 1}
+    assert list(follower.data['MY1'].column('no')) == [1.0, 2.0]
+
+def test_row_split_across_writes(tmp_path):
+    path = tmp_path / "station.csv"
+    path.write_text("date,time,no\n2021-01-01,01:00:00,1\n")
+    follower = follow_csv_files({'MY1': str(path)})
+    with open(path, "a") as file:
+        file.write("2021-01-01,02:00:00,1")
+    assert follower.poll() == {'MY1': 0}
+    with open(path, "a") as file:
+        file.write("00\n")
+    assert follower.poll() == {'MY1': 1}
+    assert list(follower.data['MY1'].column('no')) == [1.0, 100.0]
+
+    # A last line read while the writer paused is read again when it grows
+    with open(path, "a") as file:
+        file.write("2021-01-01,03:00:00,2")
+    assert follower.poll() == {'MY1': 0}
+    assert follower.poll() == {'MY1': 1}
+    with open(path, "a") as file:
+        file.write("5\n")
+    assert follower.poll() == {'MY1': 0}
+    assert list(follower.data['MY1'].column('no')) == [1.0, 100.0, 25.0]
+    assert follower.data['MY1'].validity('no').count() == 3
+
+def test_follow_matches_full_read(tmp_path, monkeypatch):
+    path = tmp_path / "station.csv"
+    path.write_text("date,time,no\n2021-01-01,01:00:00,1.0\n2021-01-01,02:00:00,No data\n"
+                    "2021-01-01,24:00:00,4.0\n2021-01-02,24:00:00,6.0")
+    monkeypatch.setattr(reporting, 'STATION_FILES', {'MY1': str(path)})
+    follower = follow_csv_files()
+    data = reporting.read_csv_files(use_cache=False)
+    assert len(follower.data['MY1']) == len(data['MY1']) == 4
+    for report in (daily_average, hourly_average, monthly_average):
+        assert report(follower.data, 'MY1', 'no') == report(data, 'MY1', 'no')
+
+def test_malformed_lines_are_skipped(tmp_path):
+    path = tmp_path / "station.csv"
+    path.write_text("date,time,no\n2021-01-01,01:00:00,1.0\n00\n2021-01-01,02:00:00,abc\n"
+                    "2021-01-01,03:00:00,3.0\n")
+    follower = follow_csv_files({'MY1': str(path)})
+    reader = follower.readers['MY1']
+    assert reader.skipped == 2 and 'abc' in reader.last_error
+    assert list(follower.data['MY1'].column('no')) == [1.0, 3.0]
+    with open(path, "a") as file:
+        file.write("2021-01-01,04:00:00,4.0\n")
+    assert follower.poll() == {'MY1': 1}
@@ -0,0 +1,67 @@
+# test/test_lazy.py
+import sys
+import os
+
+# Get the parent directory of the current file
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.join(current_dir, '..')
+
+# Add the parent directory to the sys.path list
+sys.path.append(parent_dir)
+import lazy
+from reporting import daily_average, daily_median, fill_missing_data
+
+CSV = ("date,time,no,pm10,pm25\n"
+       "2021-01-01,01:00:00,1.0,10,No data\n"
+       "2021-01-01,02:00:00,3.0,No data,5\n"
+       "2021-01-02,01:00:00,5.0,30,7\n")
+
+def write_files(tmp_path):
+    files = {}
+    for code in ('MY1', 'KC1'):
+        path = tmp_path / f"{code}.csv"
+        path.write_text(CSV)
+        files[code] = str(path)
+    return files
+
+def test_stations_and_columns_loaded_on_demand(tmp_path):
+    data = lazy.StationFiles(write_files(tmp_path))
+    assert data.loaded() == []
+    assert 'MY1' in data and 'XXX' not in data
+    assert sorted(data) == ['KC1', 'MY1']
+
+    assert daily_average(data, 'MY1', 'pm10') == [
+        {'date': '2021-01-01', 'average': 10.0},
+        {'date': '2021-01-02', 'average': 30.0},
+    ]
+    station = data['MY1']
+    assert data.loaded() == ['MY1']
+    # The averages come from the aggregates stored with the snapshot
+    assert station.loaded_pollutants == []
+    assert daily_median(data, 'MY1', 'pm10')[1] == {'date': '2021-01-02', 'median': 30.0}
+    assert station.loaded_pollutants == ['pm10']
+    assert 'no' in station and station.pollutants == ['no', 'pm10', 'pm25']
+    assert data.cache.stats()['loads'] == 2
+
+def test_columns_evicted_beyond_budget(tmp_path):
+    data = lazy.StationFiles(write_files(tmp_path), cache=lazy.ColumnCache(max_bytes=24))
+    for pollutant in ('no', 'pm10', 'pm25'):
+        data['MY1'].column(pollutant)
+    assert data['MY1'].loaded_pollutants == ['pm25']
+    assert data.cache.stats() == {'columns': 1, 'bytes': 24, 'loads': 3, 'evictions': 2}
+    # An evicted column is read again, with the same values
+    assert list(data['MY1'].column('no')) == [1.0, 3.0, 5.0]
+
+def test_changed_columns_are_kept(tmp_path):
+    data = lazy.StationFiles(write_files(tmp_path), cache=lazy.ColumnCache(max_bytes=24))
+    fill_missing_data(data, 2.0, 'MY1', 'pm10')
+    daily_average(data, 'MY1', 'no')
+    assert list(data['MY1'].column('pm10')) == [10.0, 2.0, 30.0]
+
+def test_date_range_and_masks(tmp_path):
+    files = write_files(tmp_path)
+    station = lazy.open_station(files['MY1'], 'MY1', start_date='2021-01-01', end_date='2021-01-02')
+    assert len(station) == 2
+    assert list(station.validity('pm25')) == [0, 1]
+    assert station.missing_count('pm10') == 1
+    assert station.column('pm25')[1] == 5.0
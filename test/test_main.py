@@ -0,0 +1,72 @@
+# test/test_main.py
+import sys
+import os
+import json
+
+import pytest
+
+# Get the parent directory of the current file
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.join(current_dir, '..')
+
+# Add the parent directory to the sys.path list
+sys.path.append(parent_dir)
+pytest.importorskip("requests")
+from store import StationData
+import main
+
+def make_data():
+    records = [
+        {'date': '2021-01-01', 'time': '01:00:00', 'no': '1.0'},
+        {'date': '2021-01-01', 'time': '02:00:00', 'no': '3.0'},
+        {'date': '2021-01-02', 'time': '01:00:00', 'no': '5.0'},
+    ]
+    return {'MY1': StationData.from_records('MY1', records)}
+
+def test_run_queries():
+    results = main.run_queries([
+        {'station': 'MY1', 'pollutant': 'no', 'report': 'daily_average', 'start': '2021-01-02'},
+        {'station': 'MY1', 'pollutant': 'no', 'report': 'peak_hour_date', 'date': '2021-01-01'},
+        {'station': 'MY1', 'pollutant': 'so2', 'report': 'daily_average'},
+    ], make_data())
+    assert results[0]['result'] == [{'date': '2021-01-02', 'average': 5.0}]
+    assert results[1]['result'] == ('02:00:00', 3.0)
+    assert 'error' in results[2]
+    assert all(entry['seconds'] >= 0 for entry in results)
+
+class BrokenFiles(dict):
+    """Stands in for lazy.StationFiles with a station whose file cannot be read."""
+    def get(self, code, default=None):
+        if code == 'KC1':
+            raise FileNotFoundError("data/KC1.csv")
+        return super().get(code, default)
+
+def test_run_queries_reports_unreadable_stations():
+    results = main.run_queries([
+        {'station': 'KC1', 'pollutant': 'no', 'report': 'daily_average'},
+        {'station': 'MY1', 'pollutant': 'no', 'report': 'daily_average'},
+    ], BrokenFiles(make_data()))
+    assert 'KC1.csv' in results[0]['error']
+    assert results[1]['result'][0] == {'date': '2021-01-01', 'average': 2.0}
+
+def test_report_command(monkeypatch, capsys):
+    monkeypatch.setattr(main.reporting, 'open_csv_files', lambda **kwargs: make_data())
+    code = main.main(['report', '-s', 'MY1', '-p', 'no', '-r', 'hourly_average'])
+    assert code == 0
+    output = json.loads(capsys.readouterr().out)
+    assert output[0]['result'][0] == {'time': '01:00:00', 'average': 3.0}
+    assert main.main(['report', '-s', 'XXX', '-p', 'no', '-r', 'hourly_average', '-f', 'csv']) == 1
+    monkeypatch.setattr(main.reporting, 'open_csv_files', lambda **kwargs: BrokenFiles(make_data()))
+    assert main.main(['report', '-s', 'KC1', '-s', 'MY1', '-p', 'no', '-r', 'hourly_average']) == 1
+
+def test_monitor_command(monkeypatch, capsys):
+    responses = [
+        {'RawAQData': {'Data': {'@MeasurementDateGMT': '2021-01-01 00:00:00', '@Value': '12.5'}}},
+        {'RawAQData': {'Data': [{'@MeasurementDateGMT': '2021-01-01 00:00:00', '@Value': ''},
+                                {'@MeasurementDateGMT': '2021-01-01 01:00:00', '@Value': 'n/a'}]}},
+    ]
+    monkeypatch.setattr(main.api, 'fetch_many', lambda requests: responses)
+    assert main.main(['monitor', '--site', 'MY1', '--species', 'NO', '--species', 'NO2']) == 0
+    output = json.loads(capsys.readouterr().out)
+    assert output[0]['readings'] == [{'date': '2021-01-01 00:00:00', 'value': 12.5}]
+    assert [reading['value'] for reading in output[1]['readings']] == [None, None]
@@ -0,0 +1,74 @@
+# test/test_memo.py
+import sys
+import os
+from array import array
+
+# Get the parent directory of the current file
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.join(current_dir, '..')
+
+# Add the parent directory to the sys.path list
+sys.path.append(parent_dir)
+import memo
+import reporting
+from store import StationData
+
+def make_data():
+    records = [
+        {'date': '2021-01-01', 'time': '01:00:00', 'no': '1.0'},
+        {'date': '2021-01-01', 'time': '02:00:00', 'no': 'No data'},
+        {'date': '2021-01-02', 'time': '01:00:00', 'no': '5.0'},
+    ]
+    return {'MY1': StationData.from_records('MY1', records)}
+
+def test_repeated_reports_are_stored(monkeypatch):
+    data = make_data()
+    calls = []
+    resample = reporting.resample.resample
+    monkeypatch.setattr(reporting.resample, 'resample', lambda *args: calls.append(args) or resample(*args))
+
+    first = reporting.daily_average(data, 'MY1', 'no')
+    hits = memo.cache.hits
+    assert reporting.daily_average(data, monitoring_station='MY1', pollutant='no') == first
+    assert len(calls) == 1 and memo.cache.hits == hits + 1
+    # Every caller gets its own copy of the stored result
+    first[0]['average'] = -1.0
+    first.append({})
+    assert reporting.daily_average(data, 'MY1', 'no') == [
+        {'date': '2021-01-01', 'average': 1.0}, {'date': '2021-01-02', 'average': 5.0}]
+    assert reporting.daily_percentiles(data, 'MY1', 'no', [50]) == [
+        {'date': '2021-01-01', 'p50': 1.0}, {'date': '2021-01-02', 'p50': 5.0}]
+    assert reporting.daily_percentiles(data, 'MY1', 'no', (25,))[0] == {'date': '2021-01-01', 'p25': 1.0}
+    assert reporting.peak_hour_date(data, '2021-01-02', 'MY1', 'no') == ('01:00:00', 5.0)
+    assert reporting.daily_average(data, 'KC1', 'no') == []
+
+def test_changes_invalidate_results():
+    data = make_data()
+    assert reporting.count_missing_data(data, 'MY1', 'no') == 1
+    before = memo.cache.invalidations
+    reporting.fill_missing_data(data, 3.0, 'MY1', 'no')
+    assert memo.cache.invalidations > before
+    assert reporting.count_missing_data(data, 'MY1', 'no') == 0
+    assert reporting.daily_average(data, 'MY1', 'no')[0] == {'date': '2021-01-01', 'average': 2.0}
+
+    # Appending rows
+    data['MY1'].extend(array('q', [data['MY1'].timestamps[-1] + 1]), {'no': array('d', [9.0])})
+    assert reporting.daily_average(data, 'MY1', 'no')[1] == {'date': '2021-01-02', 'average': 7.0}
+
+    # Reading the station again
+    data['MY1'] = make_data()['MY1']
+    assert reporting.daily_average(data, 'MY1', 'no')[0] == {'date': '2021-01-01', 'average': 1.0}
+
+def test_least_recently_used_results_are_dropped():
+    cache = memo.ReportCache(max_entries=2, max_bytes=1000)
+    cache.put((1, 'a'), [1.0])
+    cache.put((1, 'b'), [2.0])
+    assert cache.get((1, 'a')) == (True, [1.0])
+    cache.put((2, 'c'), [3.0])
+    assert cache.get((1, 'b')) == (False, None)
+    assert len(cache) == 2 and cache.evictions == 1
+    cache.put((2, 'd'), list(range(1000)))
+    assert cache.get((2, 'd')) == (False, None)
+    cache.discard(2)
+    assert len(cache) == 1 and cache.invalidations == 1
+    assert cache.stats()['hit_rate'] == 1 / 3
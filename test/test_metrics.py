@@ -0,0 +1,51 @@
+# test/test_metrics.py
+import sys
+import os
+
+# Get the parent directory of the current file
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.join(current_dir, '..')
+
+# Add the parent directory to the sys.path list
+sys.path.append(parent_dir)
+import json
+import metrics
+import reporting
+from store import StationData
+
+def make_data():
+    records = [
+        {'date': '2021-01-01', 'time': '01:00:00', 'no': '1.0'},
+        {'date': '2021-01-01', 'time': '02:00:00', 'no': '3.0'},
+    ]
+    return {'MY1': StationData.from_records('MY1', records)}
+
+def test_enable_records_and_disable_restores():
+    original = reporting.daily_average
+    metrics.reset()
+    metrics.enable()
+    try:
+        assert reporting.daily_average is not original
+        reporting.daily_average(make_data(), 'MY1', 'no')
+        reporting.daily_average(make_data(), 'MY1', 'no')
+    finally:
+        metrics.disable()
+    assert reporting.daily_average is original
+
+    timers = metrics.as_dict()['timers']
+    assert timers['report.daily_average']['calls'] == 2
+    assert timers['report.daily_average']['rows'] == 4
+    assert timers['compute.aggregate']['calls'] == 2
+    assert 'report.daily_average' in metrics.render_text()
+    assert json.loads(metrics.to_json())['timers']['report.daily_average']['calls'] == 2
+
+    # Nothing is recorded while disabled
+    reporting.daily_average(make_data(), 'MY1', 'no')
+    assert metrics.as_dict()['timers']['report.daily_average']['calls'] == 2
+
+def test_timer_quantiles():
+    timer = metrics.Timer()
+    for seconds in (0.001, 0.001, 0.001, 0.2):
+        timer.observe(seconds)
+    assert timer.quantile(0.5) == 0.001
+    assert timer.quantile(0.99) == 0.2
@@ -0,0 +1,52 @@
+# test/test_parallel_csv.py
+import sys
+import os
+
+# Get the parent directory of the current file
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.join(current_dir, '..')
+
+# Add the parent directory to the sys.path list
+sys.path.append(parent_dir)
+import parallel_csv
+from store import load_csv
+
+def write_rows(tmp_path, newline="\n", trailing=True):
+    lines = ["date,time,no,pm10"]
+    for day in range(1, 29):
+        for hour in range(24, 0, -1):
+            value = "No data" if (day * hour) % 7 == 0 else f"{day + hour / 10}"
+            lines.append(f"2021-02-{day:02},{hour:02}:00:00,{value},{day * hour}")
+        lines.append("")
+    text = newline.join(lines) + (newline if trailing else "")
+    path = tmp_path / "station.csv"
+    path.write_bytes(text.encode())
+    return str(path)
+
+def assert_same(parallel, serial):
+    assert list(parallel.timestamps) == list(serial.timestamps)
+    assert parallel.pollutants == serial.pollutants
+    for pollutant in serial.pollutants:
+        assert parallel.column(pollutant).tobytes() == serial.column(pollutant).tobytes()
+        assert parallel.masks[pollutant] == serial.masks[pollutant]
+    assert parallel.day_index == serial.day_index
+
+def test_split_ranges_on_line_boundaries(tmp_path):
+    path = write_rows(tmp_path)
+    data = open(path, "rb").read()
+    start = data.index(b"\n") + 1
+    ranges = parallel_csv.split_ranges(path, start, 7)
+    assert ranges[0][0] == start and ranges[-1][1] == len(data)
+    for (_, stop), (next_start, _) in zip(ranges, ranges[1:]):
+        assert stop == next_start and data[stop - 1:stop] == b"\n"
+
+def test_parallel_parse_matches_serial(tmp_path):
+    for newline, trailing in (("\n", True), ("\r\n", False)):
+        path = write_rows(tmp_path, newline, trailing)
+        parallel = parallel_csv.load_csv(path, "MY1", workers=3, min_bytes=0)
+        assert_same(parallel, load_csv(path, "MY1"))
+        assert parallel.missing_count('no') == sum((d * h) % 7 == 0 for d in range(1, 29) for h in range(1, 25))
+
+def test_small_files_parsed_serially(tmp_path):
+    path = write_rows(tmp_path)
+    assert_same(parallel_csv.load_csv(path, "MY1", workers=4), load_csv(path, "MY1"))
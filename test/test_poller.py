@@ -0,0 +1,141 @@
+# test/test_poller.py
+import sys
+import os
+import datetime
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# Get the parent directory of the current file
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.join(current_dir, '..')
+
+# Add the parent directory to the sys.path list
+sys.path.append(parent_dir)
+pytest.importorskip("requests")
+import api
+import monitoring
+from poller import Poller, Series
+
+
+class LiveAPIHandler(BaseHTTPRequestHandler):
+    """Serves the readings in `readings`, keyed by species, whatever the date range."""
+    protocol_version = "HTTP/1.1"
+    readings = {}
+    requests = []
+
+    def do_GET(self):
+        parts = dict(part.split("=", 1) for part in self.path.split("/") if "=" in part)
+        LiveAPIHandler.requests.append(parts)
+        body = json.dumps({"RawAQData": {"@SiteCode": parts.get("SiteCode"),
+                                         "@SpeciesCode": parts.get("SpeciesCode"),
+                                         "Data": LiveAPIHandler.readings.get(parts.get("SpeciesCode"), [])}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def reading(date, value):
+    return {"@MeasurementDateGMT": date, "@Value": value}
+
+
+@pytest.fixture
+def live_api(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), LiveAPIHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    LiveAPIHandler.readings = {}
+    LiveAPIHandler.requests = []
+    monkeypatch.setattr(api, "API_BASE", f"http://127.0.0.1:{server.server_port}")
+    api.close_session()
+    yield LiveAPIHandler
+    monitoring.stop_polling()
+    api.close_session()
+    server.shutdown()
+    server.server_close()
+
+
+def test_series_deduplicates_and_wraps():
+    series = Series(capacity=3)
+    assert series.add([reading("2021-01-01 00:00:00", "1"), reading("2021-01-01 01:00:00", "")],
+                      "2021-01-01") == 2
+    # A repeated reading is skipped, unless it fills in a missing value
+    assert series.add([reading("2021-01-01 00:00:00", "1"), reading("2021-01-01 01:00:00", "2")]) == 1
+    assert series.add([reading("2021-01-01 02:00:00", "3"), reading("2021-01-01 03:00:00", "4")]) == 2
+    assert series.readings() == [("2021-01-01 01:00:00", 2.0), ("2021-01-01 02:00:00", 3.0),
+                                 ("2021-01-01 03:00:00", 4.0)]
+    assert series.readings(since="2021-01-01 02:00:00") == series.readings()[1:]
+    assert series.covers("2021-01-01 01:00:00") and not series.covers("2021-01-01")
+    assert series.last_date == "2021-01-01 03:00:00"
+
+
+def test_poll_fetches_incrementally(live_api):
+    live_api.readings = {"NO": [reading("2021-01-01 00:00:00", "5"), reading("2021-01-01 01:00:00", "7")]}
+    poller = Poller(sites=["MY1"], species=["NO", "NO2"], history_days=2)
+    assert poller.poll_once() == 2
+    live_api.readings["NO"].append(reading("2021-01-01 02:00:00", "6"))
+    assert poller.poll_once() == 1
+    assert [value for _, value in poller.get("MY1", "NO").readings()] == [5.0, 7.0, 6.0]
+    assert len(poller.get("MY1", "NO2")) == 0
+    # Later polls start from the day of the newest reading
+    assert [request["StartDate"] for request in live_api.requests if request["SpeciesCode"] == "NO"][1] == "2021-01-01"
+    assert poller.polls == 2 and poller.errors == 0
+
+
+
+def test_failed_requests_are_counted(monkeypatch):
+    def get_json(url):
+        time.sleep(0.01)
+        raise ConnectionError(url)
+    monkeypatch.setattr(api, "get_json", get_json)
+    poller = Poller(sites=["MY1", "KC1"], species=["NO", "NO2", "O3", "PM10"])
+    assert poller.poll_once() == 0
+    assert poller.polls == 1 and poller.errors == 8
+    assert isinstance(poller.last_error, ConnectionError)
+
+
+def test_background_thread_feeds_monitoring(live_api, capsys):
+    today = datetime.date.today().isoformat()
+    live_api.readings = {"NO": [reading(f"{today} 00:00:00", "9"), reading(f"{today} 01:00:00", "12")],
+                         "NO2": [reading(f"{today} 00:00:00", "3")],
+                         "O3": []}
+    poller = monitoring.start_polling(["MY1"], ["NO", "NO2", "O3"], interval=60)
+    for _ in range(100):
+        if poller.polls:
+            break
+        time.sleep(0.05)
+    assert poller.running and poller.polls == 1
+    requests_made = len(live_api.requests)
+
+    monitoring.get_highest_pollutant_value("MY1", "NO")
+    monitoring.get_pollutant_statistics("MY1", ["NO", "NO2"])
+    monitoring.display_real_time_statistics("MY1", "NO")
+    # Everything was answered from the buffers
+    assert len(live_api.requests) == requests_made
+    output = capsys.readouterr().out
+    assert "• Value: 12.0" in output
+    assert "• Maximum pollution level: 3.0" in output
+    assert output.index(f"12.0 at {today} 01:00:00") < output.index(f"9.0 at {today} 00:00:00")
+
+    monitoring.stop_polling()
+    assert not poller.running and monitoring.poller is None
+
+
+def test_series_keeps_rolling_windows():
+    series = Series(capacity=10, windows=(2,))
+    series.add([reading("2021-01-01 00:00:00", "4"), reading("2021-01-01 01:00:00", ""),
+                reading("2021-01-01 02:00:00", "1")], "2021-01-01")
+    assert series.rolling(2)['max'] == 1.0 and series.rolling(24)['max'] == 4.0
+    # Filling in a missing value behind the newest reading updates the windows
+    series.add([reading("2021-01-01 01:00:00", "6")])
+    assert series.rolling(2)['max'] == 6.0
+    assert series.rolling(2)['max_at'] == "2021-01-01 01:00:00"
+    assert series.rolling(24)['mean'] == pytest.approx(11 / 3)
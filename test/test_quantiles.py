@@ -0,0 +1,53 @@
+# test/test_quantiles.py
+import sys
+import os
+import random
+import statistics
+
+# Get the parent directory of the current file
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.join(current_dir, '..')
+
+# Add the parent directory to the sys.path list
+sys.path.append(parent_dir)
+import pytest
+from quantiles import select, percentile, percentiles, stream_daily_percentiles
+from store import StationData, timestamp
+from reporting import daily_percentiles
+
+def test_select_matches_sorting():
+    rng = random.Random(1)
+    values = [rng.randint(0, 50) for _ in range(500)]
+    ordered = sorted(values)
+    for k in (0, 1, 250, 499):
+        assert select(values, k) == ordered[k]
+    with pytest.raises(IndexError):
+        select(values, 500)
+
+def test_percentiles():
+    rng = random.Random(2)
+    for size in (1, 2, 24, 33, 101):
+        values = [rng.random() for _ in range(size)]
+        assert percentile(values, 50) == statistics.median(values)
+    assert percentiles([1, 2, 3, 4, 5], (0, 25, 100)) == [1, 2, 5]
+    assert percentile([], 50) is None
+    with pytest.raises(ValueError):
+        percentile([1], 101)
+
+def test_stream_daily_percentiles():
+    readings = [
+        (timestamp('2021-01-01', '01:00:00'), 1.0),
+        (timestamp('2021-01-01', '24:00:00'), 3.0),
+        (timestamp('2021-01-02', '01:00:00'), float('nan')),
+    ]
+    assert list(stream_daily_percentiles(readings, (50, 100))) == [
+        ('2021-01-01', [2.0, 3.0]),
+        ('2021-01-02', [None, None]),
+    ]
+
+def test_daily_percentiles_report():
+    records = [{'date': '2021-01-01', 'time': f'{hour:02}:00:00', 'no': str(hour)} for hour in range(1, 25)]
+    data = {'MY1': StationData.from_records('MY1', records)}
+    assert daily_percentiles(data, 'MY1', 'no', (25, 50, 75)) == [
+        {'date': '2021-01-01', 'p25': 6.75, 'p50': 12.5, 'p75': 18.25}
+    ]
@@ -0,0 +1,85 @@
+# test/test_reporting.py
+import sys
+import os
+
+# Get the parent directory of the current file
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.join(current_dir, '..')
+
+# Add the parent directory to the sys.path list
+sys.path.append(parent_dir)
+from store import StationData
+from reporting import (daily_average, daily_median, hourly_average, monthly_average,
+                       weekly_average, day_of_week_average, peak_hour_date,
+                       count_missing_data, fill_missing_data)
+
+def make_data():
+    records = [
+        {'date': '2021-01-02', 'time': '01:00:00', 'no': '4.0'},
+        {'date': '2021-01-01', 'time': '01:00:00', 'no': '1.0'},
+        {'date': '2021-01-01', 'time': '24:00:00', 'no': '3.0'},
+        {'date': '2021-01-02', 'time': '02:00:00', 'no': 'No data'},
+        {'date': '2021-02-01', 'time': '01:00:00', 'no': '8.0'},
+    ]
+    return {'MY1': StationData.from_records('MY1', records)}
+
+def test_station_columns():
+    station = make_data()['MY1']
+    assert len(station) == 5
+    assert station.date(0) == '2021-01-01'
+    assert station.time(1) == '24:00:00'
+    assert list(station.column('no'))[:3] == [1.0, 3.0, 4.0]
+
+def test_daily_average():
+    assert daily_average(make_data(), 'MY1', 'no') == [
+        {'date': '2021-01-01', 'average': 2.0},
+        {'date': '2021-01-02', 'average': 4.0},
+        {'date': '2021-02-01', 'average': 8.0},
+    ]
+    assert daily_average(make_data(), 'XXX', 'no') == []
+
+def test_daily_median():
+    assert daily_median(make_data(), 'MY1', 'no')[0] == {'date': '2021-01-01', 'median': 2.0}
+
+def test_hourly_average():
+    averages = hourly_average(make_data(), 'MY1', 'no')
+    assert len(averages) == 24
+    assert averages[0] == {'time': '01:00:00', 'average': 13.0 / 3}
+    assert averages[1] == {'time': '02:00:00', 'average': None}
+    assert averages[23] == {'time': '24:00:00', 'average': 3.0}
+
+def test_monthly_average():
+    assert monthly_average(make_data(), 'MY1', 'no') == [
+        {'year': 2021, 'month': 'January', 'monthly_average': 8.0 / 3},
+        {'year': 2021, 'month': 'February', 'monthly_average': 8.0},
+    ]
+
+def test_weekly_and_day_of_week_average():
+    assert weekly_average(make_data(), 'MY1', 'no') == [
+        {'year': 2020, 'week': 53, 'weekly_average': 8.0 / 3},
+        {'year': 2021, 'week': 5, 'weekly_average': 8.0},
+    ]
+    assert day_of_week_average(make_data(), 'MY1', 'no') == [
+        {'day_of_week': 'Monday', 'average': 8.0},
+        {'day_of_week': 'Friday', 'average': 2.0},
+        {'day_of_week': 'Saturday', 'average': 4.0},
+    ]
+
+def test_peak_hour_date():
+    assert peak_hour_date(make_data(), '2021-01-01', 'MY1', 'no') == ('24:00:00', 3.0)
+    assert peak_hour_date(make_data(), '2021-03-01', 'MY1', 'no') is None
+
+def test_missing_data():
+    data = make_data()
+    assert count_missing_data(data, 'MY1', 'no') == 1
+    fill_missing_data(data, 0, 'MY1', 'no')
+    assert count_missing_data(data, 'MY1', 'no') == 0
+    assert daily_average(data, 'MY1', 'no')[1] == {'date': '2021-01-02', 'average': 2.0}
+
+def test_date_index():
+    station = make_data()['MY1']
+    assert station.day_span('2021-01-01') == (0, 2)
+    assert station.day_span('2021-01-03') == (0, 0)
+    assert station.date_range_span('2021-01-02', '2021-02-01') == (2, 4)
+    assert station.date_range_span('2021-01-01', '2022-01-01') == (0, 5)
+    assert station.range_span(10**9, 10**9 + 1) == (5, 5)
@@ -0,0 +1,93 @@
+# test/test_resample.py
+import sys
+import os
+
+import pytest
+
+# Get the parent directory of the current file
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.join(current_dir, '..')
+
+# Add the parent directory to the sys.path list
+sys.path.append(parent_dir)
+from store import StationData
+from resample import resample, parse_bucket, register_aggregator, AGGREGATORS
+
+def make_station():
+    records = [
+        {'date': '2021-01-01', 'time': '01:00:00', 'no': '1.0'},
+        {'date': '2021-01-01', 'time': '08:00:00', 'no': '3.0'},
+        {'date': '2021-01-01', 'time': '09:00:00', 'no': 'No data'},
+        {'date': '2021-01-01', 'time': '24:00:00', 'no': '5.0'},
+        {'date': '2021-01-04', 'time': '01:00:00', 'no': '7.0'},
+        {'date': '2021-03-31', 'time': '24:00:00', 'no': '9.0'},
+        {'date': '2021-04-01', 'time': '01:00:00', 'no': 'No data'},
+    ]
+    return StationData.from_records('MY1', records)
+
+def test_hour_buckets_align_to_midnight():
+    assert resample(make_station(), 'no', '8h', ['mean', 'count', 'max']) == [
+        {'start': '2021-01-01 00:00:00', 'mean': 2.0, 'count': 2, 'max': 3.0},
+        {'start': '2021-01-01 08:00:00', 'mean': None, 'count': 0, 'max': None},
+        {'start': '2021-01-01 16:00:00', 'mean': 5.0, 'count': 1, 'max': 5.0},
+        {'start': '2021-01-04 00:00:00', 'mean': 7.0, 'count': 1, 'max': 7.0},
+        {'start': '2021-03-31 16:00:00', 'mean': 9.0, 'count': 1, 'max': 9.0},
+        {'start': '2021-04-01 00:00:00', 'mean': None, 'count': 0, 'max': None},
+    ]
+
+def test_calendar_buckets():
+    station = make_station()
+    assert [b['start'] for b in resample(station, 'no', '1W', 'count')] == [
+        '2020-12-28', '2021-01-04', '2021-03-29']
+    assert resample(station, 'no', '3M', ['sum', 'median']) == [
+        {'start': '2021-01-01', 'sum': 25.0, 'median': 5.0},
+        {'start': '2021-04-01', 'sum': 0, 'median': None},
+    ]
+    assert resample(station, 'no', 'Y', 'p50') == [{'start': '2021-01-01', 'p50': 5.0}]
+
+def test_cached_tables_match_row_spans():
+    station = make_station()
+    aggs = ['sum', 'count', 'min', 'max', 'mean']
+    for bucket in ('1D', '1W', '1M'):
+        fast = resample(station, 'no', bucket, aggs)
+        slow = resample(station, 'no', bucket, aggs + [lambda values: None])
+        for fast_bucket, slow_bucket in zip(fast, slow):
+            del slow_bucket['<lambda>']
+            assert fast_bucket == slow_bucket
+        assert len(fast) == len(slow)
+
+def test_custom_aggregators():
+    def spread(values):
+        return max(values) - min(values) if values else None
+    assert resample(make_station(), 'no', '1D', spread)[0] == {'start': '2021-01-01', 'spread': 4.0}
+    register_aggregator('first', lambda values: values[0] if values else None)
+    try:
+        assert resample(make_station(), 'no', '1D', 'first')[1] == {'start': '2021-01-04', 'first': 7.0}
+    finally:
+        del AGGREGATORS['first']
+    with pytest.raises(ValueError):
+        register_aggregator('mean', spread)
+
+def test_uneven_buckets_restart_each_day_and_month():
+    station = make_station()
+    assert [b['start'] for b in resample(station, 'no', '5h', 'count')] == [
+        '2021-01-01 00:00:00', '2021-01-01 05:00:00', '2021-01-01 20:00:00',
+        '2021-01-04 00:00:00', '2021-03-31 20:00:00', '2021-04-01 00:00:00']
+    assert resample(station, 'no', '7D', ['count', 'sum']) == [
+        {'start': '2021-01-01', 'count': 4, 'sum': 16.0},
+        {'start': '2021-03-29', 'count': 1, 'sum': 9.0},
+        {'start': '2021-04-01', 'count': 0, 'sum': 0.0},
+    ]
+
+def test_invalid_arguments():
+    assert parse_bucket('D') == (1, 'D')
+    assert parse_bucket('15h') == (15, 'h')
+    for bucket in ('15min', '0D', '2X', '25h', '32D'):
+        with pytest.raises(ValueError):
+            parse_bucket(bucket)
+    with pytest.raises(ValueError):
+        resample(make_station(), 'no', '1D', 'p101')
+    with pytest.raises(ValueError):
+        resample(make_station(), 'no', '1D', 'average')
+    with pytest.raises(KeyError):
+        resample(make_station(), 'pm10')
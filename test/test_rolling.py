@@ -0,0 +1,86 @@
+# test/test_rolling.py
+import sys
+import os
+import math
+import random
+
+import pytest
+
+# Get the parent directory of the current file
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.join(current_dir, '..')
+
+# Add the parent directory to the sys.path list
+sys.path.append(parent_dir)
+from store import StationData
+from rolling import RollingWindow, rolling, window_extreme
+
+def brute_force(readings, end, hours):
+    values = [value for ts, value in readings if end - hours < ts <= end and value is not None]
+    if not values:
+        return {'count': 0, 'max': None, 'min': None}
+    return {'count': len(values), 'max': max(values), 'min': min(values), 'mean': sum(values) / len(values)}
+
+def test_window_matches_brute_force():
+    generator = random.Random(1)
+    readings = []
+    ts = 0
+    for _ in range(500):
+        ts += generator.choice((1, 1, 1, 2, 5))
+        readings.append((ts, generator.choice((None, round(generator.uniform(0, 50), 1)))))
+    for hours in (1, 8, 24):
+        window = RollingWindow(hours)
+        for index, (ts, value) in enumerate(readings):
+            window.push(ts, value)
+            expected = brute_force(readings[:index + 1], ts, hours)
+            assert window.count == expected['count']
+            assert window.max == expected['max'] and window.min == expected['min']
+            if expected['count']:
+                assert math.isclose(window.mean, expected['mean'])
+
+def test_window_rejects_old_readings():
+    window = RollingWindow(24)
+    window.push(10, 1.0)
+    with pytest.raises(ValueError):
+        window.push(9, 2.0)
+    with pytest.raises(ValueError):
+        RollingWindow(0)
+
+def test_window_extreme_is_numeric():
+    readings = [("2021-01-01 00:00:00", 9.0), ("2021-01-01 01:00:00", 10.0),
+                ("2021-01-01 02:00:00", None), ("2021-01-01 03:00:00", 2.5)]
+    # As strings, '9' would sort above '10'
+    assert window_extreme(readings, 24) == (10.0, "2021-01-01 01:00:00")
+    assert window_extreme(readings, 2, largest=False) == (2.5, "2021-01-01 03:00:00")
+    assert window_extreme([], 24) == (None, None)
+
+def test_ties_keep_the_earliest_reading():
+    readings = [("2021-01-01 00:00:00", 10), ("2021-01-01 05:00:00", 10), ("2021-01-01 06:00:00", 3),
+                ("2021-01-01 07:00:00", 3)]
+    assert window_extreme(readings, 24) == (10, "2021-01-01 00:00:00")
+    assert window_extreme(readings, 24, largest=False) == (3, "2021-01-01 06:00:00")
+    window = RollingWindow(24)
+    for ts, (label, value) in enumerate(readings):
+        window.push(ts, value, label)
+    assert (window.max_at, window.min_at) == ("2021-01-01 00:00:00", "2021-01-01 06:00:00")
+    # Once the earliest maximum has left the window, the next one holds it
+    window = RollingWindow(2)
+    for ts, value in enumerate([10, 10, 3]):
+        window.push(ts, value)
+    assert (window.max, window.max_at) == (10, 1)
+
+def test_rolling_over_station():
+    records = [
+        {'date': '2021-01-01', 'time': '01:00:00', 'no': '1.0'},
+        {'date': '2021-01-01', 'time': '02:00:00', 'no': '3.0'},
+        {'date': '2021-01-01', 'time': '03:00:00', 'no': 'No data'},
+        {'date': '2021-01-01', 'time': '06:00:00', 'no': '8.0'},
+        {'date': '2021-01-01', 'time': '12:00:00', 'no': 'No data'},
+    ]
+    result = rolling(StationData.from_records('MY1', records), 'no', 3, ['mean', 'max', 'count'])
+    assert list(result['mean'][:4]) == [1.0, 2.0, 2.0, 8.0]
+    assert list(result['max'][:4]) == [1.0, 3.0, 3.0, 8.0]
+    assert list(result['count']) == [1, 2, 2, 1, 0]
+    assert math.isnan(result['mean'][4])
+    with pytest.raises(ValueError):
+        rolling(StationData.from_records('MY1', records), 'no', 3, 'p95')
@@ -0,0 +1,91 @@
+# test/test_server.py
+import sys
+import os
+import json
+import threading
+import time
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import pytest
+
+# Get the parent directory of the current file
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.join(current_dir, '..')
+
+# Add the parent directory to the sys.path list
+sys.path.append(parent_dir)
+pytest.importorskip("requests")
+from store import StationData
+import memo
+import reporting
+import server
+
+def make_data():
+    records = [
+        {'date': '2021-01-01', 'time': '01:00:00', 'no': '1.0'},
+        {'date': '2021-01-01', 'time': '02:00:00', 'no': '3.0'},
+        {'date': '2021-01-02', 'time': '01:00:00', 'no': '5.0'},
+    ]
+    return {'MY1': StationData.from_records('MY1', records)}
+
+@pytest.fixture
+def service():
+    service = server.QueryServer(("127.0.0.1", 0), make_data(), workers=4, request_timeout=0.5)
+    thread = threading.Thread(target=service.serve_forever, daemon=True)
+    thread.start()
+    yield service
+    service.shutdown()
+    service.server_close()
+
+def get(service, path):
+    url = f"http://127.0.0.1:{service.server_port}{path}"
+    try:
+        with urlopen(url, timeout=5) as response:
+            return response.status, json.load(response)
+    except HTTPError as error:
+        return error.code, json.load(error)
+
+def test_reports(service):
+    assert get(service, "/stations") == (200, {'MY1': ['no']})
+    assert get(service, "/report/daily_average?station=MY1&pollutant=no&start=2021-01-02") == (
+        200, {'result': [{'date': '2021-01-02', 'average': 5.0}]})
+    assert get(service, "/report/peak_hour_date?station=MY1&pollutant=no&date=2021-01-01") == (
+        200, {'result': ['02:00:00', 3.0]})
+    assert get(service, "/report/daily_average?station=KC1&pollutant=no")[0] == 400
+    assert get(service, "/report/daily_average?station=MY1")[0] == 400
+    assert get(service, "/nothing")[0] == 404
+    stats = get(service, "/stats")[1]
+    assert stats['requests'] == 6 and stats['errors'] == 3
+
+def test_ranged_queries_are_cached(service):
+    path = "/report/daily_average?station=MY1&pollutant=no&start=2021-01-02"
+    before = memo.cache.stats()
+    assert get(service, path) == (200, {'result': [{'date': '2021-01-02', 'average': 5.0}]})
+    assert get(service, path) == (200, {'result': [{'date': '2021-01-02', 'average': 5.0}]})
+    after = memo.cache.stats()
+    assert (after['misses'] - before['misses'], after['hits'] - before['hits']) == (1, 1)
+    assert after['entries'] == before['entries'] + 1
+
+    # Changing the station's values drops the stored ranged result
+    reporting.fill_missing_data(service.data, 0.0, 'MY1', 'no')
+    assert after['entries'] == memo.cache.stats()['entries'] + 1
+
+def test_concurrent_requests_and_timeout(service, monkeypatch):
+    real_run_query = server.run_query
+
+    def run_query(data, **arguments):
+        if arguments['report'] == 'daily_median':
+            time.sleep(2)
+        return real_run_query(data, **arguments)
+    monkeypatch.setattr(server, "run_query", run_query)
+
+    results = []
+    paths = ["/report/daily_median?station=MY1&pollutant=no"] + ["/report/hourly_average?station=MY1&pollutant=no"] * 8
+    threads = [threading.Thread(target=lambda path=path: results.append(get(service, path))) for path in paths]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(status for status, _ in results) == [200] * 8 + [504]
+    assert service.stats()['timeouts'] == 1
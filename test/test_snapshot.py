@@ -0,0 +1,66 @@
+# test/test_snapshot.py
+import sys
+import os
+
+# Get the parent directory of the current file
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.join(current_dir, '..')
+
+# Add the parent directory to the sys.path list
+sys.path.append(parent_dir)
+import snapshot
+
+CSV = "date,time,no,pm10\n2021-01-01,01:00:00,1.5,No data\n2021-01-01,02:00:00,2.5,3.0\n"
+
+def write_csv(tmp_path, text=CSV):
+    path = tmp_path / "station.csv"
+    path.write_text(text)
+    return str(path)
+
+def test_snapshot_round_trip(tmp_path):
+    path = write_csv(tmp_path)
+    parsed = snapshot.load_station(path, "MY1")
+    assert snapshot.read_meta(path) is not None
+    cached = snapshot.load_station(path, "MY1")
+    assert list(cached.timestamps) == list(parsed.timestamps)
+    assert list(cached.column('no')) == [1.5, 2.5]
+    assert cached.column('pm10')[0] != cached.column('pm10')[0]
+
+def test_snapshot_invalidated_by_content_change(tmp_path):
+    path = write_csv(tmp_path)
+    snapshot.load_station(path, "MY1")
+    # Same size and modification time, different contents
+    stat = os.stat(path)
+    write_csv(tmp_path, CSV.replace("1.5", "9.5"))
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert snapshot.load_station(path, "MY1").column('no')[0] == 1.5
+    assert snapshot.load_station(path, "MY1", verify=True).column('no')[0] == 9.5
+
+def test_snapshot_kept_when_only_touched(tmp_path):
+    path = write_csv(tmp_path)
+    snapshot.load_station(path, "MY1")
+    meta = snapshot.read_meta(path)
+    os.utime(path, ns=(meta["mtime_ns"] + 10**9, meta["mtime_ns"] + 10**9))
+    assert snapshot.is_current(path, snapshot.read_meta(path))
+    snapshot.load_station(path, "MY1")
+    assert snapshot.read_meta(path)["mtime_ns"] == meta["mtime_ns"] + 10**9
+
+def test_snapshot_partitioned_by_year(tmp_path):
+    path = write_csv(tmp_path, "date,time,no\n"
+                     "2020-12-31,24:00:00,1.0\n2021-01-01,01:00:00,2.0\n"
+                     "2021-12-31,24:00:00,3.0\n2022-06-01,01:00:00,4.0")
+    snapshot.load_station(path, "MY1")
+    meta = snapshot.read_meta(path)
+    assert [(p["year"], p["rows"]) for p in meta["partitions"]] == [(2020, 1), (2021, 2), (2022, 1)]
+    assert [p["year"] for p in snapshot.select_partitions(meta, "2021-06-01", "2022-01-01")] == [2021]
+
+    station = snapshot.load_station(path, "MY1", start_date="2021-01-01", end_date="2022-01-01")
+    assert list(station.column('no')) == [2.0, 3.0]
+    assert station.date_bounds() == ('2021-01-01', '2021-12-31')
+    assert list(snapshot.load_station(path, "MY1").column('no')) == [1.0, 2.0, 3.0, 4.0]
+
+    # A year that disappears from the source file loses its partition files
+    write_csv(tmp_path, "date,time,no\n2021-01-01,01:00:00,2.0\n")
+    snapshot.load_station(path, "MY1")
+    names = os.listdir(tmp_path / ".cache")
+    assert not any(".2020." in name or ".2022." in name for name in names)
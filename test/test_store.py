@@ -0,0 +1,49 @@
+# test/test_store.py
+import sys
+import os
+
+# Get the parent directory of the current file
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.join(current_dir, '..')
+
+# Add the parent directory to the sys.path list
+sys.path.append(parent_dir)
+from array import array
+
+from store import Bitmask, StationData, load_csv, timestamp
+
+def test_bitmask_operations():
+    flags = bytes([1, 0, 1, 1, 1, 1, 1, 1, 1, 0, 1])
+    mask = Bitmask.from_flags(flags)
+    assert list(mask) == list(flags)
+    assert mask.count() == 9
+    assert mask.count(2, 9) == 7 and mask.all(2, 9) and not mask.all(0, 3)
+    assert list(mask.unset()) == [1, 9]
+    assert list(mask.slice(3, 11)) == list(flags[3:11])
+    mask.extend(Bitmask.from_flags(bytes([0, 1, 1])))
+    assert list(mask) == list(flags) + [0, 1, 1]
+    assert len(mask.bits) == 2
+    mask.set(1)
+    mask.set(0, False)
+    assert mask[0] == 0 and mask[1] == 1
+    assert list(mask.take([2, 0, 1])) == [1, 0, 1]
+    assert Bitmask.from_values([1.0, float('nan')]) == Bitmask.from_flags(b"\x01\x00")
+
+def test_masks_recorded_while_parsing(tmp_path):
+    path = tmp_path / "station.csv"
+    path.write_text("date,time,no\n2021-01-01,02:00:00,No data\n2021-01-01,01:00:00,1.0\n")
+    station = load_csv(str(path), "MY1")
+    # The mask follows the rows when they are sorted
+    assert list(station.masks['no']) == [1, 0]
+    assert station.missing_count('no') == 1
+
+    station.extend([timestamp('2021-01-02', '01:00:00')], {'no': [float('nan')]})
+    assert list(station.validity('no')) == [1, 0, 0]
+    assert list(station.slice(1, 3).validity('no')) == [0, 0]
+
+def test_mask_rebuilt_when_out_of_date():
+    station = StationData('MY1', array('q', [1, 2]), {'no': array('d', [1.0, float('nan')])})
+    assert station.missing_count('no') == 1
+    station.timestamps.append(3)
+    station.columns['no'].append(float('nan'))
+    assert station.missing_count('no') == 2
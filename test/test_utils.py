@@ -8,7 +8,9 @@ parent_dir = os.path.join(current_dir, '..')
 
 # Add the parent directory to the sys.path list
 sys.path.append(parent_dir)
-from utils import sumvalues, maxvalue, minvalue, meanvalue, countvalue
+from array import array
+import pytest
+from utils import sumvalues, maxvalue, minvalue, meanvalue, countvalue, describe
 
 def test_sumvalues():
     assert sumvalues([1, 2, 3]) == 6
@@ -30,3 +32,26 @@ def test_meanvalue():
 def test_countvalue():
     assert countvalue([1, 2, 2, 3, 3, 3], 2) == 2
     assert countvalue([1, 2, 2, 3, 3, 3], 4) == 0
+
+def test_buffers():
+    values = array('d', [1.5, 2.5, 4.0])
+    assert sumvalues(values) == 8.0
+    assert maxvalue(memoryview(values)) == 4.0
+    assert minvalue(values) == 1.5
+    assert countvalue(values, 2.5) == 1
+    with pytest.raises(ValueError):
+        maxvalue(array('d'))
+
+def test_non_numerical_values():
+    with pytest.raises(ValueError):
+        sumvalues([1, 'a'])
+    with pytest.raises(ValueError):
+        maxvalue(['a', 1])
+    with pytest.raises(ValueError):
+        meanvalue([1, 2j])
+
+def test_describe():
+    assert describe([1, 2, 3]) == {'sum': 6, 'min': 1, 'max': 3, 'mean': 2.0, 'count': 3}
+    assert describe(array('i', [4, 5]))['mean'] == 4.5
+    with pytest.raises(ValueError):
+        describe([])
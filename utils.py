@@ -2,6 +2,66 @@
 # You should modify the functions below to match
 # the signatures determined by the project specification
 
+import numbers
+from array import array
+
+try:
+    import numpy
+except ImportError:  # numpy is optional; arrays from the standard library still take the fast path
+    numpy = None
+
+# array.array and memoryview formats that hold plain numbers
+NUMERIC_FORMATS = frozenset('bBhHiIlLqQfd')
+
+_PLAIN_TYPES = frozenset((int, float, bool))
+
+
+def _as_numeric(values):
+    """
+    Validate a collection of values once and return it in a form the built-in
+    reductions can consume at C speed.
+
+    array.array and memoryview objects with a numeric format are accepted as they are,
+    since their format already guarantees every element is a number. Lists, tuples
+    and other iterables are checked by collecting the distinct element types, so a
+    list of plain ints and floats costs one C-level pass instead of one isinstance
+    call per value.
+
+    Args:
+        values (list, tuple, array, memoryview or iterable): The values to check.
+
+    Returns:
+        The values as a sequence, or a numpy array when numpy arrays are passed in.
+
+    Raises:
+        ValueError: If non-numerical values are present.
+    """
+    if numpy is not None and isinstance(values, numpy.ndarray):
+        if values.dtype.kind not in 'biuf':
+            raise ValueError("Non-numerical value found in the list")
+        return values.ravel()
+    if isinstance(values, array):
+        if values.typecode not in NUMERIC_FORMATS:
+            raise ValueError("Non-numerical value found in the list")
+        return values
+    if isinstance(values, memoryview):
+        if values.format not in NUMERIC_FORMATS:
+            raise ValueError("Non-numerical value found in the list")
+        return values if values.ndim == 1 else array(values.format, values.tobytes())
+    if not isinstance(values, (list, tuple)):
+        values = list(values)
+    if not _PLAIN_TYPES.issuperset(set(map(type, values))):
+        for value in values:
+            if not isinstance(value, numbers.Real):
+                raise ValueError("Non-numerical value found in the list")
+    return values
+
+
+def _item(value):
+    """Convert a numpy scalar result back into a plain Python number."""
+    return value.item() if hasattr(value, 'item') else value
+
+
 def sumvalues(values):
     """
     Calculates the sum of values in a list or array.
@@ -21,12 +81,10 @@ def sumvalues(values):
         >>> sumvalues([-1, 0, 1, 2])
         2.0
     """
-    total = 0
-    for value in values:
-        if not isinstance(value, (int, float)):
-            raise ValueError("Non-numerical value found in the list")
-        total += value
-    return total
+    values = _as_numeric(values)
+    if numpy is not None and isinstance(values, numpy.ndarray):
+        return _item(values.sum())
+    return sum(values)
 
 
 def maxvalue(values):
@@ -49,15 +107,12 @@ def maxvalue(values):
         >>> maxvalue([-1, 0, 1, 2])
         2
     """
-    if not values:
+    values = _as_numeric(values)
+    if len(values) == 0:
         raise ValueError("Empty list")
-    max_value = values[0]
-    for i in range(1, len(values)):
-        if not isinstance(values[i], (int, float)):
-            raise ValueError("Non-numerical value found in the list")
-        if values[i] > max_value:
-            max_value = values[i]
-    return max_value
+    if numpy is not None and isinstance(values, numpy.ndarray):
+        return _item(values.max())
+    return max(values)
 
 
 def minvalue(values):
@@ -80,15 +135,12 @@ def minvalue(values):
         >>> minvalue([-1, 0, 1, 2])
         -1
     """
-    if not values:
+    values = _as_numeric(values)
+    if len(values) == 0:
         raise ValueError("Empty list")
-    min_value = values[0]
-    for i in range(1, len(values)):
-        if not isinstance(values[i], (int, float)):
-            raise ValueError("Non-numerical value found in the list")
-        if values[i] < min_value:
-            min_value = values[i]
-    return min_value
+    if numpy is not None and isinstance(values, numpy.ndarray):
+        return _item(values.min())
+    return min(values)
 
 
 def meanvalue(values):
@@ -111,16 +163,12 @@ def meanvalue(values):
         >>> meanvalue([-1, 0, 1, 2])
         0.5
     """
-    if not values:
+    values = _as_numeric(values)
+    if len(values) == 0:
         raise ValueError("Empty list")
-    total = 0
-    count = 0
-    for value in values:
-        if not isinstance(value, (int, float)):
-            raise ValueError("Non-numerical value found in the list")
-        total += value
-        count += 1
-    return total / count
+    if numpy is not None and isinstance(values, numpy.ndarray):
+        return _item(values.mean())
+    return sum(values) / len(values)
 
 
 def countvalue(values, xw):
@@ -140,8 +188,47 @@ def countvalue(values, xw):
         >>> countvalue([1, 2, 2, 3, 3, 3], 4)
         0
     """
+    if numpy is not None and isinstance(values, numpy.ndarray):
+        return int((values == xw).sum())
+    if isinstance(values, (list, tuple, array)):
+        return values.count(xw)
     count = 0
     for value in values:
         if value == xw:
             count += 1
     return count
+
+
+def describe(values):
+    """
+    Calculates the sum, minimum, maximum, mean and count of a list or array.
+
+    The values are validated a single time, which is cheaper than calling sumvalues,
+    minvalue, maxvalue and meanvalue separately on the same data. The sum, minimum
+    and maximum are then taken in three passes by the built-in reductions, which is
+    still faster than one pass in a Python loop.
+
+    Args:
+        values (list or array): A list or array of numerical values.
+
+    Returns:
+        dict: The 'sum', 'min', 'max', 'mean' and 'count' of the values.
+
+    Raises:
+        ValueError: If non-numerical values are present in the list or array.
+        ValueError: If the list or array is empty.
+
+    Example:
+        >>> describe([1, 2, 3])
+        {'sum': 6, 'min': 1, 'max': 3, 'mean': 2.0, 'count': 3}
+    """
+    values = _as_numeric(values)
+    count = len(values)
+    if count == 0:
+        raise ValueError("Empty list")
+    if numpy is not None and isinstance(values, numpy.ndarray):
+        total = _item(values.sum())
+        return {'sum': total, 'min': _item(values.min()), 'max': _item(values.max()),
+                'mean': total / count, 'count': count}
+    total = sum(values)
+    return {'sum': total, 'min': min(values), 'max': max(values), 'mean': total / count, 'count': count}